@@ -0,0 +1,190 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import database
+from database import MEALS, WORKOUT_LOGS, WELLNESS
+
+# Windowed trend analytics over wellness, workout and meal logs.
+# Each user gets time-indexed NumPy series per store that are extended
+# incrementally: only records written since the last refresh are parsed, and
+# the stats record's counts tell us whether anything new exists at all.
+
+DAY = 86400.0
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+EWMA_SPAN = int(os.getenv("ANALYTICS_EWMA_SPAN", "7"))
+ANALYTICS_MAX_USERS = int(os.getenv("ANALYTICS_MAX_USERS", "5000"))
+# Rows older than the chronic window are dropped, but at least this many are kept
+KEEP_MIN_ROWS = 3
+
+
+def _workout_load(entry: Dict[str, Any]) -> float:
+    # Session load = duration x RPE when the effort rating is logged, else duration
+    duration = entry.get("duration", entry.get("duration_minutes"))
+    if not isinstance(duration, (int, float)) or isinstance(duration, bool):
+        return np.nan
+    rpe = entry.get("rpe")
+    if isinstance(rpe, (int, float)) and not isinstance(rpe, bool):
+        return float(duration) * float(rpe)
+    return float(duration)
+
+
+def _field(name: str):
+    def get(entry: Dict[str, Any]) -> float:
+        value = entry.get(name)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        return np.nan
+    return get
+
+
+# store -> (column names, extractors)
+SERIES = {
+    WELLNESS: (("sleep_quality", "stress_level"), (_field("sleep_quality"), _field("stress_level"))),
+    WORKOUT_LOGS: (("workout_load",), (_workout_load,)),
+    MEALS: (("calories", "protein"), (_field("calories"), _field("protein"))),
+}
+
+
+def _epoch(ts: Any) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(ts).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class _Series:
+    """Time-sorted rows of one store for one user, plus incremental EWMA state."""
+
+    def __init__(self, columns: int):
+        self.ts = np.empty(0)
+        self.values = np.empty((0, columns))
+        self.ewma = np.full(columns, np.nan)
+        self.alpha = 2.0 / (EWMA_SPAN + 1)
+        self.seen = 0  # number of raw records consumed
+
+    def extend(self, records: List[Dict[str, Any]], extractors, now: float) -> None:
+        self.seen += len(records)
+        rows = [(t, [f(r) for f in extractors]) for r in records if (t := _epoch(r.get("timestamp"))) is not None]
+        if not rows:
+            return
+        ts = np.array([t for t, _ in rows])
+        values = np.array([v for _, v in rows], dtype=float)
+        # EWMA in arrival order; NaN (field not logged) leaves a column unchanged
+        for row in values:
+            present = ~np.isnan(row)
+            first = present & np.isnan(self.ewma)
+            self.ewma[first] = row[first]
+            update = present & ~first
+            self.ewma[update] += self.alpha * (row[update] - self.ewma[update])
+        previous_last = self.ts[-1] if self.ts.size else -np.inf
+        self.ts = np.concatenate([self.ts, ts])
+        self.values = np.vstack([self.values, values])
+        if ts[0] < previous_last or np.any(np.diff(ts) < 0):
+            # Back-dated records (e.g. batch sync) keep the series time-ordered
+            order = np.argsort(self.ts, kind="stable")
+            self.ts, self.values = self.ts[order], self.values[order]
+        cutoff = np.searchsorted(self.ts, now - CHRONIC_DAYS * DAY)
+        cutoff = min(cutoff, max(len(self.ts) - KEEP_MIN_ROWS, 0))
+        if cutoff:
+            self.ts, self.values = self.ts[cutoff:], self.values[cutoff:]
+
+    def window(self, now: float, days: int) -> np.ndarray:
+        return self.values[np.searchsorted(self.ts, now - days * DAY):]
+
+
+def _mean(values: np.ndarray) -> Optional[float]:
+    values = values[~np.isnan(values)]
+    return round(float(values.mean()), 2) if values.size else None
+
+
+def _round(value: float) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 2)
+
+
+class TrendEngine:
+    def __init__(self, max_users: int = ANALYTICS_MAX_USERS):
+        self.max_users = max_users
+        # username -> (lock guarding that user's series, series per store)
+        self._users: "OrderedDict[str, Tuple[threading.Lock, Dict[str, _Series]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _refresh(self, username: str) -> Tuple[Dict[str, _Series], float]:
+        now = datetime.now().timestamp()
+        backend = database._store
+        stats = backend.read_stats(username) or {}
+        counts = stats.get("counts", {})
+        # The engine-wide lock only guards the LRU; log reads happen under the user's own
+        # lock, so one user's slow refresh does not hold up trend reads for everyone else
+        with self._lock:
+            entry = self._users.get(username)
+            if entry is None:
+                entry = (threading.Lock(), {store: _Series(len(columns)) for store, (columns, _) in SERIES.items()})
+                self._users[username] = entry
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            else:
+                self._users.move_to_end(username)
+        user_lock, series = entry
+        with user_lock:
+            for store, (_, extractors) in SERIES.items():
+                s = series[store]
+                # Without a stats record we cannot tell cheaply, so ask the backend
+                if store in counts and counts[store] <= s.seen:
+                    continue
+                new = backend.read_since(store, username, s.seen)
+                if new:
+                    s.extend(new, extractors, now)
+        return series, now
+
+    def recent_wellness(self, username: str, n: int = 3) -> np.ndarray:
+        """Last `n` (sleep_quality, stress_level) rows by timestamp; NaN where not logged."""
+        series, _ = self._refresh(username)
+        return series[WELLNESS].values[-n:]
+
+    def should_reduce_intensity(self, username: str, n: int = 3) -> bool:
+        """True when each of the last `n` wellness logs shows poor sleep (<50) or high stress (>=4)."""
+        rows = self.recent_wellness(username, n)
+        with np.errstate(invalid="ignore"):
+            poor = (rows[:, 0] < 50) | (rows[:, 1] >= 4)
+        return int(poor.sum()) >= n
+
+    def trends(self, username: str) -> Dict[str, Any]:
+        series, now = self._refresh(username)
+        result: Dict[str, Any] = {}
+
+        wellness = series[WELLNESS]
+        for i, name in enumerate(SERIES[WELLNESS][0]):
+            result[name] = {
+                "mean_7d": _mean(wellness.window(now, ACUTE_DAYS)[:, i]),
+                "mean_28d": _mean(wellness.window(now, CHRONIC_DAYS)[:, i]),
+                "ewma": _round(wellness.ewma[i]),
+            }
+
+        workouts = series[WORKOUT_LOGS]
+        acute = np.nansum(workouts.window(now, ACUTE_DAYS)[:, 0])
+        chronic_weekly = np.nansum(workouts.window(now, CHRONIC_DAYS)[:, 0]) / (CHRONIC_DAYS / ACUTE_DAYS)
+        result["workout_load"] = {
+            "acute_7d": round(float(acute), 2),
+            "chronic_weekly_28d": round(float(chronic_weekly), 2),
+            # Acute:chronic workload ratio; >1.5 is the usual injury-risk flag
+            "acwr": round(float(acute / chronic_weekly), 2) if chronic_weekly else None,
+            "sessions_7d": int(workouts.window(now, ACUTE_DAYS).shape[0]),
+        }
+
+        meals = series[MEALS]
+        week = meals.window(now, ACUTE_DAYS)
+        for i, name in enumerate(SERIES[MEALS][0]):
+            result[name] = {
+                "daily_mean_7d": round(float(np.nansum(week[:, i])) / ACUTE_DAYS, 1) if week.size else None,
+                "ewma_per_meal": _round(meals.ewma[i]),
+            }
+        return result
+
+
+trend_engine = TrendEngine()
@@ -1,56 +1,154 @@
 import os
-from typing import Any, Dict
-from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
 
-from flask import Blueprint, jsonify, request
-import google.generativeai as genai
+import numpy as np
+from flask import Blueprint, jsonify, request, url_for
 
-from database import _load_json, _save_json, MEALS_FILE, WORKOUT_LOGS_FILE, WELLNESS_FILE
+from llm import registry, generate_text
+from llm_cache import response_cache
+from context_builder import context_builder
+from faq import faq_index
+from metrics import registry as metrics_registry
+from singleflight import flights
+from governor import governor
+from database import add_log_entry, add_log_entries, get_last_log_timestamp, MEALS, WORKOUT_LOGS, WELLNESS
 from chat_agent import CommunicationAgent
+from feedback_queue import FeedbackQueue, QueueFull, FEEDBACK_MODE, check_callback_url
 
 
 bp = Blueprint("api", __name__, url_prefix="/api")
 
 
+def _agent_feedback(username: str, prompt: str) -> str:
+    agent = CommunicationAgent(username)
+    return agent.handle(prompt)
+
+
+def _queued_feedback(username: str, prompt: str) -> str:
+    # Raises AgentUnavailable on model failure so the queue retries instead of storing fallback text
+    return CommunicationAgent(username).handle(prompt, raise_on_fallback=True)
+
+
+feedback_queue = FeedbackQueue(_queued_feedback)
+
+# Request fields that steer feedback delivery and are not part of the log entry
+_CONTROL_FIELDS = ("feedback_mode", "callback_url")
+
+# Numeric log fields and their accepted range; the aggregates and trends read these
+FIELD_RANGES: Dict[str, Dict[str, Tuple[float, float]]] = {
+    MEALS: {"calories": (0, 10000), "protein": (0, 1000), "carbs": (0, 1000), "fat": (0, 1000)},
+    WORKOUT_LOGS: {"duration": (0, 1440), "duration_minutes": (0, 1440), "calories_burned": (0, 10000),
+                   "sets": (0, 100), "reps": (0, 1000), "rpe": (1, 10)},
+    WELLNESS: {"sleep_quality": (0, 100), "sleep_hours": (0, 24), "stress_level": (1, 5), "water_liters": (0, 20)},
+}
+
+
+# bool is an int subclass, so types are compared exactly
+_NUMERIC = (int, float)
+
+
+def _entry_errors(store: str, entries: List[Dict[str, Any]]) -> List[Optional[str]]:
+    """Why each entry's numeric fields are unacceptable (None if they are fine).
+
+    Fields are checked a column at a time over the whole list, so a batch of
+    thousands of records costs a few array comparisons per field.
+    """
+    errors: List[Optional[str]] = [None] * len(entries)
+    for field, (low, high) in FIELD_RANGES[store].items():
+        # NaN marks a missing field and inf anything that is not a finite number (bools, strings, NaN, inf)
+        values = np.array([
+            np.nan if v is None else v if type(v) in _NUMERIC and -1e300 < v < 1e300 else np.inf
+            for v in (entry.get(field) for entry in entries)
+        ], dtype=float)
+        invalid = np.isinf(values)
+        out_of_range = ~invalid & ((values < low) | (values > high))
+        for i in np.flatnonzero(invalid):
+            errors[i] = errors[i] or f"{field} must be a number"
+        for i in np.flatnonzero(out_of_range):
+            errors[i] = errors[i] or f"{field} must be between {low} and {high}"
+    return errors
+
+
+def _entry_error(store: str, entry: Dict[str, Any]) -> Optional[str]:
+    """Why a log entry's numeric fields are unacceptable, or None."""
+    return _entry_errors(store, [entry])[0]
+
+
+def _request_feedback(username: str, prompt: str, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """Generate feedback inline (sync) or hand it to the background queue (async)."""
+    mode = (payload.get("feedback_mode") or request.args.get("feedback_mode") or FEEDBACK_MODE).lower()
+    if mode != "async":
+        return {"feedback": _agent_feedback(username, prompt)}, 200
+    try:
+        job_id = feedback_queue.submit(username, prompt, payload.get("callback_url"))
+    except QueueFull:
+        # The log itself is stored; only the feedback is shed
+        return {"feedback": None, "feedback_status": "rejected"}, 202
+    return {
+        "feedback_id": job_id,
+        "feedback_status": "queued",
+        "feedback_url": url_for("api.feedback_status", job_id=job_id),
+    }, 202
+
+
+def _control_error(payload: Dict[str, Any]) -> Optional[str]:
+    """Why the delivery fields of a log request are unacceptable, or None."""
+    if payload.get("callback_url"):
+        try:
+            check_callback_url(payload["callback_url"])
+        except ValueError as e:
+            return str(e)
+    return None
+
+
+def _feedback_response(username: str, prompt: str, payload: Dict[str, Any]):
+    body, status = _request_feedback(username, prompt, payload)
+    resp = jsonify({"status": "ok", **body})
+    if body.get("feedback_status") == "rejected":
+        resp.headers["Retry-After"] = "5"
+    return resp, status
+
+
 def init_gemini() -> None:
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
+    # Kept for callers that want to fail fast; clients are created lazily by the registry
+    if not os.getenv("GEMINI_API_KEY"):
         raise RuntimeError("GEMINI_API_KEY not set")
-    genai.configure(api_key=api_key)
 
 
 def gemini_generate(prompt: str, system_instruction: str = "") -> str:
     try:
-        init_gemini()
-        model = genai.GenerativeModel("gemini-2.5-flash-preview-05-20", system_instruction=system_instruction or None)
-        resp = model.generate_content(prompt)
-        return (resp.text or "").strip()
+        return generate_text(prompt, system_instruction)
     except Exception as e:
         return f"[Generation unavailable: {e}]"
 
 
+@bp.route("/llm/stats", methods=["GET"])
+def llm_stats():
+    return jsonify({**registry.info(), "cache": response_cache.info(), "context": context_builder.info(), "faq": faq_index.info(),
+                    "singleflight": flights.info(),
+                    "governor": governor.info(),
+                    "latency": metrics_registry.snapshot()})
+
+
 @bp.route("/log/meal", methods=["POST"])
 def log_meal():
     payload: Dict[str, Any] = request.get_json(force=True, silent=True) or {}
     username = payload.get("username")
     if not username:
         return jsonify({"error": "username required"}), 400
+    error = _control_error(payload) or _entry_error(MEALS, payload)
+    if error:
+        return jsonify({"error": error}), 400
 
-    meals = _load_json(MEALS_FILE)
-    if username not in meals:
-        meals[username] = []
-    
     meal_entry = {
-        **payload,
+        **{k: v for k, v in payload.items() if k not in _CONTROL_FIELDS},
         "timestamp": datetime.now().isoformat()
     }
-    meals[username].append(meal_entry)
-    _save_json(MEALS_FILE, meals)
+    add_log_entry(MEALS, username, meal_entry)
     
-    # Immediate feedback
-    agent = CommunicationAgent(username)
-    feedback = agent.handle("Provide brief nutrition feedback based on my latest meal log.")
-    return jsonify({"status": "ok", "feedback": feedback})
+    # Immediate feedback (or a job id in async mode)
+    return _feedback_response(username, "Provide brief nutrition feedback based on my latest meal log.", payload)
 
 
 @bp.route("/log/workout", methods=["POST"])
@@ -59,21 +157,17 @@ def log_workout():
     username = payload.get("username")
     if not username:
         return jsonify({"error": "username required"}), 400
-    
-    workout_logs = _load_json(WORKOUT_LOGS_FILE)
-    if username not in workout_logs:
-        workout_logs[username] = []
+    error = _control_error(payload) or _entry_error(WORKOUT_LOGS, payload)
+    if error:
+        return jsonify({"error": error}), 400
     
     workout_entry = {
-        **payload,
+        **{k: v for k, v in payload.items() if k not in _CONTROL_FIELDS},
         "timestamp": datetime.now().isoformat()
     }
-    workout_logs[username].append(workout_entry)
-    _save_json(WORKOUT_LOGS_FILE, workout_logs)
+    add_log_entry(WORKOUT_LOGS, username, workout_entry)
     
-    agent = CommunicationAgent(username)
-    feedback = agent.handle("Give me concise feedback on my most recent workout log and next steps.")
-    return jsonify({"status": "ok", "feedback": feedback})
+    return _feedback_response(username, "Give me concise feedback on my most recent workout log and next steps.", payload)
 
 
 @bp.route("/log/wellness", methods=["POST"])
@@ -82,20 +176,149 @@ def log_wellness():
     username = payload.get("username")
     if not username:
         return jsonify({"error": "username required"}), 400
-    
-    wellness = _load_json(WELLNESS_FILE)
-    if username not in wellness:
-        wellness[username] = []
+    error = _control_error(payload) or _entry_error(WELLNESS, payload)
+    if error:
+        return jsonify({"error": error}), 400
     
     wellness_entry = {
-        **payload,
+        **{k: v for k, v in payload.items() if k not in _CONTROL_FIELDS},
         "timestamp": datetime.now().isoformat()
     }
-    wellness[username].append(wellness_entry)
-    _save_json(WELLNESS_FILE, wellness)
+    add_log_entry(WELLNESS, username, wellness_entry)
     
-    agent = CommunicationAgent(username)
-    feedback = agent.handle("Provide a short recovery recommendation based on my latest wellness log.")
-    return jsonify({"status": "ok", "feedback": feedback})
+    return _feedback_response(username, "Provide a short recovery recommendation based on my latest wellness log.", payload)
+
+
+# Batch ingestion: record type -> store
+BATCH_STORES = {"meal": MEALS, "workout": WORKOUT_LOGS, "wellness": WELLNESS}
+MAX_BATCH_RECORDS = int(os.getenv("MAX_BATCH_RECORDS", "5000"))
+# Device clocks may run a little ahead of the server's
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+
+def _batch_timestamp(value: Any, now: datetime) -> Tuple[Optional[datetime], Optional[str]]:
+    """(timestamp, None) for a record, or (None, error).
+
+    Synced records keep the time they were recorded on the device; records
+    without one get `now`. Zoned timestamps are converted to server-local time
+    like the ones the other endpoints write.
+    """
+    if value is None:
+        return now, None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None, "timestamp must be an ISO 8601 string"
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    if parsed > now + MAX_CLOCK_SKEW:
+        return None, "timestamp is in the future"
+    return parsed, None
+
+
+def _latest(store: str, username: str) -> Optional[datetime]:
+    last = get_last_log_timestamp(store, username)
+    try:
+        return datetime.fromisoformat(last) if last else None
+    except ValueError:
+        return None
+
+
+@bp.route("/log/batch", methods=["POST"])
+def log_batch():
+    """Store many meal/workout/wellness records for one or many users in one request.
+
+    Body: {"records": [{"type": "meal", "username": "...", ...}, ...],
+           "username": default for records without one,
+           "feedback": "none" (default) | "aggregate", "feedback_mode": "sync" | "async"}
+
+    Records keep their own "timestamp" when given, but may not predate the
+    user's newest stored entry of the same type.
+    """
+    payload: Dict[str, Any] = request.get_json(force=True, silent=True) or {}
+    records = payload.get("records")
+    if not isinstance(records, list) or not records:
+        return jsonify({"error": "records must be a non-empty list"}), 400
+    if len(records) > MAX_BATCH_RECORDS:
+        return jsonify({"error": f"at most {MAX_BATCH_RECORDS} records per batch"}), 413
+    error = _control_error(payload)
+    if error:
+        return jsonify({"error": error}), 400
+
+    default_user = payload.get("username")
+    now = datetime.now()
+    groups: Dict[Tuple[str, str], List[Tuple[int, datetime, Dict[str, Any]]]] = {}
+    errors: List[Dict[str, Any]] = []
+    by_store: Dict[str, List[Tuple[int, str, Dict[str, Any]]]] = {}
+    for i, record in enumerate(records):
+        if not isinstance(record, dict):
+            errors.append({"index": i, "error": "record must be an object"})
+            continue
+        store = BATCH_STORES.get(record.get("type"))
+        username = record.get("username") or default_user
+        if store is None:
+            errors.append({"index": i, "error": f"type must be one of {sorted(BATCH_STORES)}"})
+            continue
+        if not username or not isinstance(username, str):
+            errors.append({"index": i, "error": "username required"})
+            continue
+        by_store.setdefault(store, []).append((i, username, record))
+
+    # Field ranges are checked per store over whole columns; then group by (store, user)
+    # so each group is a single append
+    for store, items in by_store.items():
+        range_errors = _entry_errors(store, [record for _, _, record in items])
+        for (i, username, record), error in zip(items, range_errors):
+            timestamp, timestamp_error = _batch_timestamp(record.get("timestamp"), now)
+            if error or timestamp_error:
+                errors.append({"index": i, "error": error or timestamp_error})
+                continue
+            entry = {k: v for k, v in record.items() if k not in ("type", "timestamp")}
+            entry["username"] = username
+            entry["timestamp"] = timestamp.isoformat()
+            groups.setdefault((store, username), []).append((i, timestamp, entry))
+
+    counts: Dict[str, Dict[str, int]] = {}
+    for (store, username), items in groups.items():
+        # The recent-entry readers take append order as time order, so a record may not
+        # predate what is already stored for the user
+        latest = _latest(store, username)
+        entries = []
+        for i, timestamp, entry in sorted(items, key=lambda item: item[1]):
+            if latest is not None and timestamp < latest:
+                errors.append({"index": i, "error": f"timestamp is older than the latest stored {store} entry ({latest.isoformat()})"})
+            else:
+                entries.append(entry)
+        if entries:
+            add_log_entries(store, username, entries)
+            counts.setdefault(username, {})[store] = len(entries)
+    errors.sort(key=lambda e: e["index"])
+    stored = sum(sum(per_store.values()) for per_store in counts.values())
+
+    result: Dict[str, Any] = {
+        "status": "ok" if not errors else "partial",
+        "stored": stored,
+        "rejected": len(errors),
+        "errors": errors,
+    }
+    if payload.get("feedback") == "aggregate":
+        # One combined message per user instead of one per record
+        result["feedback"] = {}
+        for username, per_store in counts.items():
+            summary = ", ".join(f"{n} {store.replace('_', ' ')}" for store, n in per_store.items())
+            prompt = f"I just synced {summary} entries. Give me brief combined feedback on these logs and next steps."
+            result["feedback"][username], _ = _request_feedback(username, prompt, payload)
+    return jsonify(result), 200 if stored else 400
+
+
+@bp.route("/feedback/<job_id>", methods=["GET"])
+def feedback_status(job_id: str):
+    status = feedback_queue.status(job_id)
+    if status is None:
+        return jsonify({"error": "unknown feedback id"}), 404
+    return jsonify(status)
 
 
+@bp.route("/feedback/stats", methods=["GET"])
+def feedback_stats():
+    return jsonify(feedback_queue.info())
@@ -1,9 +1,13 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, session
+import json
+import time
+import functools
+from flask import Flask, render_template, request, redirect, url_for, session, Response, stream_with_context, g
 from database import init_db, get_user, add_user, save_workout, get_last_workout
-from workout_generator import generate_workout
-from chat_agent import chat_with_ai
-from logger import log_message
+from plan_library import workout_for
+from chat_agent import chat_with_ai, stream_chat_with_ai
+from logger import log_message, new_request_id
+from metrics import METRICS_ENABLED, METRICS_PROFILE, registry, start_profile, finish_profile, format_tree
 from api import bp as api_bp
 from dotenv import load_dotenv
 
@@ -19,6 +23,39 @@ app.secret_key = os.getenv("FLASK_SECRET_KEY", "a_very_secret_default_key")
 init_db()
 app.register_blueprint(api_bp)
 
+@app.before_request
+def assign_request_id():
+    # Every log record written while handling this request carries its id
+    request.environ["request_id"] = new_request_id(request.headers.get("X-Request-ID"))
+    g.request_start = time.perf_counter()
+    g.profile = None
+    if METRICS_PROFILE == "all" or (METRICS_PROFILE == "header" and request.headers.get("X-Profile") == "1"):
+        g.profile = start_profile(f"{request.method} {request.path}")
+
+@app.after_request
+def add_request_id_header(response):
+    response.headers["X-Request-ID"] = request.environ.get("request_id", "")
+    if "request_start" in g:
+        # A streamed body (/chat/stream) is only produced after this returns, so the
+        # request is timed when the server closes the response, not at its headers
+        response.call_on_close(functools.partial(
+            finish_request, g.request_start, g.profile, request.endpoint or "unknown", request.method,
+            str(response.status_code),
+        ))
+    return response
+
+def finish_request(start, profile, endpoint, method, status):
+    if METRICS_ENABLED:
+        registry.observe("http_request", time.perf_counter() - start, endpoint=endpoint, method=method, status=status)
+    if profile:
+        tree = finish_profile(*profile)
+        log_message(f"Span tree for {tree['name']}:\n{format_tree(tree)}", "info", spans=tree)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of route, agent, storage and LLM latencies."""
+    return Response(registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 # --- Global State for Chat (Alternative to using Flask Session directly for the chat history) ---
 # In a real app, this should be tied to a user session or database
 chat_history = [] 
@@ -76,8 +113,9 @@ def workout():
         try:
             log_message(f"Attempting to generate workout for {username}.", "info")
             
-            # The duration is hardcoded to 30 mins as a default for this demo structure
-            workout_plan = generate_workout(
+            # The duration is hardcoded to 30 mins as a default for this demo structure.
+            # Profiles without limitations are served from the pre-generated plan library.
+            workout_plan = workout_for(
                 user.fitness_level, 
                 user.goal, 
                 30, 
@@ -139,6 +177,32 @@ def chat():
     log_message(f"Chat page accessed by {username}.", "info")
     return render_template('chat.html', title='AI Coach Chat', history=chat_history, username=username)
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream the coach reply as server-sent events while it is generated."""
+    username = session.get('username', 'Guest')
+    user_message = request.form.get('message') or (request.get_json(silent=True) or {}).get('message', '')
+    if not user_message:
+        return {"error": "message required"}, 400
+    log_message(f"Streaming chat received from {username}: {user_message}", "info")
+
+    def events():
+        start = time.perf_counter()
+        first_chunk_ms = None
+        for chunk in stream_chat_with_ai(user_message, username):
+            if first_chunk_ms is None:
+                first_chunk_ms = (time.perf_counter() - start) * 1000
+            yield f"data: {json.dumps({'delta': chunk})}\n\n"
+        total_ms = (time.perf_counter() - start) * 1000
+        yield f"event: done\ndata: {json.dumps({'first_chunk_ms': round(first_chunk_ms or total_ms, 1), 'total_ms': round(total_ms, 1)})}\n\n"
+        log_message(f"AI response streamed to {username}: first chunk {first_chunk_ms or total_ms:.0f}ms, total {total_ms:.0f}ms", "info")
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
 
 if __name__ == '__main__':
     # Flask runs on port 5000 by default
@@ -0,0 +1,81 @@
+"""Compare the JSON segment and SQLite storage backends at scale.
+
+Populates each backend with N users (profile + a few meal/wellness/chat
+records each), then times the hot request-path reads on random users.
+
+    python benchmarks/bench_backends.py --users 10000 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Population is a bulk load, durability is irrelevant here
+os.environ.setdefault("STORAGE_FSYNC", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_cache import FileCache  # noqa: E402
+from sqlite_store import SQLiteStore  # noqa: E402
+from storage import JsonLogStore  # noqa: E402
+
+STORES = ["users", "meals", "workout_logs", "wellness", "chat"]
+
+
+def populate(store, users: int, per_user: int) -> float:
+    start = time.perf_counter()
+    for i in range(users):
+        name = f"user{i}"
+        store.append("users", name, {"name": name, "age": 20 + i % 50, "last_updated": "2024-01-01T00:00:00"})
+        for store_name in ("meals", "wellness", "chat"):
+            store.append_many(store_name, name, [
+                {"n": j, "sleep_quality": (i + j) % 100, "timestamp": f"2024-01-{j % 28 + 1:02d}T08:00:00"}
+                for j in range(per_user)
+            ])
+    return time.perf_counter() - start
+
+
+def bench_reads(store, users: int, lookups: int) -> dict:
+    rng = random.Random(42)
+    names = [f"user{rng.randrange(users)}" for _ in range(lookups)]
+    timings = {}
+    for label, fn in (
+        ("last profile", lambda n: store.last("users", n)),
+        ("recent wellness", lambda n: store.read_recent("wellness", n, 3)),
+        ("recent chat", lambda n: store.read_recent("chat", n, 10)),
+        ("user activity", lambda n: store.activity(n, STORES)),
+    ):
+        start = time.perf_counter()
+        for name in names:
+            fn(name)
+        timings[label] = (time.perf_counter() - start) / lookups * 1e6
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--per-user", type=int, default=5, help="records per user per log store")
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    for users in args.users:
+        print(f"\n== {users:,} users, {args.per_user} records per store ==")
+        with tempfile.TemporaryDirectory() as tmp:
+            backends = {
+                # Fresh cache so the JSON numbers include cold reads
+                "json": JsonLogStore(os.path.join(tmp, "json"), cache=FileCache()),
+                "sqlite": SQLiteStore(os.path.join(tmp, "coach.db")),
+            }
+            for name, store in backends.items():
+                load = populate(store, users, args.per_user)
+                cold = bench_reads(store, users, args.lookups)
+                warm = bench_reads(store, users, args.lookups)
+                print(f"{name:>6}: populate {load:.1f}s ({users / load:,.0f} users/s)")
+                for label in cold:
+                    print(f"        {label:<16} cold {cold[label]:8.1f} us  warm {warm[label]:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Chat latency: sequential vs concurrent agents, and synthesis skipping.
+
+Uses the fake_gemini stand-in with a fixed delay per role, so no API key
+or network is needed.
+
+    python benchmarks/bench_fanout.py --agent-delay 0.3 --synth-delay 0.3 --slow 1.5 --timeout 1.0
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp())  # storage writes go to ./data
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+# Keep the benchmark message routed to every agent
+os.environ.setdefault("ROUTER_CLASSIFIER", "off")
+# Every round must reach the stub model, not the response cache
+os.environ.setdefault("LLM_CACHE", "0")
+os.environ.setdefault("STORAGE_FSYNC", "0")
+
+import fake_gemini  # noqa: E402
+import chat_agent  # noqa: E402
+
+
+def run(mode: str, message: str, rounds: int) -> float:
+    chat_agent.AGENT_FANOUT = mode
+    agent = chat_agent.CommunicationAgent("bench_user")
+    start = time.perf_counter()
+    for _ in range(rounds):
+        agent.handle(message)
+    return (time.perf_counter() - start) / rounds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agent-delay", type=float, default=0.3)
+    parser.add_argument("--synth-delay", type=float, default=0.3)
+    parser.add_argument("--slow", type=float, default=None, help="delay of the nutrition agent (default: --agent-delay)")
+    parser.add_argument("--timeout", type=float, default=chat_agent.AGENT_TIMEOUT_SECONDS)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    # The nutrition agent plays the slow specialist
+    fake_gemini.install(role_latency={
+        "fitness": args.agent_delay,
+        "wellness": args.agent_delay,
+        "nutrition": args.agent_delay if args.slow is None else args.slow,
+        "synthesis": args.synth_delay,
+    })
+    chat_agent.AGENT_TIMEOUT_SECONDS = args.timeout
+
+    message = "Can you help me get in better shape overall?"  # routes to "mixed"
+    for mode in ("sequential", "parallel"):
+        latency = run(mode, message, args.rounds)
+        print(f"{mode:>10}: {latency * 1000:7.0f} ms per mixed-intent message")
+    agent = chat_agent.CommunicationAgent("bench_user")
+    chat_agent.AGENT_FANOUT = "parallel"
+    agent.handle(message)
+    print(f"timed out agents (parallel, timeout {args.timeout}s): {agent.timed_out or 'none'}")
+
+    single = "Plan my gym workout for tomorrow"  # routes to "fitness" only
+    for mode in ("always", "auto"):
+        chat_agent.SYNTHESIS_MODE = mode
+        latency = run("parallel", single, args.rounds)
+        print(f"single-intent, synthesis={mode:>6}: {latency * 1000:7.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
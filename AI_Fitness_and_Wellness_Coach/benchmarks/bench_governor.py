@@ -0,0 +1,86 @@
+"""Behaviour during a Gemini outage, with and without the governor.
+
+Runs --requests workout generations from --concurrency threads in three
+phases (healthy, outage where every call fails, recovery) against the
+fake_gemini stand-in, and reports latency, upstream calls and fallbacks.
+Without the governor every request keeps reaching the failing API and waits
+for its error; with it the circuit breaker opens and requests fall back to
+the local workout engine at once.
+
+    python benchmarks/bench_governor.py --requests 100 --concurrency 8 --llm-latency 0.2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp())  # storage writes go to ./data
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+os.environ.setdefault("LOG_STDOUT", "0")
+os.environ["LLM_CACHE"] = "0"
+os.environ.setdefault("GOVERNOR_BREAKER_COOLDOWN", "1")
+
+import fake_gemini  # noqa: E402
+
+fake_gemini.install()
+
+import governor  # noqa: E402
+import llm  # noqa: E402
+import singleflight  # noqa: E402
+from workout_generator import generate_workout  # noqa: E402
+
+# Each request gets its own profile so single-flight does not merge them
+AGES = range(18, 90)
+
+
+def phase(requests: int, concurrency: int) -> dict:
+    def one(i: int):
+        start = time.perf_counter()
+        plan = generate_workout("intermediate", "muscle gain", 30 + i % 4 * 15, "dumbbells", "female", AGES[i % len(AGES)])
+        # The fake model's plans start with "Warm-up:", the local engine's with "Workout ("
+        return time.perf_counter() - start, plan.startswith("Workout (")
+
+    calls_before = sum(fake_gemini.calls.values())
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    latencies = sorted(r[0] for r in results)
+    return {
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p95": latencies[int(len(latencies) * 0.95)] * 1000,
+        "upstream": sum(fake_gemini.calls.values()) - calls_before,
+        "fallbacks": sum(1 for r in results if r[1]),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    args = parser.parse_args()
+    singleflight.SINGLEFLIGHT_ENABLED = False
+    governor.RETRY_BASE_SECONDS = args.llm_latency / 4
+
+    for enabled in (False, True):
+        governor.GOVERNOR_ENABLED = enabled
+        # Fresh limiter and breaker state for each run
+        governor.governor = llm.governor = governor.Governor()
+        print(f"governor {'on' if enabled else 'off'}:")
+        # "recovering" starts right after the cooldown: one probe call closes the breaker again
+        for name, error_rate in (("healthy", 0.0), ("outage", 1.0), ("recovering", 0.0), ("recovered", 0.0)):
+            if name == "recovering":
+                time.sleep(float(os.environ["GOVERNOR_BREAKER_COOLDOWN"]))
+            fake_gemini.install(latency=args.llm_latency, error_rate=error_rate)
+            r = phase(args.requests, args.concurrency)
+            print(f"  {name:>10}: p50 {r['p50']:6.0f} ms  p95 {r['p95']:6.0f} ms  upstream calls {r['upstream']:4d}  "
+                  f"fallbacks {r['fallbacks']:4d}/{args.requests}")
+        print(f"  {governor.governor.info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Ingestion throughput: per-record /api/log/* calls vs one /api/log/batch call.
+
+Runs the Flask app in-process with the fake_gemini stand-in answering after
+--llm-delay seconds per call (response cache disabled, so every call pays it).
+
+    python benchmarks/bench_ingest.py --records 200 --llm-delay 0.05
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp())  # storage writes go to ./data
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+os.environ["LLM_CACHE"] = "0"
+
+import fake_gemini  # noqa: E402
+
+fake_gemini.install()
+
+from app import app  # noqa: E402
+
+KINDS = ("meal", "workout", "wellness")
+
+
+def make_records(n: int, users: int) -> list:
+    return [
+        {"type": KINDS[i % 3], "username": f"sync_user{i % users}", "calories": 400 + i, "sleep_quality": i % 100}
+        for i in range(n)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=200)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--llm-delay", type=float, default=0.05)
+    args = parser.parse_args()
+    fake_gemini.install(latency=args.llm_delay)
+
+    client = app.test_client()
+    records = make_records(args.records, args.users)
+
+    start = time.perf_counter()
+    for r in records:
+        body = {k: v for k, v in r.items() if k != "type"}
+        client.post(f"/api/log/{r['type']}", json=body)
+    per_record = time.perf_counter() - start
+
+    results = {}
+    for feedback in ("none", "aggregate"):
+        start = time.perf_counter()
+        resp = client.post("/api/log/batch", json={"records": records, "feedback": feedback})
+        results[feedback] = time.perf_counter() - start
+        assert resp.json["stored"] == args.records, resp.json
+
+    print(f"{args.records} records, {args.users} users, {args.llm_delay * 1000:.0f} ms per LLM call")
+    print(f"per-record endpoints:        {per_record:7.2f}s  {args.records / per_record:10,.0f} records/s")
+    for feedback, elapsed in results.items():
+        print(f"batch (feedback={feedback:>9}): {elapsed:7.2f}s  {args.records / elapsed:10,.0f} records/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Intent routing accuracy and throughput on the labeled message set.
+
+Compares the old first-match keyword scan with the compiled multi-label
+router (keywords only, and with the naive Bayes fallback evaluated by
+k-fold cross-validation so it never sees its test messages).
+
+    python benchmarks/bench_intent_router.py [--rounds 20000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_router import INTENTS, IntentRouter, NaiveBayes, load_examples  # noqa: E402
+
+
+def legacy_route(message: str) -> list:
+    # The keyword scan CommunicationAgent.route_intent used before the router
+    text = message.lower()
+    if any(k in text for k in ["workout", "training", "exercise", "gym"]):
+        return ["fitness"]
+    if any(k in text for k in ["calorie", "meal", "protein", "diet", "macro"]):
+        return ["nutrition"]
+    if any(k in text for k in ["sleep", "stress", "recovery", "hydrate", "fatigue"]):
+        return ["wellness"]
+    return list(INTENTS)
+
+
+def evaluate(route, examples) -> dict:
+    exact = agent_calls = missed = extra = 0
+    for text, labels in examples:
+        predicted = set(route(text))
+        exact += predicted == set(labels)
+        agent_calls += len(predicted)
+        missed += len(set(labels) - predicted)
+        extra += len(predicted - set(labels))
+    n = len(examples)
+    return {"exact": exact / n, "agents_per_msg": agent_calls / n, "missed": missed, "extra": extra}
+
+
+def cross_validated(examples, folds: int = 5):
+    """A route function that answers each message with a classifier trained on the other folds."""
+    routers = {}
+    for fold in range(folds):
+        train = [e for i, e in enumerate(examples) if i % folds != fold]
+        routers[fold] = IntentRouter(classifier=NaiveBayes().fit(train))
+    position = {text: i for i, (text, _) in enumerate(examples)}
+    return lambda text: routers[position[text] % folds].route(text)
+
+
+def throughput(route, messages, rounds: int) -> float:
+    start = time.perf_counter()
+    for i in range(rounds):
+        route(messages[i % len(messages)])
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+
+    examples = load_examples()
+    messages = [text for text, _ in examples]
+    keyword_router = IntentRouter(classifier=None)
+    candidates = {
+        "legacy first-match scan": legacy_route,
+        "compiled router": keyword_router.route,
+        "router + naive Bayes (5-fold)": cross_validated(examples),
+    }
+    print(f"{len(examples)} labeled messages")
+    for label, route in candidates.items():
+        result = evaluate(route, examples)
+        micros = throughput(route, messages, args.rounds)
+        print(f"{label:32s} exact={result['exact']:.1%}  agents/msg={result['agents_per_msg']:.2f}  "
+              f"missed={result['missed']:3d}  extra={result['extra']:3d}  {micros:6.1f} us/msg")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Per-request logging overhead: the old synchronous log_message vs the queue-based one.
+
+Each simulated request logs --calls messages (app.py logs ~3 per request).
+Console output goes to a temp file in both cases so terminal speed does not
+skew the numbers; the time measured is what the request thread pays.
+
+    python benchmarks/bench_logging.py --requests 20000 --calls 3
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+WORK_DIR = tempfile.mkdtemp()
+os.environ.setdefault("LOG_FILE", os.path.join(WORK_DIR, "app.log"))
+# Room for the whole run, so the numbers measure the hot path rather than drops
+os.environ.setdefault("LOG_QUEUE_SIZE", "1000000")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def legacy_logger(path: str):
+    """The pre-queue implementation: FileHandler + StreamHandler on the root logger, then print()."""
+    root = logging.getLogger("legacy")
+    root.setLevel(logging.INFO)
+    root.propagate = False
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    for handler in (logging.FileHandler(path), logging.StreamHandler(sys.stdout)):
+        handler.setFormatter(formatter)
+        root.addHandler(handler)
+
+    def log_message(message: str, level: str = "info") -> None:
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if level.lower() == "error":
+            root.error(message)
+        elif level.lower() == "warning":
+            root.warning(message)
+        else:
+            root.info(message)
+        print(f"[{timestamp}] {level.upper()}: {message}")
+    return log_message
+
+
+def run(log_message, requests: int, calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(requests):
+        for j in range(calls):
+            log_message(f"Chat pipeline for user{i % 100} step {j}: context=1.2ms, agents=300.5ms", "info")
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--calls", type=int, default=3, help="log calls per request")
+    args = parser.parse_args()
+
+    console = open(os.path.join(WORK_DIR, "stdout.log"), "w")
+    real_stdout, sys.stdout = sys.stdout, console
+    try:
+        legacy = run(legacy_logger(os.path.join(WORK_DIR, "legacy.log")), args.requests, args.calls)
+
+        import logger  # noqa: E402  (binds its console handler to the redirected stdout)
+        queued = run(logger.log_message, args.requests, args.calls)
+        logger.flush(timeout=60)
+        logger._sampler.info_sample_rate = 0.1
+        sampled = run(logger.log_message, args.requests, args.calls)
+        logger.flush(timeout=60)
+        stats = logger.logging_stats()
+    finally:
+        sys.stdout = real_stdout
+        console.close()
+
+    print(f"{args.calls} log calls per request, {args.requests} requests")
+    print(f"legacy sync (file + stream + print): {legacy:7.1f} us/request")
+    print(f"queued JSON:                          {queued:7.1f} us/request")
+    print(f"queued JSON, INFO sampled at 10%:     {sampled:7.1f} us/request")
+    print(f"dropped={stats['dropped']} sampled_out={stats['sampled_out']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Duplicate in-flight requests: model calls with and without single-flight.
+
+Sends --duplicates identical requests at once (a double-submitted /workout
+form, a retried /api/log/meal) and counts the upstream calls made by the
+fake_gemini stand-in. Plan library and response cache are off, so every
+request would otherwise reach the model. Agent calls are keyed on their full
+prompt, so a duplicate log request whose entry has already changed the
+user's context makes its own call.
+
+    python benchmarks/bench_singleflight.py --duplicates 4 --llm-latency 0.3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp())  # storage writes go to ./data
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+os.environ.setdefault("STORAGE_FSYNC", "0")
+os.environ.setdefault("LOG_STDOUT", "0")
+os.environ["LLM_CACHE"] = "0"
+os.environ["PLAN_LIBRARY"] = "0"
+
+import fake_gemini  # noqa: E402
+
+fake_gemini.install()
+
+import singleflight  # noqa: E402
+from app import app  # noqa: E402
+from database import add_user  # noqa: E402
+
+
+def burst(path: str, duplicates: int, **kwargs) -> float:
+    def send(_):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["username"] = "dup_user"
+        return client.post(path, **kwargs).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=duplicates) as pool:
+        list(pool.map(send, range(duplicates)))
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duplicates", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    args = parser.parse_args()
+    fake_gemini.install(latency=args.llm_latency)
+    add_user("dup_user", 34, "female", "intermediate", "muscle gain", "dumbbells")
+
+    scenarios = (
+        ("/workout", {}),
+        ("/api/log/meal", {"json": {"username": "dup_user", "meal": "chicken salad", "calories": 520, "protein": 40}}),
+    )
+    for enabled in (False, True):
+        singleflight.SINGLEFLIGHT_ENABLED = enabled
+        for path, kwargs in scenarios:
+            before = sum(fake_gemini.calls.values())
+            elapsed = burst(path, args.duplicates, **kwargs)
+            calls = sum(fake_gemini.calls.values()) - before
+            label = "on" if enabled else "off"
+            print(f"single-flight {label:>3} {path:<14} {args.duplicates} requests: {calls:2d} model calls, {elapsed * 1000:6.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
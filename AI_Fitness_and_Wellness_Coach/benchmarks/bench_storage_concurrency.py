@@ -0,0 +1,79 @@
+"""Multi-process stress benchmark for the append-only JSON store.
+
+Spawns several processes (like gunicorn workers), each running several
+threads that append to a handful of shared users, then checks that every
+record landed exactly once and reports throughput.
+
+    python benchmarks/bench_storage_concurrency.py --procs 4 --threads 8 --writes 250
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import Process, Queue
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import JsonLogStore  # noqa: E402
+
+
+def _worker(data_dir: str, proc_id: int, threads: int, writes: int, users: int, out: Queue) -> None:
+    store = JsonLogStore(data_dir)
+
+    def run(thread_id: int) -> None:
+        for seq in range(writes):
+            username = f"user{(thread_id + seq) % users}"
+            store.append("meals", username, {"proc": proc_id, "thread": thread_id, "seq": seq})
+
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    out.put(dict(store.committer.stats))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--procs", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=250, help="appends per thread")
+    parser.add_argument("--users", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        out: Queue = Queue()
+        procs = [
+            Process(target=_worker, args=(data_dir, p, args.threads, args.writes, args.users, out))
+            for p in range(args.procs)
+        ]
+        start = time.perf_counter()
+        for p in procs:
+            p.start()
+        stats = [out.get() for _ in procs]
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - start
+
+        store = JsonLogStore(data_dir)
+        seen = set()
+        duplicates = 0
+        for username in store.usernames("meals"):
+            for r in store.read_all("meals", username):
+                key = (r["proc"], r["thread"], r["seq"])
+                duplicates += key in seen
+                seen.add(key)
+
+    expected = args.procs * args.threads * args.writes
+    fsyncs = sum(s["fsyncs"] for s in stats)
+    print(f"appends:    {expected} ({args.procs} procs x {args.threads} threads x {args.writes})")
+    print(f"stored:     {len(seen)}  lost: {expected - len(seen)}  duplicated: {duplicates}")
+    print(f"elapsed:    {elapsed:.2f}s  throughput: {expected / elapsed:,.0f} appends/s")
+    print(f"fsyncs:     {fsyncs}  (avg {expected / max(fsyncs, 1):.1f} appends per fsync)")
+    sys.exit(0 if len(seen) == expected and not duplicates else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Time to first byte: blocking /chat vs streaming /chat/stream.
+
+Uses the fake_gemini stand-in: --agent-delay per specialist call, and the
+synthesis generated as --chunks chunks spaced --chunk-delay apart (cache
+disabled).
+
+    python benchmarks/bench_stream.py --agent-delay 0.3 --chunks 20 --chunk-delay 0.05
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp())  # storage writes go to ./data
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+# Keep the benchmark message routed to every agent
+os.environ.setdefault("ROUTER_CLASSIFIER", "off")
+os.environ["LLM_CACHE"] = "0"
+
+import fake_gemini  # noqa: E402
+
+fake_gemini.install()
+
+from app import app  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agent-delay", type=float, default=0.3)
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--chunk-delay", type=float, default=0.05)
+    args = parser.parse_args()
+    # Only the synthesis is generated chunk by chunk; specialists answer after a fixed delay
+    fake_gemini.install(
+        role_latency={"fitness": args.agent_delay, "nutrition": args.agent_delay, "wellness": args.agent_delay},
+        chunks=args.chunks,
+        role_chunk_delay={"synthesis": args.chunk_delay},
+    )
+
+    client = app.test_client()
+    message = "Help me get healthier overall"  # mixed intent -> synthesis runs
+
+    start = time.perf_counter()
+    client.post("/chat", data={"message": message})
+    blocking = time.perf_counter() - start
+
+    start = time.perf_counter()
+    resp = client.post("/chat/stream", data={"message": message}, buffered=False)
+    body = iter(resp.response)
+    next(body)
+    first = time.perf_counter() - start
+    for _ in body:
+        pass
+    total = time.perf_counter() - start
+
+    print(f"blocking /chat:       first byte {blocking * 1000:7.0f} ms (page rendered after full reply)")
+    print(f"streaming /chat/stream first byte {first * 1000:7.0f} ms, complete {total * 1000:7.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Throughput of the local workout engine.
+
+Builds plans for random profiles (level, goal, duration, equipment and
+limitations drawn from realistic values) and reports plans/sec for plan
+selection alone and with text rendering.
+
+    python benchmarks/bench_workout_engine.py --plans 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from workout_engine import build_plan, format_plan  # noqa: E402
+
+LEVELS = ["Beginner", "Intermediate", "Advanced"]
+GOALS = ["Fat Loss", "Muscle Gain", "Endurance", "General Health"]
+EQUIPMENT = ["", "none", "dumbbells", "dumbbells, bands", "kettlebell", "full gym", "resistance bands and a pull-up bar"]
+LIMITATIONS = ["", "", "", "bad knee", "lower back pain", "asthma", "shoulder impingement, wrist pain", "pregnant (2nd trimester)"]
+
+
+def profiles(n: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    return [
+        (rng.choice(LEVELS), rng.choice(GOALS), rng.choice([20, 30, 45, 60]), rng.choice(EQUIPMENT), rng.choice(LIMITATIONS))
+        for _ in range(n)
+    ]
+
+
+def bench(inputs: list, render: bool) -> float:
+    start = time.perf_counter()
+    for level, goal, duration, equipment, limitations in inputs:
+        plan = build_plan(level, goal, duration, equipment, limitations)
+        if render:
+            format_plan(plan)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--plans", type=int, default=100000)
+    args = parser.parse_args()
+
+    inputs = profiles(args.plans)
+    for label, render in (("build_plan", False), ("build_plan + format_plan", True)):
+        elapsed = bench(inputs, render)
+        print(f"{label:26s} {args.plans / elapsed:>10,.0f} plans/s  ({elapsed / args.plans * 1e6:.1f} us/plan)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Offline stand-in for google.generativeai used by the benchmarks.
+
+install() replaces genai.GenerativeModel (and genai.configure) with FakeModel,
+so chat agents, log feedback, workout generation and chat memory all run
+without GEMINI_API_KEY or network. Each call sleeps for a latency drawn from
+the configured distribution (optionally per role, see ROLES), fails with the
+configured probability using the same google.api_core exceptions the real
+client raises, and returns a response with .text and .usage_metadata.
+Generating an answer takes `chunks` x `chunk_delay` (optionally per role) on
+top of the latency; streaming calls spread it over `chunks` parts.
+
+Import this module (and call install()) before importing app code:
+
+    import fake_gemini
+    fake_gemini.install(latency=0.3, distribution="lognormal", error_rate=0.02)
+    from app import app
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, Optional
+
+import google.generativeai as genai
+from google.api_core import exceptions as api_exceptions
+
+# Role of a call, recognized from a phrase in its system instruction (first match wins)
+ROLES = (
+    ("synthesis", "intelligent fitness coach"),
+    ("fitness", "professional fitness coach"),
+    ("nutrition", "dietitian"),
+    ("wellness", "wellness coach"),
+    ("summary", "running notes"),
+    ("workout", "Design safe, effective workouts"),
+)
+
+ERRORS = {
+    "unavailable": api_exceptions.ServiceUnavailable,
+    "rate_limit": api_exceptions.ResourceExhausted,
+    "deadline": api_exceptions.DeadlineExceeded,
+    "internal": api_exceptions.InternalServerError,
+}
+
+DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+CANNED = {
+    "synthesis": "Here is your plan: warm up, train the main lifts, eat enough protein and sleep 7-9 hours.",
+    "fitness": "Do 3 sets of 10 squats, push-ups and rows, resting 60 seconds between sets.",
+    "nutrition": "Aim for a palm of protein, a fist of vegetables and a cupped hand of carbs per meal.",
+    "wellness": "Keep a regular bedtime and take one full rest day this week.",
+    "summary": "- goal: general health\n- prefers short answers",
+    "workout": "Warm-up: 5 min march\nMain: 3 x 10 goblet squats, 3 x 8 push-ups\nCool-down: stretch",
+    "other": "Nice work, keep it up.",
+}
+
+
+class FakeConfig:
+    """Latency/error model shared by every FakeModel instance."""
+
+    def __init__(self, latency: float = 0.0, distribution: str = "fixed", role_latency: Optional[Dict[str, float]] = None,
+                 error_rate: float = 0.0, error: str = "unavailable", chunks: int = 8, chunk_delay: float = 0.0,
+                 role_chunk_delay: Optional[Dict[str, float]] = None, seed: Optional[int] = None):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"distribution must be one of {DISTRIBUTIONS}")
+        if error not in ERRORS:
+            raise ValueError(f"error must be one of {tuple(ERRORS)}")
+        self.latency = latency
+        self.distribution = distribution
+        self.role_latency = dict(role_latency or {})
+        self.error_rate = error_rate
+        self.error = error
+        self.chunks = max(1, chunks)
+        self.chunk_delay = chunk_delay
+        self.role_chunk_delay = dict(role_chunk_delay or {})
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, role: str) -> float:
+        mean = self.role_latency.get(role, self.latency)
+        if mean <= 0:
+            return 0.0
+        with self._lock:
+            if self.distribution == "uniform":
+                return self._random.uniform(0, 2 * mean)
+            if self.distribution == "exponential":
+                return self._random.expovariate(1 / mean)
+            if self.distribution == "lognormal":
+                # sigma 0.5 gives a p99 of about 3x the median, similar to hosted LLM APIs
+                return self._random.lognormvariate(0, 0.5) * mean / 1.133
+            return mean
+
+    def generation_time(self, role: str) -> float:
+        """Time to produce the whole answer, spread over `chunks` parts when streaming."""
+        return self.role_chunk_delay.get(role, self.chunk_delay) * self.chunks
+
+    def fails(self) -> bool:
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+
+config = FakeConfig()
+calls: Counter = Counter()
+_calls_lock = threading.Lock()
+
+
+def _count(key: str) -> None:
+    with _calls_lock:
+        calls[key] += 1
+
+
+def error_count() -> int:
+    with _calls_lock:
+        return sum(n for key, n in calls.items() if key.endswith(".error"))
+
+
+def _role(system_instruction: str) -> str:
+    for role, phrase in ROLES:
+        if phrase in system_instruction:
+            return role
+    return "other"
+
+
+def _response(text: str, prompt: str) -> SimpleNamespace:
+    usage = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4)
+    return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+class FakeModel:
+    """Drop-in replacement for genai.GenerativeModel."""
+
+    def __init__(self, model_name: str = "", system_instruction: Optional[str] = None, **_: Any):
+        self.model_name = model_name
+        self.role = _role(system_instruction or "")
+
+    def _fail(self) -> None:
+        _count(f"{self.role}.error")
+        raise ERRORS[config.error](f"fake {config.error} error ({self.role})")
+
+    def _stream(self, prompt: str, text: str) -> Iterator[SimpleNamespace]:
+        words = text.split(" ")
+        parts = min(config.chunks, len(words))
+        # The whole stream takes generation_time(), however short the canned text is
+        pause = config.generation_time(self.role) / parts
+        for i in range(parts):
+            time.sleep(pause)
+            piece = words[i * len(words) // parts:(i + 1) * len(words) // parts]
+            yield _response(" ".join(piece) + " ", prompt)
+
+    def generate_content(self, prompt: Any, stream: bool = False, request_options: Optional[Dict[str, Any]] = None, **_: Any):
+        prompt = str(prompt)
+        delay = config.delay(self.role)
+        timeout = (request_options or {}).get("timeout")
+        if timeout is not None and delay > timeout:
+            # Like the real client: give up after the request timeout
+            time.sleep(timeout)
+            _count(f"{self.role}.error")
+            raise api_exceptions.DeadlineExceeded(f"fake request timed out after {timeout:.1f}s ({self.role})")
+        time.sleep(delay)
+        if config.fails():
+            self._fail()
+        _count(self.role)
+        text = CANNED.get(self.role, CANNED["other"])
+        if stream:
+            return self._stream(prompt, text)
+        # A blocking call returns once the whole answer has been generated
+        time.sleep(config.generation_time(self.role))
+        return _response(text, prompt)
+
+
+def install(**kwargs: Any) -> FakeConfig:
+    """Patch genai to use FakeModel with the given FakeConfig settings; returns the config."""
+    global config
+    config = FakeConfig(**kwargs)
+    genai.GenerativeModel = FakeModel
+    genai.configure = lambda **_: None
+    # Clients created before install() would still be real ones
+    if "llm" in sys.modules:
+        sys.modules["llm"].registry.reset()
+    return config
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Common --llm-* flags for benchmark scripts."""
+    group = parser.add_argument_group("fake Gemini")
+    group.add_argument("--llm-latency", type=float, default=0.05, help="mean seconds per model call")
+    group.add_argument("--llm-distribution", choices=DISTRIBUTIONS, default="fixed")
+    group.add_argument("--llm-error-rate", type=float, default=0.0, help="fraction of calls that raise")
+    group.add_argument("--llm-error", choices=tuple(ERRORS), default="unavailable")
+    group.add_argument("--llm-seed", type=int, default=None)
+
+
+def install_from_args(args: argparse.Namespace, **overrides: Any) -> FakeConfig:
+    settings = dict(
+        latency=args.llm_latency,
+        distribution=args.llm_distribution,
+        error_rate=args.llm_error_rate,
+        error=args.llm_error,
+        seed=args.llm_seed,
+    )
+    settings.update(overrides)
+    return install(**settings)
@@ -0,0 +1,211 @@
+"""Offline load test of /chat, /workout and /api/log/* with a fake Gemini.
+
+Fills a temporary DATA_DIR with synthetic users (synthetic_data.py), patches
+the model client (fake_gemini.py) and drives the Flask app in-process from
+--concurrency threads. Each scenario reports throughput, p50/p95/p99 latency,
+errors, model calls and peak memory. Results can be saved with --save and
+compared against a saved run with --baseline; the exit code is 1 when p95
+latency or throughput regress by more than --tolerance.
+
+    python benchmarks/load_test.py --scenario all --users 200 --requests 300 --concurrency 8 --llm-latency 0.05
+    python benchmarks/load_test.py --save baseline.json
+    python benchmarks/load_test.py --baseline baseline.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+os.environ.setdefault("STORAGE_FSYNC", "0")
+os.environ.setdefault("LOG_STDOUT", "0")
+
+import fake_gemini  # noqa: E402
+import synthetic_data  # noqa: E402
+
+SCENARIOS = ("chat", "workout", "log")
+
+CHAT_MESSAGES = (
+    "How much protein should I eat per day?",
+    "Plan my gym workout for tomorrow",
+    "I slept badly and feel tired, should I still train?",
+    "What should I eat after a workout to build muscle?",
+    "Can you help me get in better shape overall?",
+    "My knees hurt when I squat, what can I do instead?",
+    "How do I stay motivated to exercise in the evening?",
+    "Give me a high protein vegetarian dinner idea",
+)
+
+# Same generators (and value ranges) as the seeded history; the API stamps its own timestamp
+LOG_PAYLOADS = (
+    ("meal", synthetic_data._meal),
+    ("workout", synthetic_data._workout),
+    ("wellness", synthetic_data._wellness),
+)
+
+
+def _chat(client, username: str, rng: random.Random) -> int:
+    return client.post("/chat", data={"message": rng.choice(CHAT_MESSAGES)}).status_code
+
+
+def _workout(client, username: str, rng: random.Random) -> int:
+    return client.post("/workout").status_code
+
+
+def _log(client, username: str, rng: random.Random) -> int:
+    kind, make = rng.choice(LOG_PAYLOADS)
+    return client.post(f"/api/log/{kind}", json={"username": username, **make(rng, datetime.now())}).status_code
+
+
+REQUESTS: Dict[str, Callable] = {"chat": _chat, "workout": _workout, "log": _log}
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_scenario(app, name: str, users: List[str], requests: int, concurrency: int, seed: int) -> Dict[str, Any]:
+    send = REQUESTS[name]
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(requests))
+    calls_before = sum(fake_gemini.calls.values())
+    errors_before = fake_gemini.error_count()
+
+    def worker(index: int) -> None:
+        rng = random.Random(seed + index)
+        client = app.test_client()
+        username = users[index % len(users)]
+        with client.session_transaction() as session:
+            session["username"] = username
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            start = time.perf_counter()
+            try:
+                status = send(client, username, rng)
+            except Exception:
+                status = 599
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                # Generated requests are all valid, so a 4xx is as much a failure as a 5xx
+                if status >= 400:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "throughput_rps": round(len(latencies) / wall, 1),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1),
+        "max_ms": round(max(latencies, default=0) * 1000, 1),
+        "llm_calls": sum(fake_gemini.calls.values()) - calls_before,
+        "llm_errors": fake_gemini.error_count() - errors_before,
+        "peak_rss_mb": round(_rss_mb(), 1),
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    """Regressions of `results` against `baseline` beyond `tolerance` (a fraction)."""
+    problems = []
+    for name, now in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if before["p95_ms"] and now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            problems.append(f"{name}: p95 {now['p95_ms']} ms > baseline {before['p95_ms']} ms")
+        if now["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            problems.append(f"{name}: throughput {now['throughput_rps']} rps < baseline {before['throughput_rps']} rps")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--users", type=int, default=100, help="synthetic users to create")
+    parser.add_argument("--logs", type=int, default=30, help="synthetic log entries per user")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--dir", default=None, help="data directory (default: a fresh temp dir)")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report the Python heap peak (slower)")
+    parser.add_argument("--save", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    fake_gemini.add_arguments(parser)
+    args = parser.parse_args()
+
+    save = os.path.abspath(args.save) if args.save else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    if args.dir:
+        os.makedirs(args.dir, exist_ok=True)
+    os.chdir(args.dir or tempfile.mkdtemp(prefix="coach-load-"))  # database.DATA_DIR is relative
+    fake_gemini.install_from_args(args)
+
+    start = time.perf_counter()
+    users = synthetic_data.generate(args.users, args.logs, seed=args.seed)
+    print(f"data: {args.users} users x {args.logs} logs in {time.perf_counter() - start:.1f}s ({os.getcwd()})")
+
+    from app import app  # noqa: E402  (imported after the fake model is installed)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    results: Dict[str, Dict[str, Any]] = {}
+    scenarios: Tuple[str, ...] = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    print(f"{'scenario':>8} {'reqs':>6} {'err':>4} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'llm':>6} {'llm err':>7} {'rss MB':>7}")
+    for name in scenarios:
+        result = run_scenario(app, name, users, args.requests, args.concurrency, args.seed)
+        if args.tracemalloc:
+            result["heap_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+            tracemalloc.reset_peak()
+        results[name] = result
+        print(f"{name:>8} {result['requests']:6d} {result['errors']:4d} {result['throughput_rps']:8.1f} "
+              f"{result['p50_ms']:8.1f} {result['p95_ms']:8.1f} {result['p99_ms']:8.1f} {result['llm_calls']:6d} "
+              f"{result['llm_errors']:7d} {result['peak_rss_mb']:7.1f}")
+
+    if save:
+        with open(save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Fill DATA_DIR with synthetic users and meal/workout/wellness logs.
+
+Profiles are drawn from the same levels, goals and equipment the app offers;
+logs are spread over the last --days days, so analytics, readiness and the
+context builder see realistic histories. Writes go through database.py, so
+STORAGE_BACKEND=sqlite fills the SQLite store instead.
+
+    python benchmarks/synthetic_data.py --dir /tmp/coach --users 1000 --logs 60
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+LEVELS = ("beginner", "intermediate", "advanced")
+GOALS = ("weight loss", "muscle gain", "endurance", "general health", "flexibility")
+EQUIPMENT = ("none", "dumbbells", "bands", "dumbbells, bands", "kettlebell", "full gym")
+GENDERS = ("male", "female", "other")
+LIMITATIONS = ("", "", "", "", "bad knees", "lower back pain", "shoulder injury")
+MEAL_NAMES = ("oatmeal with berries", "chicken salad", "rice and beans", "salmon and potatoes", "greek yogurt", "pasta")
+ACTIVITIES = ("running", "strength", "cycling", "yoga", "hiit", "swimming")
+
+
+def _meal(rng: random.Random, ts: datetime) -> dict:
+    return {"meal": rng.choice(MEAL_NAMES), "calories": rng.randint(250, 950), "protein": rng.randint(5, 60),
+            "timestamp": ts.isoformat()}
+
+
+def _workout(rng: random.Random, ts: datetime) -> dict:
+    return {"activity": rng.choice(ACTIVITIES), "duration": rng.choice((20, 30, 45, 60, 75)), "rpe": rng.randint(3, 9),
+            "timestamp": ts.isoformat()}
+
+
+def _wellness(rng: random.Random, ts: datetime) -> dict:
+    return {"sleep_quality": rng.randint(30, 95), "stress_level": rng.randint(1, 5),
+            "sleep_hours": round(rng.uniform(5, 9), 1), "timestamp": ts.isoformat()}
+
+
+def generate(users: int, logs: int, days: int = 60, seed: int = 7, prefix: str = "synth_user") -> List[str]:
+    """Create `users` profiles with `logs` entries each (split across the three log stores)."""
+    import database
+    from database import MEALS, WORKOUT_LOGS, WELLNESS
+
+    database.init_db()
+    rng = random.Random(seed)
+    now = datetime.now()
+    makers = ((MEALS, _meal), (WORKOUT_LOGS, _workout), (WELLNESS, _wellness))
+    names = []
+    for i in range(users):
+        name = f"{prefix}{i}"
+        database.add_user(name, rng.randint(18, 70), rng.choice(GENDERS), rng.choice(LEVELS), rng.choice(GOALS),
+                          rng.choice(EQUIPMENT), rng.choice(LIMITATIONS))
+        for n, (store, make) in enumerate(makers):
+            count = logs // 3 + (1 if n < logs % 3 else 0)
+            if not count:
+                continue
+            stamps = sorted(now - timedelta(seconds=rng.uniform(0, days * 86400)) for _ in range(count))
+            database.add_log_entries(store, name, [make(rng, ts) for ts in stamps])
+        names.append(name)
+    return names
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", default=".", help="directory whose data/ folder is filled")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--logs", type=int, default=30, help="log entries per user")
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    os.chdir(args.dir)  # database.DATA_DIR is relative to the working directory
+    start = time.perf_counter()
+    generate(args.users, args.logs, args.days, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"{args.users} users x {args.logs} logs written to {os.path.abspath('data')} in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,49 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Callable, Tuple, Iterator
+import hashlib
 import os
+import time
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
 
-import google.generativeai as genai
+from database import save_chat_message, get_user_stats
+from analytics import trend_engine
+import readiness
+from llm import generate_text, stream_text
+from governor import GovernorError
+from llm_cache import age_band
+from context_builder import context_builder
+from chat_memory import chat_memory
+from intent_router import router
+from faq import FAQ_ENABLED, faq_index
+from metrics import span
+from singleflight import flights
+from logger import log_message
 
-from database import save_chat_message, get_recent_wellness_logs, get_user_chat_history, get_user_stats
+# Specialist agents run concurrently ("parallel") or one after another ("sequential")
+AGENT_FANOUT = os.getenv("AGENT_FANOUT", "parallel").lower()
+# Agents still running after this many seconds are dropped from the reply
+AGENT_TIMEOUT_SECONDS = float(os.getenv("AGENT_TIMEOUT_SECONDS", "30"))
 
+# When to run the synthesis LLM call over the agent answers:
+#   "auto"   - only when more than one agent answered (single answers pass straight through)
+#   "always" - every time (previous behaviour)
+#   "never"  - join the answers locally
+SYNTHESIS_MODE = os.getenv("SYNTHESIS_MODE", "auto").lower()
 
-def _ensure_gemini():
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise RuntimeError("GEMINI_API_KEY not set")
-    genai.configure(api_key=api_key)
+NO_AGENT_REPLY = "Sorry, your coaches are busy or taking too long to respond right now. Please try again in a moment."
+
+# Shown in place of an agent's answer when it fails
+UNAVAILABLE_LABELS = {"fitness": "Training", "nutrition": "Nutrition", "wellness": "Recovery"}
+
+# (agent.plan, message) pairs keyed by agent name
+AgentTask = Tuple[Callable[[Dict[str, Any], str], str], str]
+
+_agent_pool = ThreadPoolExecutor(max_workers=int(os.getenv("AGENT_POOL_SIZE", "16")), thread_name_prefix="agent")
+
+
+class AgentUnavailable(RuntimeError):
+    """The reply would have been built from fallback text because agents failed, timed out or were shed."""
 
 
 class DataAnalystAgent:
@@ -18,7 +51,7 @@ class DataAnalystAgent:
         self.username = username
 
     def get_standardized_metrics(self) -> Dict[str, Any]:
-        # Get comprehensive user stats from JSON storage
+        # One lookup of the incrementally maintained per-user stats record
         stats = get_user_stats(self.username)
         return {
             "num_meals": stats.get("total_meals", 0),
@@ -26,20 +59,31 @@ class DataAnalystAgent:
             "num_wellness_logs": stats.get("total_wellness_logs", 0),
             "profile": stats.get("profile", {}),
             "last_activity": stats.get("last_activity", ""),
-            "total_chat_messages": stats.get("total_chat_messages", 0)
+            "total_chat_messages": stats.get("total_chat_messages", 0),
+            "averages": stats.get("averages", {}),
+            "trends": trend_engine.trends(self.username)
         }
 
 
+def _coalesced(agent: str, prompt: str, system_instruction: str) -> str:
+    # Keyed on everything the call depends on, so only truly identical calls share an answer
+    key = ("agent", agent, hashlib.sha256(f"{system_instruction}\x00{prompt}".encode("utf-8")).hexdigest())
+    try:
+        return flights.do(key, generate_text, prompt, system_instruction, timeout=AGENT_TIMEOUT_SECONDS)
+    except GovernorError:
+        # Shed by the governor (breaker open, quota): leave this agent out of the reply right away
+        return ""
+
+
 class FitnessPlanningAgent:
+    SYSTEM_INSTRUCTION = "You are a professional fitness coach. Consider gender, age, and physical limitations when giving advice. Be smart about response length: give detailed plans for complex requests but keep simple questions brief. Always prioritize safety and proper form."
+
     def plan(self, context: Dict[str, Any], user_message: str) -> str:
-        _ensure_gemini()
-        model = genai.GenerativeModel("gemini-2.5-flash-preview-05-20", 
-            system_instruction="You are a professional fitness coach. Consider gender, age, and physical limitations when giving advice. Be smart about response length: give detailed plans for complex requests but keep simple questions brief. Always prioritize safety and proper form.")
-        
         profile = context.get('profile', {})
+        context_text = context_builder.build("fitness", context)
         prompt_parts = [
             f"User Query: {user_message}",
-            f"User Profile: {profile}",
+            f"User Context:\n{context_text}",
             "Analyze the request and provide an appropriate response."
         ]
         
@@ -51,136 +95,256 @@ class FitnessPlanningAgent:
         if profile.get('gender'):
             prompt_parts.append(f"Consider gender-specific recommendations for: {profile.get('gender')}")
         if profile.get('age'):
-            prompt_parts.append(f"Consider age-appropriate exercises for: {profile.get('age')} years old")
+            prompt_parts.append(f"Consider age-appropriate exercises for: {age_band(profile.get('age'))} years old")
         
         prompt = "\n".join(prompt_parts)
-        try:
-            resp = model.generate_content(prompt)
-            return (resp.text or "").strip()
-        except Exception as e:
-            return f"Training guidance unavailable: {e}"
+        context_builder.record_prompt("fitness", prompt, context_text)
+        return _coalesced("fitness", prompt, self.SYSTEM_INSTRUCTION)
 
 
 class NutritionPlanningAgent:
+    SYSTEM_INSTRUCTION = "You are a practical dietitian. Be intelligent about response length: give detailed meal plans, recipes, and nutrition programs when requested, but keep simple questions brief. Always provide actionable advice."
+
     def plan(self, context: Dict[str, Any], user_message: str) -> str:
-        _ensure_gemini()
-        model = genai.GenerativeModel("gemini-2.5-flash-preview-05-20", 
-            system_instruction="You are a practical dietitian. Be intelligent about response length: give detailed meal plans, recipes, and nutrition programs when requested, but keep simple questions brief. Always provide actionable advice.")
-        prompt = f"User: {user_message}\nContext: {context.get('profile', {})}\nAnalyze the request and provide an appropriate response - detailed for meal plans/programs, brief for simple questions."
-        try:
-            resp = model.generate_content(prompt)
-            return (resp.text or "").strip()
-        except Exception as e:
-            return f"Nutrition guidance unavailable: {e}"
+        context_text = context_builder.build("nutrition", context)
+        prompt = f"User: {user_message}\nContext:\n{context_text}\nAnalyze the request and provide an appropriate response - detailed for meal plans/programs, brief for simple questions."
+        context_builder.record_prompt("nutrition", prompt, context_text)
+        return _coalesced("nutrition", prompt, self.SYSTEM_INSTRUCTION)
 
 
 class WellnessRecoveryAgent:
+    SYSTEM_INSTRUCTION = "You are a supportive wellness coach. Be smart about response length: give detailed recovery plans and protocols when needed, but keep simple questions brief. Always provide practical, empathetic advice."
+
     def plan(self, context: Dict[str, Any], user_message: str) -> str:
-        _ensure_gemini()
-        model = genai.GenerativeModel("gemini-2.5-flash-preview-05-20", 
-            system_instruction="You are a supportive wellness coach. Be smart about response length: give detailed recovery plans and protocols when needed, but keep simple questions brief. Always provide practical, empathetic advice.")
-        prompt = f"User: {user_message}\nContext: {context.get('profile', {})}\nAnalyze the request and provide an appropriate response - detailed for recovery plans, brief for simple questions."
-        try:
-            resp = model.generate_content(prompt)
-            return (resp.text or "").strip()
-        except Exception as e:
-            return f"Recovery guidance unavailable: {e}"
+        context_text = context_builder.build("wellness", context)
+        prompt = f"User: {user_message}\nContext:\n{context_text}\nAnalyze the request and provide an appropriate response - detailed for recovery plans, brief for simple questions."
+        context_builder.record_prompt("wellness", prompt, context_text)
+        return _coalesced("wellness", prompt, self.SYSTEM_INSTRUCTION)
 
 
 class CommunicationAgent:
+    SYNTHESIS_INSTRUCTION = "You are an intelligent fitness coach. Analyze the user's request and provide an appropriate response. For simple questions, be brief. For complex requests (meal plans, workout programs), be comprehensive and detailed. Always be practical and helpful."
+
     def __init__(self, username: str):
         self.username = username
         self.analyst = DataAnalystAgent(username)
         self.fitness = FitnessPlanningAgent()
         self.nutrition = NutritionPlanningAgent()
         self.wellness = WellnessRecoveryAgent()
+        self.timed_out: list = []
+        # Agents that raised or returned nothing (shed by the governor) in the last run
+        self.failed: list = []
+        self.intent = ""
+        # Per-stage latency of the last handle() call, in milliseconds
+        self.timings: Dict[str, float] = {}
 
-    def route_intent(self, message: str) -> str:
-        text = message.lower()
-        if any(k in text for k in ["workout", "training", "exercise", "gym"]):
-            return "fitness"
-        if any(k in text for k in ["calorie", "meal", "protein", "diet", "macro"]):
-            return "nutrition"
-        if any(k in text for k in ["sleep", "stress", "recovery", "hydrate", "fatigue"]):
-            return "wellness"
-        return "mixed"
+    @contextmanager
+    def _stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            with span(f"chat.{name}"):
+                yield
+        finally:
+            self.timings[name] = round((time.perf_counter() - start) * 1000, 1)
 
-    def synthesize(self, parts: Dict[str, str]) -> str:
-        _ensure_gemini()
-        model = genai.GenerativeModel("gemini-2.5-flash-preview-05-20", 
-            system_instruction="You are an intelligent fitness coach. Analyze the user's request and provide an appropriate response. For simple questions, be brief. For complex requests (meal plans, workout programs), be comprehensive and detailed. Always be practical and helpful.")
+    def _run_agent(self, name: str, plan: Callable[[Dict[str, Any], str], str], context: Dict[str, Any], message: str) -> str:
+        with span(f"agent.{name}"):
+            try:
+                answer = plan(context, message)
+            except Exception as e:
+                self.failed.append(name)
+                return f"{UNAVAILABLE_LABELS.get(name, name.title())} guidance unavailable: {e}"
+            if not answer:
+                self.failed.append(name)
+            return answer
+
+    def route_intent(self, message: str) -> List[str]:
+        """Intents the message covers ("fitness", "nutrition", "wellness"), scored in one regex pass."""
+        return router.route(message)
+
+    def _synthesis_prompt(self, parts: Dict[str, str]) -> str:
         prompt = "\n".join([f"{k.upper()}: {v}" for k, v in parts.items() if v])
+        return f"Based on these agent insights, provide an intelligent response that matches the complexity of the user's request:\n{prompt}"
+
+    def synthesize(self, parts: Dict[str, str]) -> str:
         try:
-            resp = model.generate_content(f"Based on these agent insights, provide an intelligent response that matches the complexity of the user's request:\n{prompt}")
-            return (resp.text or "").strip()
+            return generate_text(self._synthesis_prompt(parts), self.SYNTHESIS_INSTRUCTION)
         except Exception:
             # Fallback: simple join
             return " ".join([v for v in parts.values() if v])
 
+    def synthesize_stream(self, parts: Dict[str, str]) -> Iterator[str]:
+        """Like synthesize(), but yields text chunks as the model produces them."""
+        started = False
+        try:
+            for chunk in stream_text(self._synthesis_prompt(parts), self.SYNTHESIS_INSTRUCTION):
+                started = True
+                yield chunk
+        except Exception:
+            if not started:
+                yield " ".join([v for v in parts.values() if v])
+
+    def _needs_synthesis(self, outputs: Dict[str, str]) -> bool:
+        parts = [v for v in outputs.values() if v]
+        return not (SYNTHESIS_MODE == "never" or (SYNTHESIS_MODE == "auto" and len(parts) == 1))
+
+    def compose_reply(self, outputs: Dict[str, str]) -> str:
+        """Turn agent answers into one reply, skipping synthesis when it adds nothing."""
+        if not self._needs_synthesis(outputs):
+            return "\n\n".join(v for v in outputs.values() if v)
+        with self._stage("synthesis"):
+            return self.synthesize(outputs)
+
+    def run_agents(self, tasks: Dict[str, AgentTask], context: Dict[str, Any]) -> Dict[str, str]:
+        """Run the selected specialist agents and collect their answers.
+
+        In parallel mode all agents share one deadline, so latency is roughly the
+        slowest agent instead of the sum. Agents that miss the deadline are left
+        out (partial results) and recorded in `self.timed_out`.
+        """
+        self.timed_out = []
+        self.failed = []
+        if AGENT_FANOUT == "sequential":
+            return {name: self._run_agent(name, plan, context, msg) for name, (plan, msg) in tasks.items()}
+
+        # Each agent runs in a copy of the caller's context so its log records keep the request id
+        futures = {
+            name: _agent_pool.submit(contextvars.copy_context().run, self._run_agent, name, plan, context, msg)
+            for name, (plan, msg) in tasks.items()
+        }
+        wait(futures.values(), timeout=AGENT_TIMEOUT_SECONDS)
+        outputs: Dict[str, str] = {}
+        for name, future in futures.items():
+            if future.done():
+                outputs[name] = future.result()
+            else:
+                # Not started yet -> cancelled; already running -> result is discarded
+                future.cancel()
+                self.timed_out.append(name)
+        return outputs
+
     def _should_reduce_intensity(self) -> bool:
-        logs = get_recent_wellness_logs(self.username, limit=3)
-        poor = 0
-        for row in logs:
-            # Expect keys like sleep_quality (0-100) or stress_level (1-5)
-            sleep_quality = row.get("sleep_quality")
-            stress_level = row.get("stress_level")
-            if sleep_quality is not None and isinstance(sleep_quality, (int, float)) and sleep_quality < 50:
-                poor += 1
-            elif stress_level is not None and isinstance(stress_level, (int, float)) and stress_level >= 4:
-                poor += 1
-        return poor >= 3
-
-    def handle(self, message: str) -> str:
+        # Last 3 wellness logs with poor sleep (<50) or high stress (>=4).
+        # Use the nightly precomputed flag while it is current, else the trend engine's series.
+        row = readiness.lookup(self.username)
+        if row is not None:
+            return row["reduce_intensity"]
+        return trend_engine.should_reduce_intensity(self.username, n=3)
+
+    def _quick_reply(self, message: str) -> Optional[str]:
         # Handle simple greetings and common responses quickly
         message_lower = message.lower().strip()
         
         if message_lower in ["hi", "hello", "hey", "hi there"]:
-            reply = f"Hi {self.username}! 👋 I'm your AI fitness coach. What can I help you with today?"
+            return f"Hi {self.username}! 👋 I'm your AI fitness coach. What can I help you with today?"
         elif message_lower in ["thanks", "thank you", "thx"]:
-            reply = "You're welcome! Keep up the great work! 💪"
+            return "You're welcome! Keep up the great work! 💪"
         elif message_lower in ["bye", "goodbye", "see you"]:
-            reply = "See you later! Stay consistent with your fitness goals! 🏃‍♀️"
-        else:
-            # Use multi-agent system for complex queries
+            return "See you later! Stay consistent with your fitness goals! 🏃‍♀️"
+        if FAQ_ENABLED:
+            # Common questions are answered locally, templated with the user's profile
+            return faq_index.answer(message, get_user_stats(self.username).get("profile", {}))
+        return None
+
+    def _gather(self, message: str) -> Tuple[Dict[str, str], str]:
+        """Build context, route and run the specialist agents.
+
+        Returns the agent outputs and the message as it should be stored.
+        """
+        self.timings = {}
+        with self._stage("context"):
             context = self.analyst.get_standardized_metrics()
+            context["username"] = self.username
             
-            # Add chat history context for better memory
-            chat_history = get_user_chat_history(self.username, limit=3)
-            context["recent_chat"] = chat_history
+            # Chat memory: running summary of older turns plus the newest turns verbatim
+            context["chat_summary"], context["recent_chat"] = chat_memory.context(self.username)
             
             # Add the original message to context for better analysis
             context["original_message"] = message
             
-            intent = self.route_intent(message)
-
-            outputs: Dict[str, str] = {}
-            if intent == "fitness":
-                if self._should_reduce_intensity():
-                    message = message + "\nNOTE: Reduce intensity by ~30% this week due to recovery risk."
-                outputs["fitness"] = self.fitness.plan(context, message)
-            elif intent == "nutrition":
-                outputs["nutrition"] = self.nutrition.plan(context, message)
-            elif intent == "wellness":
-                outputs["wellness"] = self.wellness.plan(context, message)
-            else:
-                # Mixed: get inputs from all agents
-                mixed_msg = message
-                if self._should_reduce_intensity():
-                    mixed_msg = mixed_msg + "\nNOTE: Reduce intensity by ~30% this week due to recovery risk."
-                outputs["fitness"] = self.fitness.plan(context, mixed_msg)
-                outputs["nutrition"] = self.nutrition.plan(context, message)
-                outputs["wellness"] = self.wellness.plan(context, message)
-
-            reply = self.synthesize(outputs)
-        
+            # Only the agents whose topics the message covers are asked
+            intents = self.route_intent(message)
+            self.intent = "+".join(intents)
+
+            agents = {"fitness": self.fitness, "nutrition": self.nutrition, "wellness": self.wellness}
+            tasks: Dict[str, AgentTask] = {name: (agents[name].plan, message) for name in intents}
+            if "fitness" in tasks and self._should_reduce_intensity():
+                fitness_msg = message + "\nNOTE: Reduce intensity by ~30% this week due to recovery risk."
+                tasks["fitness"] = (self.fitness.plan, fitness_msg)
+                if intents == ["fitness"]:
+                    message = fitness_msg
+
+        with self._stage("agents"):
+            outputs = self.run_agents(tasks, context)
+        return outputs, message
+
+    def _log_timings(self, outputs: Dict[str, str]) -> None:
+        stages = ", ".join(f"{k}={v}ms" for k, v in self.timings.items())
+        log_message(f"Chat pipeline for {self.username} ({self.intent}, {len(outputs)} agent(s)): {stages}", "info",
+                    intent=self.intent, agents=len(outputs), timings_ms=self.timings)
+
+    def _persist(self, message: str, reply: str) -> None:
         # Persist chat transcript
         try:
             save_chat_message(self.username, "user", message)
             save_chat_message(self.username, "coach", reply)
+            chat_memory.note_turns(self.username)
         except Exception:
             pass
+
+    def handle(self, message: str, raise_on_fallback: bool = False) -> str:
+        """Answer a message and persist the turn.
+
+        With raise_on_fallback, a reply that would contain fallback text instead
+        of model answers raises AgentUnavailable and is not persisted, so a
+        background caller can retry it.
+        """
+        reply = self._quick_reply(message)
+        if reply is None:
+            # Use multi-agent system for complex queries
+            outputs, message = self._gather(message)
+            self._log_timings(outputs)
+            if raise_on_fallback and (self.failed or self.timed_out or not any(outputs.values())):
+                raise AgentUnavailable("no model answer from " + (", ".join(self.failed + self.timed_out) or "any agent"))
+            if not any(outputs.values()):
+                reply = NO_AGENT_REPLY
+            else:
+                reply = self.compose_reply(outputs)
+        
+        self._persist(message, reply)
         return reply
 
+    def handle_stream(self, message: str) -> Iterator[str]:
+        """Like handle(), but yields the reply in chunks as the final stage produces them.
+
+        The turn is persisted even when the client disconnects mid-reply (the
+        generator is closed early), with the part of the reply sent so far.
+        """
+        sent: List[str] = []
+        try:
+            reply = self._quick_reply(message)
+            if reply is not None:
+                sent.append(reply)
+                yield reply
+                return
+            outputs, message = self._gather(message)
+            if not any(outputs.values()):
+                sent.append(NO_AGENT_REPLY)
+                yield NO_AGENT_REPLY
+            elif not self._needs_synthesis(outputs):
+                reply = self.compose_reply(outputs)
+                sent.append(reply)
+                yield reply
+            else:
+                with self._stage("synthesis"):
+                    for chunk in self.synthesize_stream(outputs):
+                        sent.append(chunk)
+                        yield chunk
+            self._log_timings(outputs)
+        finally:
+            if sent:
+                self._persist(message, "".join(sent))
+
 
 def chat_with_ai(user_message: str, username: Optional[str] = "Guest") -> str:
     try:
@@ -190,3 +354,9 @@ def chat_with_ai(user_message: str, username: Optional[str] = "Guest") -> str:
         return f"I'm having trouble responding right now: {e}"
 
 
+def stream_chat_with_ai(user_message: str, username: Optional[str] = "Guest") -> Iterator[str]:
+    try:
+        agent = CommunicationAgent(username or "Guest")
+        yield from agent.handle_stream(user_message)
+    except Exception as e:
+        yield f"I'm having trouble responding right now: {e}"
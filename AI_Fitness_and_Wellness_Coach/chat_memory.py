@@ -0,0 +1,126 @@
+import os
+import queue
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import database
+from database import CHAT, CHAT_HISTORY_LIMIT, get_chat_summary, save_chat_summary
+from llm import generate_text
+from logger import log_message
+
+# Long-term chat memory.
+# Agents see a running summary of the conversation plus every turn it does not
+# cover yet (at least the newest RECENT_TURNS), so no turn drops out of both.
+# After each exchange the user is queued for a background worker that folds
+# the turns between the summary's cursor (timestamp of the last summarized
+# turn) and the recent tail into the summary - one short LLM call per batch,
+# never a re-read of the whole history.
+
+CHAT_MEMORY_ENABLED = os.getenv("CHAT_MEMORY", "1") != "0"
+# Turns always passed to the agents verbatim, even once summarized
+RECENT_TURNS = int(os.getenv("CHAT_MEMORY_RECENT_TURNS", "4"))
+# Unsummarized turns older than the recent tail that trigger a summary update
+SUMMARY_BATCH = int(os.getenv("CHAT_MEMORY_BATCH", "8"))
+SUMMARY_MAX_CHARS = int(os.getenv("CHAT_SUMMARY_MAX_CHARS", "1200"))
+# Characters of each turn given to the summarizer
+TURN_CHARS = 400
+
+SUMMARY_INSTRUCTION = "You maintain a coach's running notes about one client. Merge the new conversation turns into the existing notes. Keep goals, preferences, injuries, progress, commitments and open questions; drop greetings and small talk. Answer with the updated notes only, as short bullet points."
+
+
+def _pending(username: str, summary: Optional[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(turns to fold into the summary, turns the agents see verbatim).
+
+    The verbatim turns are the newest RECENT_TURNS plus any older turn the
+    summary does not cover yet, so nothing falls between the two.
+    """
+    turns = database._store.read_recent(CHAT, username, CHAT_HISTORY_LIMIT)
+    tail = max(0, len(turns) - RECENT_TURNS)
+    cursor = (summary or {}).get("cursor", "")
+    unsummarized = next((i for i, t in enumerate(turns) if t.get("timestamp", "") > cursor), len(turns))
+    return [t for t in turns[:tail] if t.get("timestamp", "") > cursor], turns[min(tail, unsummarized):]
+
+
+def _local_summary(previous: str, turns: List[Dict[str, Any]]) -> str:
+    # Fallback when the model is unavailable: keep the user's own words, newest last
+    lines = [previous] if previous else []
+    lines += [f"- {' '.join(str(t.get('message', '')).split())[:160]}" for t in turns if t.get("role") == "user"]
+    return "\n".join(lines)[-SUMMARY_MAX_CHARS:]
+
+
+def summarize(username: str) -> bool:
+    """Fold new turns into the user's summary; returns True if it changed."""
+    summary = get_chat_summary(username)
+    new_turns, _ = _pending(username, summary)
+    if not new_turns:
+        return False
+    previous = (summary or {}).get("summary", "")
+    transcript = "\n".join(
+        f"{t.get('role', '')}: {' '.join(str(t.get('message', '')).split())[:TURN_CHARS]}" for t in new_turns
+    )
+    prompt = f"Existing notes:\n{previous or '(none)'}\n\nNew turns:\n{transcript}\n\nKeep the notes under {SUMMARY_MAX_CHARS} characters."
+    try:
+        text = generate_text(prompt, SUMMARY_INSTRUCTION, cache=False).strip()[:SUMMARY_MAX_CHARS]
+    except Exception as e:
+        log_message(f"Chat summary for {username} fell back to local notes: {e}", "warning")
+        text = ""
+    save_chat_summary(username, text or _local_summary(previous, new_turns), new_turns[-1].get("timestamp", ""))
+    return True
+
+
+class ChatMemory:
+    """Background summarizer; one worker thread drains a de-duplicated queue of usernames."""
+
+    def __init__(self):
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._queued: set = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"queued": 0, "summarized": 0, "failed": 0}
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="chat-memory", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            username = self._queue.get()
+            with self._lock:
+                self._queued.discard(username)
+            try:
+                if summarize(username):
+                    self.stats["summarized"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                log_message(f"Chat summary for {username} failed: {e}", "error")
+
+    def note_turns(self, username: str) -> None:
+        """Call after saving chat turns; queues a summary update once enough turns have aged out."""
+        if not CHAT_MEMORY_ENABLED:
+            return
+        new_turns, _ = _pending(username, get_chat_summary(username))
+        if len(new_turns) < SUMMARY_BATCH:
+            return
+        with self._lock:
+            if username in self._queued:
+                return
+            self._queued.add(username)
+        self.stats["queued"] += 1
+        self._ensure_worker()
+        self._queue.put(username)
+
+    def context(self, username: str) -> Tuple[str, List[Dict[str, Any]]]:
+        """(running summary, turns it does not cover plus the recent tail) for the agents' prompt context."""
+        if not CHAT_MEMORY_ENABLED:
+            return "", database._store.read_recent(CHAT, username, RECENT_TURNS)
+        summary = get_chat_summary(username)
+        _, recent = _pending(username, summary)
+        return (summary or {}).get("summary", ""), recent
+
+    def info(self) -> Dict[str, Any]:
+        return {**self.stats, "pending": self._queue.qsize()}
+
+
+chat_memory = ChatMemory()
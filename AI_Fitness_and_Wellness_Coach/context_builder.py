@@ -0,0 +1,188 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, List, Tuple
+
+from llm_cache import age_band
+
+# Prompt context assembly for the specialist agents.
+# Each agent gets its most relevant profile fields, then a compact analytics
+# summary, then the running conversation summary and the newest chat turns,
+# added in that order until the token budget runs out. The profile +
+# analytics text only changes when the user's stats record does, so it is
+# cached per (user, agent) between turns.
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "400"))
+CONTEXT_CACHE_SIZE = int(os.getenv("CONTEXT_CACHE_SIZE", "2000"))
+# Characters of a single chat turn kept in the history section
+CHAT_TURN_CHARS = 160
+CHARS_PER_TOKEN = 4
+
+# Profile fields in priority order per agent
+PROFILE_FIELDS = {
+    "fitness": ("physical_limitations", "fitness_level", "goal", "equipment", "age", "gender"),
+    "nutrition": ("goal", "age", "gender", "fitness_level", "physical_limitations"),
+    "wellness": ("physical_limitations", "age", "goal", "fitness_level", "gender"),
+}
+
+# (trend name, metric) pairs worth showing each agent, most useful first
+TREND_FIELDS = {
+    "fitness": (("workout_load", "acwr"), ("workout_load", "sessions_7d"), ("sleep_quality", "mean_7d"), ("stress_level", "mean_7d")),
+    "nutrition": (("calories", "daily_mean_7d"), ("protein", "daily_mean_7d"), ("workout_load", "sessions_7d")),
+    "wellness": (("sleep_quality", "mean_7d"), ("stress_level", "mean_7d"), ("sleep_quality", "mean_28d"), ("workout_load", "acwr")),
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _truncate(text: str, tokens: int) -> str:
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    return text[: max(limit - 3, 0)].rstrip() + "..."
+
+
+def _profile_section(profile: Dict[str, Any], fields: Tuple[str, ...]) -> str:
+    parts = []
+    for field in fields:
+        value = profile.get(field)
+        if value in (None, ""):
+            continue
+        if field == "age":
+            value = age_band(value)
+        parts.append(f"{field}={value}")
+    return "Profile: " + ", ".join(parts) if parts else ""
+
+
+def _analytics_section(context: Dict[str, Any], fields: Tuple[Tuple[str, str], ...]) -> str:
+    trends = context.get("trends") or {}
+    parts = [
+        f"workouts={context.get('num_workout_logs', 0)}",
+        f"meals={context.get('num_meals', 0)}",
+        f"wellness_logs={context.get('num_wellness_logs', 0)}",
+    ]
+    for name, metric in fields:
+        value = (trends.get(name) or {}).get(metric)
+        if value is not None:
+            parts.append(f"{name}.{metric}={value}")
+    return "Recent activity: " + ", ".join(parts)
+
+
+def _chat_section(turns: List[Dict[str, Any]], tokens: int) -> str:
+    """Newest turns that fit in `tokens`, shown oldest first."""
+    header = "Recent chat:"
+    used = estimate_tokens(header)
+    lines: List[str] = []
+    for turn in reversed(turns):
+        line = f"{turn.get('role', '')}: {_truncate(' '.join(str(turn.get('message', '')).split()), CHAT_TURN_CHARS // CHARS_PER_TOKEN)}"
+        cost = estimate_tokens(line) + 1
+        if used + cost > tokens:
+            break
+        lines.append(line)
+        used += cost
+    if not lines:
+        return ""
+    return "\n".join([header] + lines[::-1])
+
+
+class ContextBuilder:
+    """Builds bounded prompt context per agent and records prompt-size statistics."""
+
+    def __init__(self, budget: int = CONTEXT_TOKEN_BUDGET, max_entries: int = CONTEXT_CACHE_SIZE):
+        self.budget = budget
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[Any, str]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._agents: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def _fingerprint(context: Dict[str, Any]) -> Tuple:
+        # The profile and counts change only with a new write; the trend windows
+        # (7/28-day means, ACWR) also move as days pass, so the date is part of the key
+        profile = context.get("profile") or {}
+        return (
+            date.today().isoformat(),
+            profile.get("last_updated"), context.get("last_activity"),
+            context.get("num_meals"), context.get("num_workout_logs"), context.get("num_wellness_logs"),
+        )
+
+    def _base(self, agent: str, context: Dict[str, Any]) -> str:
+        """Profile + analytics text, trimmed to the budget, cached until the user's data changes."""
+        key = (context.get("username", ""), agent)
+        fingerprint = self._fingerprint(context)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == fingerprint:
+                self._cache.move_to_end(key)
+                self._hits += 1
+                return cached[1]
+            self._misses += 1
+
+        sections, remaining = [], self.budget
+        for section in (
+            _profile_section(context.get("profile") or {}, PROFILE_FIELDS.get(agent, PROFILE_FIELDS["fitness"])),
+            _analytics_section(context, TREND_FIELDS.get(agent, ())),
+        ):
+            if not section or remaining <= 0:
+                continue
+            section = _truncate(section, remaining)
+            sections.append(section)
+            remaining -= estimate_tokens(section) + 1
+        text = "\n".join(sections)
+
+        with self._lock:
+            self._cache[key] = (fingerprint, text)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return text
+
+    def build(self, agent: str, context: Dict[str, Any]) -> str:
+        """Context text for one agent's prompt, at most `budget` tokens."""
+        text = self._base(agent, context)
+        remaining = self.budget - estimate_tokens(text) - 1
+        summary = context.get("chat_summary") or ""
+        if summary and remaining > 0:
+            # Leave at least half of what is left for the verbatim recent turns
+            summary = _truncate("Conversation notes:\n" + summary, remaining // 2)
+            text = f"{text}\n{summary}" if text else summary
+            remaining -= estimate_tokens(summary) + 1
+        history = _chat_section(context.get("recent_chat") or [], remaining) if remaining > 0 else ""
+        if history:
+            text = f"{text}\n{history}" if text else history
+        return text
+
+    def record_prompt(self, agent: str, prompt: str, context_text: str) -> None:
+        """Track the size of a prompt an agent is about to send."""
+        tokens = estimate_tokens(prompt)
+        with self._lock:
+            stats = self._agents.setdefault(agent, {"prompts": 0, "tokens": 0, "max_tokens": 0, "context_tokens": 0})
+            stats["prompts"] += 1
+            stats["tokens"] += tokens
+            stats["max_tokens"] = max(stats["max_tokens"], tokens)
+            stats["context_tokens"] += estimate_tokens(context_text)
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            agents = {
+                name: {**stats, "avg_tokens": round(stats["tokens"] / stats["prompts"], 1)}
+                for name, stats in self._agents.items()
+            }
+            lookups = self._hits + self._misses
+            return {
+                "budget_tokens": self.budget,
+                "cache_entries": len(self._cache),
+                "cache_hits": self._hits,
+                "cache_misses": self._misses,
+                "cache_hit_ratio": round(self._hits / lookups, 3) if lookups else 0.0,
+                "agents": agents,
+            }
+
+
+context_builder = ContextBuilder()
@@ -3,8 +3,31 @@ import json
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 
+from file_cache import default_cache
+from storage import StorageBackend, JsonLogStore, atomic_write, locked_segment, parse_json_file
+import user_stats
+from metrics import instrument_module
+
 # JSON file-based storage for moderate-term memory
 DATA_DIR = "data"
+
+# Storage backend: "json" (append-only per-user segments) or "sqlite"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join(DATA_DIR, "coach.db"))
+
+# Store names - each one holds an ordered list of records per user
+USERS = "users"
+WORKOUTS = "workouts"
+CHAT = "chat"
+MEALS = "meals"
+WORKOUT_LOGS = "workout_logs"
+WELLNESS = "wellness"
+# Rolling conversation summaries (see chat_memory.py); the newest record wins
+CHAT_SUMMARIES = "chat_summaries"
+LOG_STORES = (MEALS, WORKOUT_LOGS, WELLNESS)
+ALL_STORES = (USERS, WORKOUTS, CHAT, MEALS, WORKOUT_LOGS, WELLNESS, CHAT_SUMMARIES)
+
+# Legacy whole-file JSON stores, imported into segments by init_db()
 USERS_FILE = os.path.join(DATA_DIR, "users.json")
 WORKOUTS_FILE = os.path.join(DATA_DIR, "workouts.json")
 CHAT_FILE = os.path.join(DATA_DIR, "chat.json")
@@ -12,38 +35,70 @@ MEALS_FILE = os.path.join(DATA_DIR, "meals.json")
 WORKOUT_LOGS_FILE = os.path.join(DATA_DIR, "workout_logs.json")
 WELLNESS_FILE = os.path.join(DATA_DIR, "wellness.json")
 
+CHAT_HISTORY_LIMIT = 50
+
+def create_store(backend: str = STORAGE_BACKEND) -> StorageBackend:
+    """Build the storage backend selected by STORAGE_BACKEND."""
+    if backend == "sqlite":
+        from sqlite_store import SQLiteStore
+        return SQLiteStore(SQLITE_PATH)
+    if backend == "json":
+        return JsonLogStore(DATA_DIR)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+_store = create_store()
+
 def _ensure_data_dir():
     """Create data directory if it doesn't exist."""
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
 
 def _load_json(file_path: str, default: Any = None) -> Any:
-    """Load data from JSON file."""
+    """Load data from JSON file (cached until the file changes; treat as read-only)."""
     _ensure_data_dir()
-    if os.path.exists(file_path):
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return default or {}
-    return default or {}
+    try:
+        return default_cache.load(file_path, parse_json_file)
+    except (json.JSONDecodeError, FileNotFoundError):
+        return default or {}
 
 def _save_json(file_path: str, data: Any) -> None:
-    """Save data to JSON file."""
+    """Save data to JSON file (write to temp file, then atomic rename)."""
     _ensure_data_dir()
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    atomic_write(file_path, json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8'))
+
+def _import_legacy_json() -> None:
+    """One-time import of the old whole-file JSON stores into per-user segments."""
+    legacy = [
+        (USERS_FILE, USERS),
+        (WORKOUTS_FILE, WORKOUTS),
+        (CHAT_FILE, CHAT),
+        (MEALS_FILE, MEALS),
+        (WORKOUT_LOGS_FILE, WORKOUT_LOGS),
+        (WELLNESS_FILE, WELLNESS),
+    ]
+    # Every gunicorn worker calls init_db(); only one may import each file
+    with locked_segment(os.path.join(DATA_DIR, ".init.lock")):
+        for file_path, store in legacy:
+            if not os.path.exists(file_path):
+                continue
+            data = _load_json(file_path)
+            for username, value in data.items():
+                records = value if isinstance(value, list) else [value]
+                _store.append_many(store, username, records)
+            os.replace(file_path, file_path + ".migrated")
+            print(f"Imported legacy {file_path} into {store}/ segments")
 
 def init_db() -> None:
     """Initialize database - using JSON file storage for moderate-term memory."""
-    print("Using JSON file storage for moderate-term memory")
+    print(f"Using {STORAGE_BACKEND} storage backend for moderate-term memory")
     _ensure_data_dir()
+    _import_legacy_json()
 
 
 def add_user(name: str, age: int, gender: str, fitness_level: str, goal: str, equipment: str, physical_limitations: str = "") -> bool:
     """Create or update a user profile."""
-    users = _load_json(USERS_FILE)
-    users[name] = {
+    # Profiles are append-only too: the newest record wins
+    profile = {
         "name": name,
         "age": age,
         "gender": gender,
@@ -54,7 +109,7 @@ def add_user(name: str, age: int, gender: str, fitness_level: str, goal: str, eq
         "created_at": datetime.now().isoformat(),
         "last_updated": datetime.now().isoformat()
     }
-    _save_json(USERS_FILE, users)
+    _append_tracked(USERS, name, [profile])
     return True
 
 
@@ -70,83 +125,125 @@ class User:
 
 
 def get_user(username: str) -> Optional[User]:
-    users = _load_json(USERS_FILE)
-    if username in users:
-        return User(users[username])
+    profile = _store.last(USERS, username)
+    if profile:
+        return User(profile)
     return None
 
 
 def save_workout(username: str, workout_text: str) -> None:
-    workouts = _load_json(WORKOUTS_FILE)
-    workouts[username] = {
+    _store.append(WORKOUTS, username, {
         "text": workout_text,
         "timestamp": datetime.now().isoformat()
-    }
-    _save_json(WORKOUTS_FILE, workouts)
+    })
 
 
 def get_last_workout(username: str) -> Optional[str]:
-    workouts = _load_json(WORKOUTS_FILE)
-    if username in workouts:
-        return workouts[username].get("text")
+    workout = _store.last(WORKOUTS, username)
+    if workout:
+        return workout.get("text")
     return None
 
 
+def _ensure_stats(username: str) -> Dict[str, Any]:
+    """The user's aggregate record, rebuilt from the logs (under the stats lock) if there is none."""
+    stats = _store.read_stats(username)
+    if stats is None:
+        stats = _store.update_stats(username, lambda current: current or user_stats.rebuild(_store, username))
+    return stats
+
+
+def _append_tracked(store: str, username: str, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Append entries and fold them into the user's aggregate record.
+
+    A missing record is rebuilt before the append, never after: a rebuild that
+    ran after it could also pick up a concurrent writer's entries, which that
+    writer then applies a second time.
+    """
+    _ensure_stats(username)
+    _store.append_many(store, username, entries)
+
+    def update(stats: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if stats is None:
+            # The record was deleted since _ensure_stats: the logs already hold `entries`
+            return user_stats.rebuild(_store, username)
+        return user_stats.apply_entries(stats, store, entries)
+    return _store.update_stats(username, update)
+
+
+def add_log_entry(store: str, username: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Append a meal, workout or wellness log entry for a user."""
+    _append_tracked(store, username, [entry])
+    return entry
+
+
+def add_log_entries(store: str, username: str, entries: List[Dict[str, Any]]) -> None:
+    """Append many log entries for one user in a single write."""
+    _append_tracked(store, username, entries)
+
+
 def save_chat_message(username: str, role: str, message: str) -> None:
-    chat_data = _load_json(CHAT_FILE)
-    if username not in chat_data:
-        chat_data[username] = []
-    
-    chat_data[username].append({
+    entry = {
         "role": role,
         "message": message,
         "timestamp": datetime.now().isoformat()
-    })
-    
-    # Keep only last 50 messages per user to prevent file from growing too large
-    if len(chat_data[username]) > 50:
-        chat_data[username] = chat_data[username][-50:]
+    }
+    _append_tracked(CHAT, username, [entry])
     
-    _save_json(CHAT_FILE, chat_data)
+    # Keep only last 50 messages per user; compact lazily so most writes stay a single append
+    if _store.count(CHAT, username) > 2 * CHAT_HISTORY_LIMIT:
+        _store.compact(CHAT, username, CHAT_HISTORY_LIMIT)
 
 
-def get_recent_wellness_logs(username: str, limit: int = 3) -> List[Dict[str, Any]]:
-    wellness_data = _load_json(WELLNESS_FILE)
-    if username in wellness_data:
-        # Sort by timestamp and return most recent
-        user_logs = wellness_data[username]
-        sorted_logs = sorted(user_logs, key=lambda x: x.get('timestamp', ''), reverse=True)
-        return sorted_logs[:limit]
-    return []
+def get_last_log_timestamp(store: str, username: str) -> Optional[str]:
+    """Timestamp of a user's newest log entry; log endpoints only ever append in time order."""
+    last = _store.last(store, username)
+    return last.get("timestamp") if last else None
 
 
 def get_user_chat_history(username: str, limit: int = 10) -> List[Dict[str, Any]]:
     """Get recent chat history for a user."""
-    chat_data = _load_json(CHAT_FILE)
-    if username in chat_data:
-        return chat_data[username][-limit:]
-    return []
+    return _store.read_recent(CHAT, username, min(limit, CHAT_HISTORY_LIMIT))
+
+
+def get_chat_summary(username: str) -> Optional[Dict[str, Any]]:
+    """Newest rolling summary record for a user ({"summary", "cursor", "timestamp"}), if any."""
+    return _store.last(CHAT_SUMMARIES, username)
+
+
+def save_chat_summary(username: str, summary: str, cursor: str) -> None:
+    """Store a new summary covering all chat turns up to the `cursor` timestamp."""
+    _store.append(CHAT_SUMMARIES, username, {
+        "summary": summary,
+        "cursor": cursor,
+        "timestamp": datetime.now().isoformat()
+    })
+    # Only the newest summary is ever read
+    if _store.count(CHAT_SUMMARIES, username) > 20:
+        _store.compact(CHAT_SUMMARIES, username, 1)
 
 
 def get_user_stats(username: str) -> Dict[str, Any]:
-    """Get comprehensive user statistics."""
-    users = _load_json(USERS_FILE)
-    meals = _load_json(MEALS_FILE)
-    workout_logs = _load_json(WORKOUT_LOGS_FILE)
-    wellness = _load_json(WELLNESS_FILE)
-    chat_data = _load_json(CHAT_FILE)
+    """Get comprehensive user statistics (one lookup of the incrementally maintained record)."""
+    stats = _ensure_stats(username)
+    counts = stats.get("counts", {})
+    last = stats.get("last", {})
     
     return {
-        "profile": users.get(username, {}),
-        "total_meals": len(meals.get(username, [])),
-        "total_workouts": len(workout_logs.get(username, [])),
-        "total_wellness_logs": len(wellness.get(username, [])),
-        "total_chat_messages": len(chat_data.get(username, [])),
-        "last_activity": max([
-            users.get(username, {}).get("last_updated", ""),
-            meals.get(username, [{}])[-1].get("timestamp", "") if meals.get(username) else "",
-            workout_logs.get(username, [{}])[-1].get("timestamp", "") if workout_logs.get(username) else "",
-            wellness.get(username, [{}])[-1].get("timestamp", "") if wellness.get(username) else "",
-        ])
+        "profile": stats.get("profile", {}),
+        "total_meals": counts.get(MEALS, 0),
+        "total_workouts": counts.get(WORKOUT_LOGS, 0),
+        "total_wellness_logs": counts.get(WELLNESS, 0),
+        "total_chat_messages": min(counts.get(CHAT, 0), CHAT_HISTORY_LIMIT),
+        "last_activity": max(last.get(store, "") for store in (USERS, MEALS, WORKOUT_LOGS, WELLNESS)),
+        "averages": user_stats.averages(stats)
     }
 
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters and size of the shared read cache."""
+    return default_cache.info()
+
+
+# Every public function above is timed as a "db.<name>" span (see metrics.py)
+instrument_module(globals(), "db")
@@ -0,0 +1,189 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from llm_cache import age_band
+
+# FAQ fast path for chat.
+# Common questions are answered locally from faq.jsonl, with the answer
+# templated from the user's profile, so they cost no Gemini call at all.
+# Lookup is an exact match on normalized text first, then TF-IDF cosine
+# similarity over an inverted index of the stored question paraphrases;
+# anything below FAQ_MIN_SCORE falls through to the agents. Messages that
+# mention an injury, pain or a medical condition, and users with physical
+# limitations, always go to the agents: a generic answer could be unsafe.
+
+FAQ_ENABLED = os.getenv("FAQ", "1") != "0"
+FAQ_MIN_SCORE = float(os.getenv("FAQ_MIN_SCORE", "0.8"))
+# Messages with fewer than 3 content words score high on a single shared word, so they need more
+FAQ_MIN_SCORE_SHORT = float(os.getenv("FAQ_MIN_SCORE_SHORT", "0.9"))
+# Longer messages usually carry details the agents should see
+FAQ_MAX_WORDS = int(os.getenv("FAQ_MAX_WORDS", "16"))
+FAQ_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "faq.jsonl")
+
+STOPWORDS = frozenset(
+    "a an the i me my im i'm you your is are am be do does did should would could can to of for in on at and or "
+    "it its this that what whats how much many when which with per so if just need get".split()
+)
+_TOKEN = re.compile(r"[a-z0-9']+")
+# Injury, pain and medical terms that rule out the fast path
+_MEDICAL = re.compile(
+    r"\b(?:injur\w*|pain\w*|hurt\w*|ache|aches|aching|broke|broken|fractur\w*|sprain\w*|strain\w*|torn|"
+    r"surgery|surgical|operation|pregnan\w*|postpartum|diabet\w*|asthma\w*|heart|cardiac|chest|"
+    r"blood pressure|hypertension|medication\w*|medicine|meds|doctor|physio\w*|rehab\w*|arthritis|"
+    r"tendon\w*|tendinitis|hernia\w*|concussion|dizz\w*|faint\w*|numb\w*|swollen|swelling|cancer|"
+    r"illness|sick|fever|disease|disorder|conditions?|limitations?)\b"
+)
+
+
+def _stem(word: str) -> str:
+    # Crude suffix stripping so "workouts"/"working" meet "workout"/"work"
+    for suffix in ("ing", "es", "s"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[: -len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(t) for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def normalize(text: str) -> str:
+    return " ".join(_TOKEN.findall(text.lower()))
+
+
+class _Defaults(dict):
+    def __missing__(self, key: str) -> str:
+        return ""
+
+
+def profile_facts(profile: Dict[str, Any]) -> Dict[str, str]:
+    """Values the answer templates can use, derived from a user profile."""
+    goal = (profile.get("goal") or "general health").lower()
+    level = (profile.get("fitness_level") or "beginner").lower()
+    try:
+        age = int(profile.get("age") or 0)
+    except (TypeError, ValueError):
+        age = 0
+    if "muscle" in goal:
+        protein = "1.6-2.2 g"
+    elif "fat" in goal or "weight" in goal:
+        protein = "1.6-2.4 g"
+    else:
+        protein = "1.2-1.6 g"
+    if "endurance" in goal:
+        cardio = "make cardio the base (3-5 sessions) and add 2 short strength sessions a week."
+    elif "muscle" in goal:
+        cardio = "prioritize lifting and keep 1-2 easy cardio sessions a week for conditioning."
+    else:
+        cardio = "2-4 strength sessions plus 2-3 cardio sessions (or daily brisk walks) a week."
+    return _Defaults(
+        name=profile.get("name") or "",
+        goal=goal,
+        level=level,
+        age_band=age_band(age) if age else "adult",
+        protein_range=protein,
+        sleep_hours="8-10" if 0 < age < 18 else "7-8" if age >= 65 else "7-9",
+        sessions_per_week={"beginner": "3", "intermediate": "3-5", "advanced": "4-6"}.get(level, "3-4"),
+        cardio_advice=cardio,
+    )
+
+
+class FAQIndex:
+    def __init__(self, entries: List[Dict[str, Any]], min_score: float = FAQ_MIN_SCORE, max_words: int = FAQ_MAX_WORDS,
+                 min_score_short: float = FAQ_MIN_SCORE_SHORT):
+        self.entries = {e["id"]: e for e in entries}
+        self.min_score = min_score
+        self.min_score_short = min_score_short
+        self.max_words = max_words
+        self._exact: Dict[str, str] = {}
+        # One document per question paraphrase: (entry id, L2-normalized tf-idf vector)
+        self._docs: List[str] = []
+        self._postings: Dict[str, List[Tuple[int, float]]] = {}
+        self._idf: Dict[str, float] = {}
+        self._max_idf = 1.0
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "hits": 0, "exact_hits": 0, "misses": 0, "referred": 0}
+        self.entry_hits: Counter = Counter()
+        self._build()
+
+    def _build(self) -> None:
+        docs = []
+        for entry in self.entries.values():
+            for question in entry["questions"]:
+                self._exact[normalize(question)] = entry["id"]
+                docs.append((entry["id"], Counter(tokenize(question))))
+        df = Counter(term for _, tf in docs for term in tf)
+        n = len(docs)
+        self._idf = {term: math.log((1 + n) / (1 + count)) + 1 for term, count in df.items()}
+        self._max_idf = max(self._idf.values(), default=1.0)
+        for doc_id, (entry_id, tf) in enumerate(docs):
+            weights = {term: count * self._idf[term] for term, count in tf.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for term, w in weights.items():
+                self._postings.setdefault(term, []).append((doc_id, w / norm))
+            self._docs.append(entry_id)
+
+    def match(self, message: str) -> Tuple[Optional[str], float]:
+        """Best FAQ entry id for a message and its cosine similarity."""
+        entry_id = self._exact.get(normalize(message))
+        if entry_id is not None:
+            return entry_id, 1.0
+        tf = Counter(t for t in tokenize(message) if t in self._idf)
+        if not tf:
+            return None, 0.0
+        weights = {term: count * self._idf[term] for term, count in tf.items()}
+        # Words no FAQ question uses count as rare terms, so off-topic detail lowers the score
+        unknown = len([t for t in tokenize(message) if t not in self._idf])
+        norm = math.sqrt(sum(w * w for w in weights.values()) + unknown * self._max_idf ** 2) or 1.0
+        scores: Dict[int, float] = {}
+        for term, w in weights.items():
+            for doc_id, doc_weight in self._postings[term]:
+                scores[doc_id] = scores.get(doc_id, 0.0) + w / norm * doc_weight
+        doc_id, score = max(scores.items(), key=lambda item: item[1])
+        return self._docs[doc_id], score
+
+    def answer(self, message: str, profile: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Templated answer when the message confidently matches an FAQ entry, else None."""
+        if len(message.split()) > self.max_words:
+            return None
+        profile = profile or {}
+        if (profile.get("physical_limitations") or "").strip() or _MEDICAL.search(message.lower()):
+            # The agents see the limitations and the details; a canned answer does not
+            with self._lock:
+                self.stats["referred"] += 1
+            return None
+        entry_id, score = self.match(message)
+        min_score = self.min_score if len(tokenize(message)) >= 3 else self.min_score_short
+        with self._lock:
+            self.stats["lookups"] += 1
+            if entry_id is None or score < min_score:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            if score == 1.0:
+                self.stats["exact_hits"] += 1
+            self.entry_hits[entry_id] += 1
+        return self.entries[entry_id]["answer"].format_map(profile_facts(profile))
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["lookups"]
+            return {
+                **self.stats,
+                "hit_ratio": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+                "entries": len(self.entries),
+                "top": dict(self.entry_hits.most_common(10)),
+            }
+
+
+def load_entries(path: str = FAQ_PATH) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+faq_index = FAQIndex(load_entries())
@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import uuid
+import queue
+import socket
+import threading
+import ipaddress
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from database import DATA_DIR
+from storage import atomic_write
+from logger import log_message
+
+# Background generation of log feedback.
+# /api/log/* persist the entry, enqueue a job here and answer right away; a
+# bounded pool of worker threads runs the agent and records the result in
+# DATA_DIR/feedback/<job id>.json so any gunicorn worker can serve its status.
+# The generate callable must raise when the model could not answer, so the job
+# is retried and finally marked failed instead of done with fallback text.
+
+FEEDBACK_MODE = os.getenv("FEEDBACK_MODE", "sync").lower()
+FEEDBACK_WORKERS = int(os.getenv("FEEDBACK_WORKERS", "4"))
+FEEDBACK_QUEUE_SIZE = int(os.getenv("FEEDBACK_QUEUE_SIZE", "200"))
+FEEDBACK_RETRIES = int(os.getenv("FEEDBACK_RETRIES", "2"))
+FEEDBACK_DIR = os.path.join(DATA_DIR, "feedback")
+# Job status files older than this are pruned
+FEEDBACK_TTL_HOURS = float(os.getenv("FEEDBACK_TTL_HOURS", "24"))
+# Comma-separated hosts callback_url may point at; empty allows any public host
+FEEDBACK_CALLBACK_HOSTS = {h.strip().lower() for h in os.getenv("FEEDBACK_CALLBACK_HOSTS", "").split(",") if h.strip()}
+PRUNE_INTERVAL_SECONDS = 600.0
+
+
+class QueueFull(Exception):
+    """Raised when the feedback backlog is at capacity."""
+
+
+def check_callback_url(url: Any) -> str:
+    """Return `url` if it is safe to POST job results to; ValueError otherwise.
+
+    Only http(s) is allowed, and the host must be on FEEDBACK_CALLBACK_HOSTS
+    when that is set, else resolve to public addresses only (no loopback,
+    private, link-local or reserved ranges), so clients cannot make the server
+    call its own network.
+    """
+    if not isinstance(url, str):
+        raise ValueError("callback_url must be a string")
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("callback_url must be an http(s) URL")
+    host = parts.hostname.lower()
+    if FEEDBACK_CALLBACK_HOSTS:
+        if host not in FEEDBACK_CALLBACK_HOSTS:
+            raise ValueError("callback_url host is not allowed")
+        return url
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parts.port or 443, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, ValueError):
+        raise ValueError("callback_url host does not resolve")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError("callback_url must point at a public host")
+    return url
+
+
+class FeedbackQueue:
+    def __init__(self, generate: Callable[[str, str], str], workers: int = FEEDBACK_WORKERS,
+                 max_pending: int = FEEDBACK_QUEUE_SIZE, retries: int = FEEDBACK_RETRIES,
+                 status_dir: str = FEEDBACK_DIR):
+        self.generate = generate
+        self.workers = workers
+        self.retries = retries
+        self.status_dir = status_dir
+        self._jobs: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_pending)
+        self._threads: list = []
+        self._start_lock = threading.Lock()
+        self.ttl = FEEDBACK_TTL_HOURS * 3600
+        self._last_prune = 0.0
+        self.stats = {"submitted": 0, "rejected": 0, "done": 0, "failed": 0, "retried": 0, "pruned": 0}
+
+    def _ensure_workers(self) -> None:
+        # Threads are started lazily so importing the module in a master process is free
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"feedback-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _status_path(self, job_id: str) -> str:
+        return os.path.join(self.status_dir, f"{job_id}.json")
+
+    def _write_status(self, job: Dict[str, Any], **fields: Any) -> None:
+        job.update(fields, updated_at=datetime.now().isoformat())
+        os.makedirs(self.status_dir, exist_ok=True)
+        public = {k: v for k, v in job.items() if k != "prompt"}
+        atomic_write(self._status_path(job["id"]), json.dumps(public, ensure_ascii=False).encode("utf-8"))
+
+    def submit(self, username: str, prompt: str, callback_url: Optional[str] = None) -> str:
+        """Queue a feedback job and return its id; raises QueueFull under backpressure."""
+        self._ensure_workers()
+        job = {
+            "id": uuid.uuid4().hex,
+            "username": username,
+            "prompt": prompt,
+            "callback_url": callback_url,
+            "status": "queued",
+            "attempts": 0,
+            "created_at": datetime.now().isoformat(),
+        }
+        self._write_status(job)
+        try:
+            self._jobs.put_nowait(job)
+        except queue.Full:
+            self.stats["rejected"] += 1
+            self._write_status(job, status="rejected", error="feedback queue full")
+            raise QueueFull()
+        self.stats["submitted"] += 1
+        return job["id"]
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._status_path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _run(self) -> None:
+        while True:
+            job = self._jobs.get()
+            try:
+                self._process(job)
+                self._prune()
+            finally:
+                self._jobs.task_done()
+
+    def _process(self, job: Dict[str, Any]) -> None:
+        for attempt in range(1, self.retries + 2):
+            self._write_status(job, status="running", attempts=attempt)
+            try:
+                feedback = self.generate(job["username"], job["prompt"])
+            except Exception as e:
+                if attempt <= self.retries:
+                    self.stats["retried"] += 1
+                    time.sleep(min(2 ** attempt, 30))
+                    continue
+                self.stats["failed"] += 1
+                self._write_status(job, status="failed", error=str(e))
+                log_message(f"Feedback job {job['id']} for {job['username']} failed: {e}", "error")
+                break
+            self.stats["done"] += 1
+            self._write_status(job, status="done", feedback=feedback)
+            break
+        if job.get("callback_url"):
+            self._notify(job)
+
+    def _notify(self, job: Dict[str, Any]) -> None:
+        body = {k: v for k, v in job.items() if k not in ("prompt", "callback_url")}
+        try:
+            # Checked again here: the host may resolve differently than at submit time
+            url = check_callback_url(job["callback_url"])
+            requests.post(url, json=body, timeout=5, allow_redirects=False)
+        except (ValueError, requests.RequestException) as e:
+            log_message(f"Feedback callback for job {job['id']} failed: {e}", "warning")
+
+    def _prune(self) -> None:
+        now = time.time()
+        if now - self._last_prune < PRUNE_INTERVAL_SECONDS:
+            return
+        self._last_prune = now
+        try:
+            names = os.listdir(self.status_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.status_dir, name)
+            try:
+                if name.endswith(".json") and now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+                    self.stats["pruned"] += 1
+            except OSError:
+                pass
+
+    def info(self) -> Dict[str, Any]:
+        return {**self.stats, "pending": self._jobs.qsize(), "capacity": self._jobs.maxsize, "workers": len(self._threads)}
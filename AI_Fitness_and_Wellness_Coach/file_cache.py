@@ -0,0 +1,107 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# In-process cache of parsed files, shared by every loader in database.py.
+# Entries are keyed on path and validated against os.stat (inode, size, mtime),
+# so a write from this process or any other gunicorn worker invalidates them.
+# Append-only files can be extended incrementally: only the new bytes are parsed.
+
+CACHE_MAX_BYTES = int(float(os.getenv("STORAGE_CACHE_MB", "64")) * 1024 * 1024)
+CACHE_MAX_ENTRIES = int(os.getenv("STORAGE_CACHE_ENTRIES", "10000"))
+
+# parse(path) -> (value, bytes consumed)
+Parser = Callable[[str], Tuple[Any, int]]
+# extend(value, offset, path) -> (new value, new offset); must not mutate `value`
+Extender = Callable[[Any, int, str], Tuple[Any, int]]
+
+
+class _Entry:
+    __slots__ = ("ino", "size", "mtime_ns", "offset", "value")
+
+    def __init__(self, st: os.stat_result, offset: int, value: Any):
+        self.ino = st.st_ino
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        self.offset = offset
+        self.value = value
+
+
+class FileCache:
+    """Bounded LRU of parsed file contents with hit/miss counters.
+
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "extends": 0, "evictions": 0}
+
+    def load(self, path: str, parse: Parser, extend: Optional[Extender] = None) -> Any:
+        """Return the parsed contents of `path`, re-parsing only what changed.
+
+        Raises FileNotFoundError if the file does not exist.
+        """
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.invalidate(path)
+            raise
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries.move_to_end(path)
+                if entry.ino == st.st_ino and entry.size == st.st_size and entry.mtime_ns == st.st_mtime_ns:
+                    self.stats["hits"] += 1
+                    return entry.value
+
+        if extend is not None and entry is not None and entry.ino == st.st_ino and entry.offset <= st.st_size:
+            value, offset = extend(entry.value, entry.offset, path)
+            counter = "extends"
+        else:
+            value, offset = parse(path)
+            counter = "misses"
+        self._install(path, _Entry(st, offset, value), counter)
+        return value
+
+    def _install(self, path: str, entry: _Entry, counter: str) -> None:
+        with self._lock:
+            self.stats[counter] += 1
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= old.offset
+            self._entries[path] = entry
+            self._bytes += entry.offset
+            while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.offset
+                self.stats["evictions"] += 1
+
+    def invalidate(self, path: str) -> None:
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= old.offset
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"] + self.stats["extends"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hit_ratio": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+
+default_cache = FileCache()
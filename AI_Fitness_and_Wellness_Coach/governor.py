@@ -0,0 +1,330 @@
+import hashlib
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from google.api_core import exceptions as api_exceptions
+
+from metrics import registry as metrics
+
+# Upstream-call governor for Gemini.
+# Every model call goes through governor.call(), which in order:
+# - fails fast while the circuit breaker is open (too many consecutive upstream
+#   failures; one probe call is let through after the cooldown)
+# - takes a token from the bucket of the API key in use (GOVERNOR_RPM)
+# - waits for a slot under the adaptive concurrency limit: +1 per limit
+#   successes, x GOVERNOR_BACKOFF on quota/overload errors (AIMD)
+# - runs the attempt with the time left until the call's deadline as its
+#   request timeout, so a hung upstream call cannot hold a slot past it
+# - retries retryable errors with full-jitter exponential backoff, never past
+#   the call's deadline
+# Calls that cannot start before their deadline, or find the wait queue full,
+# are shed with Overloaded instead of piling onto a struggling API. Callers
+# catch GovernorError to fall back (local workout engine, cached answers).
+
+GOVERNOR_ENABLED = os.getenv("GOVERNOR", "1") != "0"
+GOVERNOR_INITIAL_LIMIT = float(os.getenv("GOVERNOR_INITIAL_LIMIT", "8"))
+GOVERNOR_MIN_LIMIT = float(os.getenv("GOVERNOR_MIN_LIMIT", "1"))
+GOVERNOR_MAX_LIMIT = float(os.getenv("GOVERNOR_MAX_LIMIT", "64"))
+GOVERNOR_BACKOFF = float(os.getenv("GOVERNOR_BACKOFF", "0.7"))
+# Callers waiting for a slot beyond this are shed immediately
+GOVERNOR_MAX_QUEUE = int(os.getenv("GOVERNOR_MAX_QUEUE", "64"))
+# Requests per minute per API key in this process (the key's quota divided by
+# the number of workers); 0 disables the bucket and leaves 429s to the limiter
+GOVERNOR_RPM = float(os.getenv("GOVERNOR_RPM", "0"))
+GOVERNOR_BURST = float(os.getenv("GOVERNOR_BURST", "50"))
+GOVERNOR_RETRIES = int(os.getenv("GOVERNOR_RETRIES", "2"))
+GOVERNOR_DEADLINE_SECONDS = float(os.getenv("GOVERNOR_DEADLINE_SECONDS", "30"))
+GOVERNOR_BREAKER_FAILURES = int(os.getenv("GOVERNOR_BREAKER_FAILURES", "5"))
+GOVERNOR_BREAKER_COOLDOWN = float(os.getenv("GOVERNOR_BREAKER_COOLDOWN", "30"))
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 8.0
+
+# Errors worth retrying; the first two also mean "slow down" to the limiter
+OVERLOAD_ERRORS = (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)
+RETRYABLE_ERRORS = OVERLOAD_ERRORS + (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.InternalServerError,
+)
+
+
+class GovernorError(RuntimeError):
+    """The call was not made (or given up on) to protect the upstream API."""
+
+
+class Overloaded(GovernorError):
+    pass
+
+
+class CircuitOpen(GovernorError):
+    pass
+
+
+class AIMDLimiter:
+    """Concurrency limit that grows additively on success and shrinks multiplicatively on overload."""
+
+    def __init__(self, initial: float = GOVERNOR_INITIAL_LIMIT, minimum: float = GOVERNOR_MIN_LIMIT,
+                 maximum: float = GOVERNOR_MAX_LIMIT, backoff: float = GOVERNOR_BACKOFF, max_queue: int = GOVERNOR_MAX_QUEUE):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, deadline: float) -> None:
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            if self.waiting >= self.max_queue:
+                raise Overloaded("queue_full")
+            self.waiting += 1
+            try:
+                while self.in_flight >= int(self.limit):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Overloaded("deadline")
+                    self._cond.wait(remaining)
+                self.in_flight += 1
+            finally:
+                self.waiting -= 1
+
+    def release(self, overloaded: bool, adjust: bool = True) -> None:
+        """Free a slot; with adjust=False the outcome says nothing about capacity and the limit stays."""
+        with self._cond:
+            self.in_flight -= 1
+            if adjust and overloaded:
+                self.limit = max(self.minimum, self.limit * self.backoff)
+            elif adjust:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float = GOVERNOR_RPM, burst: float = GOVERNOR_BURST):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, deadline: float) -> None:
+        """Take one token, sleeping until it is available; Overloaded if that would pass the deadline."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Reserve the token now (the balance may go negative) so waiters queue up fairly
+            wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                raise Overloaded("rate_limited")
+            self.tokens -= 1
+        if wait:
+            time.sleep(wait)
+
+    def refund(self) -> None:
+        """Give back a token taken for a call that was then shed."""
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+
+class CircuitBreaker:
+    def __init__(self, failures: int = GOVERNOR_BREAKER_FAILURES, cooldown: float = GOVERNOR_BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> None:
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpen("circuit_open")
+
+    def cancel_probe(self) -> None:
+        """The admitted probe was shed before reaching the API; let the next call probe."""
+        with self._lock:
+            self._probing = False
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self._probing = False
+            if ok:
+                self.state, self.consecutive = "closed", 0
+                return
+            self.consecutive += 1
+            if self.state == "half_open" or self.consecutive >= self.failures:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class Governor:
+    def __init__(self, retries: int = GOVERNOR_RETRIES, deadline: float = GOVERNOR_DEADLINE_SECONDS):
+        self.retries = retries
+        self.deadline = deadline
+        self.limiter = AIMDLimiter()
+        self.breaker = CircuitBreaker()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "abandoned": 0, "shed": {}}
+
+    def _bucket(self) -> Optional[TokenBucket]:
+        if GOVERNOR_RPM <= 0:
+            return None
+        # Keyed by a digest so the key itself is never kept around
+        key = hashlib.sha256(os.getenv("GEMINI_API_KEY", "").encode("utf-8")).hexdigest()[:12]
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket()
+            return bucket
+
+    def _shed(self, error: GovernorError) -> None:
+        reason = str(error)
+        with self._lock:
+            self.stats["shed"][reason] = self.stats["shed"].get(reason, 0) + 1
+        metrics.inc("governor_shed", reason=reason)
+
+    def _admit(self, deadline: float) -> None:
+        bucket = None
+        try:
+            self.breaker.allow()
+            bucket = self._bucket()
+            if bucket is not None:
+                bucket.take(deadline)
+            try:
+                self.limiter.acquire(deadline)
+            except GovernorError:
+                # No request was sent, so the token is not spent
+                if bucket is not None:
+                    bucket.refund()
+                raise
+        except GovernorError as e:
+            if not isinstance(e, CircuitOpen):
+                self.breaker.cancel_probe()
+            self._shed(e)
+            raise
+
+    def _settle(self, error: Optional[BaseException]) -> None:
+        overloaded = isinstance(error, OVERLOAD_ERRORS)
+        self.limiter.release(overloaded)
+        # Other 4xx errors are the request's fault, not a sign of an outage
+        self.breaker.record(ok=error is None or (isinstance(error, api_exceptions.ClientError) and not overloaded))
+        if error is not None:
+            with self._lock:
+                self.stats["failures"] += 1
+
+    def _abandon(self) -> None:
+        # The caller stopped reading a stream: neither a success nor a failure
+        self.limiter.release(False, adjust=False)
+        self.breaker.cancel_probe()
+        with self._lock:
+            self.stats["abandoned"] += 1
+
+    def _backoff(self, error: Exception, attempt: int, deadline: float) -> bool:
+        """Sleep before the next attempt; False when the error is final."""
+        if not isinstance(error, RETRYABLE_ERRORS) or attempt >= self.retries:
+            return False
+        # Full jitter: anywhere between 0 and the exponential cap
+        pause = random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+        if time.monotonic() + pause >= deadline:
+            return False
+        with self._lock:
+            self.stats["retries"] += 1
+        time.sleep(pause)
+        return True
+
+    def _deadline(self, timeout: Optional[float]) -> float:
+        with self._lock:
+            self.stats["calls"] += 1
+        return time.monotonic() + (timeout if timeout is not None else self.deadline)
+
+    def _remaining(self, deadline: float) -> float:
+        # Floor so an attempt admitted right at the deadline still gets a usable timeout
+        return max(0.1, deadline - time.monotonic())
+
+    def call(self, fn: Callable[[float], Any], timeout: Optional[float] = None) -> Any:
+        """Run fn(seconds_left) under the limits, retrying retryable upstream errors until `timeout` seconds have passed.
+
+        fn must use `seconds_left` as its request timeout.
+        """
+        if not GOVERNOR_ENABLED:
+            return fn(timeout if timeout is not None else self.deadline)
+        deadline = self._deadline(timeout)
+        attempt = 0
+        while True:
+            self._admit(deadline)
+            try:
+                result = fn(self._remaining(deadline))
+            except Exception as e:
+                self._settle(e)
+                if not self._backoff(e, attempt, deadline):
+                    raise
+                attempt += 1
+                continue
+            self._settle(None)
+            return result
+
+    def call_stream(self, fn: Callable[[float], Iterable[Any]], timeout: Optional[float] = None) -> Iterator[Any]:
+        """Like call() for a streaming response; the slot is held until the stream ends.
+
+        Only errors raised before the first chunk are retried. A stream the
+        consumer closes early releases its slot without moving the limit.
+        """
+        if not GOVERNOR_ENABLED:
+            yield from fn(timeout if timeout is not None else self.deadline)
+            return
+        deadline = self._deadline(timeout)
+        attempt = 0
+        while True:
+            self._admit(deadline)
+            started = False
+            error: Optional[Exception] = None
+            try:
+                for chunk in fn(self._remaining(deadline)):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                error = e
+            except BaseException:
+                # GeneratorExit when the consumer closes the stream (or an interrupt)
+                self._abandon()
+                raise
+            self._settle(error)
+            if error is None:
+                return
+            if started or not self._backoff(error, attempt, deadline):
+                raise error
+            attempt += 1
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {**self.stats, "shed": dict(self.stats["shed"])}
+        return {
+            **stats,
+            "limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "queue_depth": self.limiter.waiting,
+            "breaker": self.breaker.state,
+        }
+
+
+governor = Governor()
+metrics.gauge("governor_limit", lambda: governor.limiter.limit)
+metrics.gauge("governor_in_flight", lambda: governor.limiter.in_flight)
+metrics.gauge("governor_queue_depth", lambda: governor.limiter.waiting)
+metrics.gauge("governor_breaker_open", lambda: float(governor.breaker.state != "closed"))
@@ -0,0 +1,145 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Chat intent routing.
+# All keyword sets are compiled into one regex with a named group per intent,
+# so a message is scanned once and every topic it mentions is scored; the
+# reply then fans out to just the agents whose share of the hits is high
+# enough. Messages without any keyword can fall back to a small multinomial
+# naive Bayes model trained at import time on intent_examples.jsonl.
+
+INTENTS = ("fitness", "nutrition", "wellness")
+
+# Whole words per intent, with the inflections that should match spelled out,
+# so "rep" does not fire on "report" nor "nap" on "napkin"
+KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "fitness": (
+        "workouts?", "work(?:ing)? out", "train(?:s|ed|ing|er|ers)?", "exercis(?:e|es|ed|ing)", "gyms?",
+        "lift(?:s|ed|ing)?", "squats?", "deadlifts?", "bench press", "push-?ups?", "pull-?ups?", "planks?", "cardio",
+        "run(?:s|ning)?", "jog(?:s|ged|ging)?", "sprint(?:s|ing)?", "cycling", "cyclists?", "bik(?:e|es|ing)",
+        "swim(?:s|ming)?", "hiit", "reps?", "sets?", "muscles?", "muscular", "strength", "stretch(?:es|ed|ing)?",
+        "yoga", "mobility", "abs", "core", "leg day", "routines?", "kettlebells?", "dumbbells?", "lunges?", "5k",
+        "marathons?", "rowing", "steps",
+    ),
+    "nutrition": (
+        "calories?", "meals?", "protein", "diets?", "dieting", "macros?", "carbs?", "fats?", "eat(?:s|ing|en)?",
+        "foods?", "snack(?:s|ing)?", "breakfast", "lunch(?:es)?", "dinners?", "recipes?", "vegan", "vegetarian",
+        "keto", "fasting", "supplements?", "creatine", "vitamins?", "sugar(?:s|y)?", "fib(?:er|re)", "hungry",
+        "hunger", "nutri(?:tion|tional|ent|ents|tious|tionist)", "grocer(?:y|ies)", "cook(?:s|ed|ing)?",
+        "juices?", "takeaways?", "oats", "oatmeal", "caffeine", "coffee", "drink(?:s|ing)?",
+    ),
+    "wellness": (
+        "sleep(?:s|ing|y)?", "slept", "stress(?:ed|es|ful)?", "recover(?:y|ed|ing)?", "hydrat(?:e|ed|ing|ion)",
+        "water", "fatigue[d]?", "tired(?:ness)?", "exhaust(?:ed|ion)", "rest days?", "sore(?:ness)?",
+        "anxi(?:ety|ous)", "moods?", "burn(?:ed|t)? ?out", "energy", "mental(?:ly)?", "meditat(?:e|ion|ing)",
+        "relax(?:ed|ing|ation)?", "insomnia", "naps?", "napping", "breath(?:e|es|ing)?", "bedtime", "drained",
+        "overtrain(?:ed|ing)?", "foam roll(?:er|ing)?", "ice baths?", "jet lag", "wak(?:e|ing) up",
+        "calm(?:er|ing)?",
+    ),
+}
+
+ROUTER_CLASSIFIER = os.getenv("ROUTER_CLASSIFIER", "fallback").lower()
+# An intent is routed when its share of the keyword hits reaches this value
+ROUTER_MIN_SHARE = float(os.getenv("ROUTER_MIN_SHARE", "0.25"))
+# Classifier predictions below this probability are treated as "unsure" (-> all agents)
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.6"))
+EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_examples.jsonl")
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+
+def compile_keywords(keywords: Dict[str, Tuple[str, ...]]) -> "re.Pattern":
+    groups = [f"(?P<{intent}>{'|'.join(terms)})" for intent, terms in keywords.items()]
+    return re.compile(r"\b(?:" + "|".join(groups) + r")\b")
+
+
+class NaiveBayes:
+    """Multinomial naive Bayes over word tokens; multi-label examples count for each label."""
+
+    def __init__(self, alpha: float = 1.0):
+        self.alpha = alpha
+        self.log_prior: Dict[str, float] = {}
+        self.log_likelihood: Dict[str, Dict[str, float]] = {}
+        self.log_unseen: Dict[str, float] = {}
+
+    def fit(self, examples: Iterable[Tuple[str, List[str]]]) -> "NaiveBayes":
+        counts: Dict[str, Counter] = {intent: Counter() for intent in INTENTS}
+        docs: Counter = Counter()
+        for text, labels in examples:
+            tokens = _TOKEN.findall(text.lower())
+            for label in labels:
+                counts[label].update(tokens)
+                docs[label] += 1
+        vocab = set().union(*counts.values())
+        total_docs = sum(docs.values()) or 1
+        for intent in INTENTS:
+            denominator = sum(counts[intent].values()) + self.alpha * (len(vocab) + 1)
+            self.log_prior[intent] = math.log((docs[intent] + 1) / (total_docs + len(INTENTS)))
+            self.log_likelihood[intent] = {w: math.log((c + self.alpha) / denominator) for w, c in counts[intent].items()}
+            self.log_unseen[intent] = math.log(self.alpha / denominator)
+        return self
+
+    def predict(self, text: str) -> Dict[str, float]:
+        """Posterior probability per intent."""
+        tokens = _TOKEN.findall(text.lower())
+        scores = {}
+        for intent in INTENTS:
+            table, unseen = self.log_likelihood[intent], self.log_unseen[intent]
+            scores[intent] = self.log_prior[intent] + sum(table.get(t, unseen) for t in tokens)
+        top = max(scores.values())
+        exp = {intent: math.exp(s - top) for intent, s in scores.items()}
+        total = sum(exp.values())
+        return {intent: v / total for intent, v in exp.items()}
+
+
+def load_examples(path: str = EXAMPLES_PATH) -> List[Tuple[str, List[str]]]:
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                examples.append((record["text"], record["labels"]))
+    return examples
+
+
+class IntentRouter:
+    def __init__(self, keywords: Dict[str, Tuple[str, ...]] = KEYWORDS, classifier: Optional[NaiveBayes] = None,
+                 min_share: float = ROUTER_MIN_SHARE, min_confidence: float = ROUTER_MIN_CONFIDENCE):
+        self.pattern = compile_keywords(keywords)
+        self.classifier = classifier
+        self.min_share = min_share
+        self.min_confidence = min_confidence
+
+    def scores(self, message: str) -> Dict[str, float]:
+        """Share of keyword hits per intent (empty when nothing matched)."""
+        hits: Counter = Counter(m.lastgroup for m in self.pattern.finditer(message.lower()))
+        total = sum(hits.values())
+        return {intent: count / total for intent, count in hits.most_common()} if total else {}
+
+    def route(self, message: str) -> List[str]:
+        """Intents whose agents should answer, strongest first; all of them when unsure."""
+        scores = self.scores(message)
+        if not scores and self.classifier is not None:
+            predicted = self.classifier.predict(message)
+            intent, probability = max(predicted.items(), key=lambda item: item[1])
+            if probability >= self.min_confidence:
+                return [intent]
+        if not scores:
+            return list(INTENTS)
+        return [intent for intent, share in scores.items() if share >= self.min_share]
+
+
+def _default_classifier() -> Optional[NaiveBayes]:
+    if ROUTER_CLASSIFIER == "off":
+        return None
+    try:
+        return NaiveBayes().fit(load_examples())
+    except (OSError, ValueError):
+        return None
+
+
+router = IntentRouter(classifier=_default_classifier())
@@ -0,0 +1,165 @@
+import os
+import threading
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import google.generativeai as genai
+
+from llm_cache import LLM_CACHE_ENABLED, response_cache
+from metrics import registry as metrics, span
+from governor import GovernorError, governor
+
+# Process-wide Gemini client registry.
+# The API is configured once and one GenerativeModel is kept per
+# (model name, system instruction) pair, shared by every agent and thread.
+
+DEFAULT_MODEL = "gemini-2.5-flash-preview-05-20"
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._configured = False
+        self._models: Dict[Tuple[str, str], Any] = {}
+        self.stats = {"created": 0, "reused": 0}
+
+    def _configure(self) -> None:
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise RuntimeError("GEMINI_API_KEY not set")
+        genai.configure(api_key=api_key)
+        self._configured = True
+
+    def get(self, system_instruction: str = "", model_name: str = DEFAULT_MODEL) -> Any:
+        """Return the shared client for this model/instruction, creating it on first use."""
+        key = (model_name, system_instruction or "")
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self.stats["reused"] += 1
+                return model
+            if not self._configured:
+                self._configure()
+            model = genai.GenerativeModel(model_name, system_instruction=system_instruction or None)
+            self._models[key] = model
+            self.stats["created"] += 1
+            return model
+
+    def reset(self) -> None:
+        """Drop all clients (e.g. after rotating GEMINI_API_KEY)."""
+        with self._lock:
+            self._models.clear()
+            self._configured = False
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "clients": len(self._models)}
+
+
+registry = ModelRegistry()
+
+
+def get_model(system_instruction: str = "", model_name: str = DEFAULT_MODEL) -> Any:
+    return registry.get(system_instruction, model_name)
+
+
+def _record_usage(model_name: str, resp: Any) -> None:
+    usage = getattr(resp, "usage_metadata", None)
+    if usage is None:
+        return
+    metrics.inc("llm_tokens", getattr(usage, "prompt_token_count", 0) or 0, model=model_name, kind="prompt")
+    metrics.inc("llm_tokens", getattr(usage, "candidates_token_count", 0) or 0, model=model_name, kind="completion")
+
+
+def _stale_answer(key: Optional[str], model_name: str) -> Optional[str]:
+    if key is None:
+        return None
+    stale = response_cache.get_stale(key)
+    if stale is not None:
+        metrics.inc("llm_calls", model=model_name, outcome="stale")
+    return stale
+
+
+def generate_text(prompt: str, system_instruction: str = "", model_name: Optional[str] = None, cache: bool = True,
+                  timeout: Optional[float] = None) -> str:
+    """Run one generation on the shared client and return the stripped text.
+
+    Identical (normalized) prompts are answered from the response cache. The
+    call goes through the governor (retries within `timeout` seconds); when it
+    sheds the call, an expired cached answer is returned if there is one,
+    else GovernorError is raised.
+    """
+    model_name = model_name or DEFAULT_MODEL
+    use_cache = cache and LLM_CACHE_ENABLED
+    key = None
+    if use_cache:
+        key = response_cache.make_key(prompt, system_instruction, model_name)
+        cached = response_cache.get(key)
+        if cached is not None:
+            metrics.inc("llm_calls", model=model_name, outcome="cache_hit")
+            return cached
+    model = registry.get(system_instruction, model_name)
+    with span("llm.generate", model=model_name):
+        try:
+            resp = governor.call(lambda seconds: model.generate_content(prompt, request_options={"timeout": seconds}), timeout)
+        except GovernorError:
+            metrics.inc("llm_calls", model=model_name, outcome="shed")
+            stale = _stale_answer(key, model_name)
+            if stale is None:
+                raise
+            return stale
+        except Exception:
+            metrics.inc("llm_calls", model=model_name, outcome="error")
+            raise
+    metrics.inc("llm_calls", model=model_name, outcome="ok")
+    _record_usage(model_name, resp)
+    text = (resp.text or "").strip()
+    if use_cache:
+        response_cache.put(key, text)
+    return text
+
+
+def stream_text(prompt: str, system_instruction: str = "", model_name: Optional[str] = None, cache: bool = True,
+                timeout: Optional[float] = None) -> Iterator[str]:
+    """Yield the generation in chunks as Gemini streams them.
+
+    A cached answer is yielded as a single chunk; a completed stream is cached.
+    Shed calls fall back to an expired cached answer like generate_text().
+    """
+    model_name = model_name or DEFAULT_MODEL
+    use_cache = cache and LLM_CACHE_ENABLED
+    key = None
+    if use_cache:
+        key = response_cache.make_key(prompt, system_instruction, model_name)
+        cached = response_cache.get(key)
+        if cached is not None:
+            metrics.inc("llm_calls", model=model_name, outcome="cache_hit")
+            yield cached
+            return
+    model = registry.get(system_instruction, model_name)
+    chunks = []
+    part = None
+    with span("llm.stream", model=model_name):
+        try:
+            stream = governor.call_stream(
+                lambda seconds: model.generate_content(prompt, stream=True, request_options={"timeout": seconds}), timeout)
+            for part in stream:
+                text = part.text or ""
+                if text:
+                    chunks.append(text)
+                    yield text
+        except GovernorError:
+            metrics.inc("llm_calls", model=model_name, outcome="shed")
+            stale = _stale_answer(key, model_name)
+            if stale is None:
+                raise
+            yield stale
+            return
+        except Exception:
+            metrics.inc("llm_calls", model=model_name, outcome="error")
+            raise
+    metrics.inc("llm_calls", model=model_name, outcome="ok")
+    # The final chunk carries the usage totals for the whole stream
+    if part is not None:
+        _record_usage(model_name, part)
+    if use_cache:
+        response_cache.put(key, "".join(chunks).strip())
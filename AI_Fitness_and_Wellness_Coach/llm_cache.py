@@ -0,0 +1,147 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Response cache in front of every Gemini call.
+# Keys are a hash of the model name, system instruction and the normalized
+# prompt. Entries expire after a TTL; the memory tier is an LRU and an optional
+# SQLite file tier is shared by all gunicorn workers and survives restarts.
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1000"))
+# Path of the persistent tier, e.g. data/llm_cache.db; empty disables it
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")
+
+# Profile fields that change on every save and would make prompts uncacheable
+VOLATILE_PROFILE_FIELDS = ("created_at", "last_updated", "name")
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_prompt(text: str) -> str:
+    return _WS.sub(" ", text or "").strip().lower()
+
+
+def age_band(age: Any) -> str:
+    """Bucket adult ages into 10-year bands; minors and 60+ keep their exact age."""
+    try:
+        age = int(age)
+    except (TypeError, ValueError):
+        return str(age or "")
+    if age < 18 or age >= 60:
+        return str(age)
+    low = age // 10 * 10
+    return f"{low}-{low + 9}"
+
+
+def cacheable_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Profile as embedded in prompts: volatile fields dropped, age bucketed."""
+    result = {k: v for k, v in profile.items() if k not in VOLATILE_PROFILE_FIELDS}
+    if "age" in result:
+        result["age"] = age_band(result["age"])
+    return result
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = LLM_CACHE_SIZE, ttl: float = LLM_CACHE_TTL_SECONDS, path: str = LLM_CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "bytes_saved": 0}
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._disk().execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, expires REAL NOT NULL, text TEXT NOT NULL)"
+            )
+
+    @staticmethod
+    def make_key(prompt: str, system_instruction: str = "", model_name: str = "") -> str:
+        raw = "\x1f".join([model_name, normalize_prompt(system_instruction), normalize_prompt(prompt)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _disk(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    self.stats["bytes_saved"] += len(entry[1])
+                    return entry[1]
+        if self.path:
+            row = self._disk().execute("SELECT expires, text FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and row[0] > now:
+                self._remember(key, row[0], row[1])
+                with self._lock:
+                    self.stats["disk_hits"] += 1
+                    self.stats["bytes_saved"] += len(row[1])
+                return row[1]
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def get_stale(self, key: str) -> Optional[str]:
+        """The stored answer even if it has expired; a degraded reply while Gemini is unavailable."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            return entry[1]
+        if self.path:
+            row = self._disk().execute("SELECT text FROM responses WHERE key = ?", (key,)).fetchone()
+            if row:
+                return row[0]
+        return None
+
+    def _remember(self, key: str, expires: float, text: str) -> None:
+        with self._lock:
+            self._entries[key] = (expires, text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, key: str, text: str) -> None:
+        if not text:
+            return
+        expires = time.time() + self.ttl
+        self._remember(key, expires, text)
+        with self._lock:
+            self.stats["stores"] += 1
+        if self.path:
+            self._disk().execute("INSERT OR REPLACE INTO responses (key, expires, text) VALUES (?, ?, ?)", (key, expires, text))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.path:
+            self._disk().execute("DELETE FROM responses")
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["disk_hits"] + self.stats["misses"]
+            hits = self.stats["hits"] + self.stats["disk_hits"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+response_cache = ResponseCache()
@@ -1,27 +1,256 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
 from datetime import datetime
+from typing import Any, Optional
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),
-        logging.StreamHandler()
-    ]
-)
-
-def log_message(message: str, level: str = "info") -> None:
-    """Log a message with timestamp and level."""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    if level.lower() == "error":
-        logging.error(message)
-    elif level.lower() == "warning":
-        logging.warning(message)
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev server only
+    fcntl = None
+
+# Asynchronous, structured logging.
+# log_message() only builds a record and puts it on an in-memory queue; a
+# QueueListener thread formats it (one JSON object per line by default) and
+# writes it to app.log and stdout. Every record carries the id of the request
+# it was logged from. High-volume INFO messages can be sampled, and the log
+# file rotates by size and by time, whichever comes first. Gunicorn workers
+# share the file: one of them rotates it and the others follow to the new one.
+
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" (one object per line) or "text" (the previous human-readable format)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_STDOUT = os.getenv("LOG_STDOUT", "1") != "0"
+# Fraction of INFO records kept; warnings and errors are never sampled
+LOG_INFO_SAMPLE_RATE = float(os.getenv("LOG_INFO_SAMPLE_RATE", "1.0"))
+LOG_MAX_BYTES = int(float(os.getenv("LOG_MAX_MB", "10")) * 1024 * 1024)
+# A TimedRotatingFileHandler interval ("midnight", "H", ...), or "external" to
+# leave rotation to logrotate and just reopen the file once it was moved away
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "7"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """Set (and return) the id attached to every record logged in the current context."""
+    request_id = incoming or uuid.uuid4().hex[:16]
+    request_id_var.set(request_id)
+    return request_id
+
+
+class SizedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """Rotates on the time schedule, or earlier once the file reaches max_bytes.
+
+    Every gunicorn worker has one of these on the same file. A rollover runs
+    under an flock on <file>.lock, which also records when the file was last
+    rotated, so only the first worker to get there renames it; the others
+    skip the rollover and reopen the new file. Each write checks that the
+    path still names the open file, like WatchedFileHandler, so no worker
+    keeps appending to a file another one rotated away.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = 0, **kwargs: Any):
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+        self.lock_path = self.baseFilename + ".lock"
+        self._stat: Optional[os.stat_result] = None
+
+    def _open(self):
+        stream = super()._open()
+        self._stat = os.fstat(stream.fileno())
+        return stream
+
+    def _replaced(self) -> bool:
+        """Whether the open file was rotated (or deleted) by someone else."""
+        if self.stream is None:
+            return False
+        try:
+            return not os.path.samestat(self._stat, os.stat(self.baseFilename))
+        except FileNotFoundError:
+            return True
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self._replaced():
+            self.stream.close()
+            self.stream = self._open()
+        super().emit(record)
+
+    def shouldRollover(self, record: logging.LogRecord) -> int:
+        if self.max_bytes and self.stream is not None:
+            self.stream.seek(0, 2)
+            if self.stream.tell() >= self.max_bytes:
+                return 1
+        return super().shouldRollover(record)
+
+    def rotation_filename(self, default_name: str) -> str:
+        # Size rollovers can happen several times per interval; number them
+        # rather than overwriting the earlier backup of the same period
+        name, n = default_name, 0
+        while os.path.exists(name):
+            n += 1
+            name = f"{default_name}.{n}"
+        return name
+
+    def doRollover(self) -> None:
+        if fcntl is None:
+            super().doRollover()
+            return
+        with open(self.lock_path, "a+") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            lock.seek(0)
+            try:
+                last_rotated = float(lock.read() or 0)
+            except ValueError:
+                last_rotated = 0.0
+            if self._replaced() or last_rotated >= self.rolloverAt:
+                # Another worker rotated while we waited, or since this period began
+                if self.stream is not None:
+                    self.stream.close()
+                    self.stream = None
+                if not self.delay:
+                    self.stream = self._open()
+                now = int(time.time())
+                if now >= self.rolloverAt:
+                    self.rolloverAt = self.computeRollover(now)
+                return
+            super().doRollover()
+            lock.truncate(0)
+            lock.write(repr(time.time()))
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "thread": record.threadName,
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _ContextFilter(logging.Filter):
+    """Runs in the caller's thread: stamps the request id before the record is queued."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class _Sampler:
+    """Keeps a random `info_sample_rate` fraction of INFO messages."""
+
+    def __init__(self, info_sample_rate: float):
+        self.info_sample_rate = info_sample_rate
+        self.sampled_out = 0
+
+    def drop(self, levelno: int) -> bool:
+        if levelno == logging.INFO and self.info_sample_rate < 1.0 and random.random() >= self.info_sample_rate:
+            self.sampled_out += 1
+            return True
+        return False
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the request path: if the listener falls behind, records are dropped and counted."""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Records are built by log_message and never touched again, so the
+        # default copy + pre-format in the caller's thread is unnecessary
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _formatter() -> logging.Formatter:
+    if LOG_FORMAT == "text":
+        return logging.Formatter("%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s")
+    return JsonFormatter()
+
+
+def _build_logger():
+    formatter = _formatter()
+    handlers = []
+    if LOG_ROTATE_WHEN == "external":
+        file_handler = logging.handlers.WatchedFileHandler(LOG_FILE, encoding="utf-8", delay=True)
     else:
-        logging.info(message)
-    
-    # Also print to console for development
-    print(f"[{timestamp}] {level.upper()}: {message}")
+        file_handler = SizedTimedRotatingFileHandler(
+            LOG_FILE, max_bytes=LOG_MAX_BYTES, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUPS, encoding="utf-8", delay=True
+        )
+    handlers.append(file_handler)
+    if LOG_STDOUT:
+        handlers.append(logging.StreamHandler(sys.stdout))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = _DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(_ContextFilter())
+
+    coach_logger = logging.getLogger("coach")
+    coach_logger.setLevel(LOG_LEVEL)
+    coach_logger.addHandler(queue_handler)
+    coach_logger.propagate = False
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return coach_logger, queue_handler, listener
+
+
+_logger, _queue_handler, _listener = _build_logger()
+_sampler = _Sampler(LOG_INFO_SAMPLE_RATE)
+
+_LEVELS = {"error": logging.ERROR, "warning": logging.WARNING, "debug": logging.DEBUG}
+
+
+def log_message(message: str, level: str = "info", **fields: Any) -> None:
+    """Log a message with timestamp and level (plus optional structured fields)."""
+    levelno = _LEVELS.get(level.lower(), logging.INFO)
+    # Sampled-out messages cost one random() call and no record at all
+    if not _logger.isEnabledFor(levelno) or _sampler.drop(levelno):
+        return
+    # Built directly rather than via Logger.log, which walks the stack to find the caller
+    record = logging.LogRecord(_logger.name, levelno, "", 0, message, None, None)
+    if fields:
+        record.fields = fields
+    _queue_handler.handle(record)
+
+
+def logging_stats() -> dict:
+    return {
+        "queued": _queue_handler.queue.qsize(),
+        "dropped": _queue_handler.dropped,
+        "sampled_out": _sampler.sampled_out,
+        "info_sample_rate": _sampler.info_sample_rate,
+    }
+
+
+def flush(timeout: float = 2.0) -> None:
+    """Wait until queued records have been written (for tests, benchmarks and shutdown)."""
+    deadline = time.monotonic() + timeout
+    while _queue_handler.queue.qsize() and time.monotonic() < deadline:
+        time.sleep(0.005)
@@ -0,0 +1,198 @@
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Latency and usage metrics.
+# span(name) times a block and feeds a per-span latency window (p50/p95/p99
+# are computed from the newest METRICS_WINDOW samples); counters record LLM
+# calls, cache hits and token counts; gauges are read on demand (e.g. the
+# model-call governor's queue depth). render_prometheus() produces the text
+# served at /metrics. When a request is profiled, spans also build a tree
+# (agents running in the pool attach to the request's tree through the
+# copied context) that is logged when the request ends.
+
+METRICS_ENABLED = os.getenv("METRICS", "1") != "0"
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "2048"))
+# Per-request span trees: "off", "header" (requests sending X-Profile: 1) or "all"
+METRICS_PROFILE = os.getenv("METRICS_PROFILE", "off").lower()
+QUANTILES = (0.5, 0.95, 0.99)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_profile_node: ContextVar[Optional[Dict[str, Any]]] = ContextVar("profile_node", default=None)
+
+
+class _Summary:
+    __slots__ = ("count", "total", "window")
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.total = 0.0
+        self.window: deque = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.window.append(value)
+
+    def quantiles(self) -> Dict[float, float]:
+        values = sorted(self.window)
+        if not values:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: values[min(len(values) - 1, int(q * len(values)))] for q in QUANTILES}
+
+
+class Registry:
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._summaries: Dict[Tuple[str, Labels], _Summary] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = self._summaries[key] = _Summary(self.window)
+            summary.observe(seconds)
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def gauge(self, name: str, read: Callable[[], float]) -> None:
+        """Register a value that is read when metrics are rendered (queue depths, limits)."""
+        with self._lock:
+            self._gauges[name] = read
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Latency quantiles (ms) per span and counter values, for JSON consumers."""
+        with self._lock:
+            spans = {}
+            for (name, labels), summary in self._summaries.items():
+                label = ",".join(f"{k}={v}" for k, v in labels)
+                spans[f"{name}{{{label}}}" if label else name] = {
+                    "count": summary.count,
+                    **{f"p{int(q * 100)}_ms": round(v * 1000, 3) for q, v in summary.quantiles().items()},
+                }
+            counters = {
+                name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else ""): value
+                for (name, labels), value in self._counters.items()
+            }
+            gauges = dict(self._gauges)
+        return {"spans": spans, "counters": counters, "gauges": {name: read() for name, read in gauges.items()}}
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            summaries = sorted(self._summaries.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+        seen = set()
+        for (name, labels), summary in summaries:
+            metric = f"coach_{name}_seconds"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} summary")
+            for q, value in summary.quantiles().items():
+                lines.append(f"{metric}{_labels(labels + (('quantile', str(q)),))} {value:.6f}")
+            lines.append(f"{metric}_sum{_labels(labels)} {summary.total:.6f}")
+            lines.append(f"{metric}_count{_labels(labels)} {summary.count}")
+        for (name, labels), value in counters:
+            metric = f"coach_{name}_total"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_labels(labels)} {value:g}")
+        for name, read in gauges:
+            lines.append(f"# TYPE coach_{name} gauge")
+            lines.append(f"coach_{name} {read():g}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+registry = Registry()
+
+
+@contextmanager
+def span(name: str, metric: str = "span", **labels: str) -> Iterator[Optional[Dict[str, Any]]]:
+    """Time a block as `name`; inside a profiled request it also becomes a node of the span tree."""
+    if not METRICS_ENABLED:
+        yield None
+        return
+    parent = _profile_node.get()
+    node = token = None
+    if parent is not None:
+        node = {"name": name, "children": []}
+        parent["children"].append(node)
+        token = _profile_node.set(node)
+    start = time.perf_counter()
+    try:
+        yield node
+    finally:
+        elapsed = time.perf_counter() - start
+        if token is not None:
+            node["ms"] = round(elapsed * 1000, 3)
+            _profile_node.reset(token)
+        registry.observe(metric, elapsed, span=name, **labels)
+
+
+def traced(name: str) -> Callable:
+    """Decorator form of span(); generators are timed until they are exhausted."""
+    def decorate(fn: Callable) -> Callable:
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def gen_wrapper(*args: Any, **kwargs: Any):
+                with span(name):
+                    yield from fn(*args, **kwargs)
+            return gen_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def instrument_module(namespace: Dict[str, Any], prefix: str) -> None:
+    """Wrap every public function defined in a module (pass its globals()) in a span."""
+    module_name = namespace.get("__name__")
+    for attr, value in list(namespace.items()):
+        if attr.startswith("_") or not inspect.isfunction(value) or value.__module__ != module_name:
+            continue
+        namespace[attr] = traced(f"{prefix}.{attr}")(value)
+
+
+def start_profile(name: str) -> Tuple[Dict[str, Any], Any]:
+    """Begin collecting a span tree for the current context; returns (root, token)."""
+    root = {"name": name, "children": [], "start": time.perf_counter()}
+    return root, _profile_node.set(root)
+
+
+def finish_profile(root: Dict[str, Any], token: Any) -> Dict[str, Any]:
+    _profile_node.reset(token)
+    root["ms"] = round((time.perf_counter() - root.pop("start")) * 1000, 3)
+    return root
+
+
+def format_tree(node: Dict[str, Any], depth: int = 0) -> str:
+    lines = [f"{'  ' * depth}{node['name']}: {node.get('ms', 0):.1f} ms"]
+    for child in node["children"]:
+        lines.append(format_tree(child, depth + 1))
+    return "\n".join(lines)
@@ -0,0 +1,66 @@
+"""One-shot migration of the JSON storage into the SQLite backend.
+
+    python migrate_to_sqlite.py [--db data/coach.db]
+
+Reads every per-user segment (and any legacy data/*.json file that was not
+imported yet) and inserts it into SQLite. Afterwards start the app with
+STORAGE_BACKEND=sqlite.
+"""
+import argparse
+import os
+import sys
+import time
+
+from database import (
+    DATA_DIR, SQLITE_PATH, ALL_STORES, USERS, WORKOUTS, CHAT, MEALS, WORKOUT_LOGS, WELLNESS,
+    USERS_FILE, WORKOUTS_FILE, CHAT_FILE, MEALS_FILE, WORKOUT_LOGS_FILE, WELLNESS_FILE, _load_json,
+)
+from sqlite_store import SQLiteStore
+from storage import JsonLogStore
+
+LEGACY_FILES = {
+    USERS: USERS_FILE,
+    WORKOUTS: WORKOUTS_FILE,
+    CHAT: CHAT_FILE,
+    MEALS: MEALS_FILE,
+    WORKOUT_LOGS: WORKOUT_LOGS_FILE,
+    WELLNESS: WELLNESS_FILE,
+}
+
+
+def migrate(db_path: str) -> int:
+    source = JsonLogStore(DATA_DIR)
+    target = SQLiteStore(db_path)
+    total = 0
+    for store in ALL_STORES:
+        for username in source.usernames(store):
+            records = source.read_all(store, username)
+            target.append_many(store, username, records)
+            total += len(records)
+        legacy = _load_json(LEGACY_FILES[store]) if store in LEGACY_FILES else {}
+        for username, value in legacy.items():
+            records = value if isinstance(value, list) else [value]
+            target.append_many(store, username, records)
+            total += len(records)
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Migrate JSON storage into SQLite")
+    parser.add_argument("--db", default=SQLITE_PATH, help="target SQLite file")
+    parser.add_argument("--force", action="store_true", help="migrate even if the target already has data")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db) and not args.force:
+        (existing,) = SQLiteStore(args.db)._conn().execute("SELECT COUNT(*) FROM records").fetchone()
+        if existing:
+            sys.exit(f"{args.db} already holds {existing} records; use --force to append anyway")
+
+    start = time.perf_counter()
+    total = migrate(args.db)
+    print(f"Migrated {total} records into {args.db} in {time.perf_counter() - start:.1f}s")
+    print("Start the app with STORAGE_BACKEND=sqlite to use it.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""Pre-generated workout plans per profile bucket.
+
+Most users share a (level, goal, equipment, age band, gender) combination,
+so plans for those buckets are generated offline and served from disk:
+
+    DATA_DIR/plan_library/index.json        {"file": ..., "entries": {bucket: [offset, length, generated_at]}}
+    DATA_DIR/plan_library/plans-<ts>.jsonl  one {"bucket", "text"} line per plan
+
+The index is loaded lazily and re-read only when it changes; a plan costs
+one seek + read the first time and is kept in a bounded in-memory LRU after
+that. Stale or missing buckets are filled in the background (or from the
+live plan that was generated anyway); only plans written by the model are
+stored, never the local fallback. Users with physical limitations never use
+the library - their plans stay personalized.
+
+    python plan_library.py build [--workers 8] [--from-users]
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import database
+from database import DATA_DIR, USERS
+from file_cache import default_cache
+from llm_cache import age_band
+from storage import atomic_write, locked_segment, parse_json_file
+from workout_engine import GOALS, LEVELS, equipment_tags, normalize_choice
+from workout_generator import generate_workout, generate_workout_with_source
+from logger import log_message
+
+PLAN_LIBRARY_ENABLED = os.getenv("PLAN_LIBRARY", "1") != "0"
+PLAN_LIBRARY_DIR = os.getenv("PLAN_LIBRARY_DIR", os.path.join(DATA_DIR, "plan_library"))
+PLAN_LIBRARY_MAX_AGE_DAYS = float(os.getenv("PLAN_LIBRARY_MAX_AGE_DAYS", "7"))
+# Plan texts kept in memory after their first read
+PLAN_LIBRARY_CACHE_ENTRIES = int(os.getenv("PLAN_LIBRARY_CACHE_ENTRIES", "2000"))
+
+# Grid generated by `build`, on top of any buckets seen in real profiles
+GRID_EQUIPMENT = ("none", "dumbbells", "bands", "dumbbells, bands", "kettlebell", "gym")
+GRID_AGES = (25, 35, 45, 55)
+GRID_GENDERS = ("male", "female", "other")
+GRID_DURATIONS = (30,)
+
+
+def bucket_key(level: str, goal: str, duration: int, equipment: str, age: Any, gender: str) -> str:
+    return "|".join((
+        normalize_choice(level, LEVELS, "beginner"),
+        normalize_choice(goal, GOALS, "general health"),
+        str(int(duration or 30)),
+        "+".join(sorted(equipment_tags(equipment))),
+        age_band(age),
+        (gender or "").strip().lower(),
+    ))
+
+
+class PlanLibrary:
+    def __init__(self, directory: str = PLAN_LIBRARY_DIR, max_age_days: float = PLAN_LIBRARY_MAX_AGE_DAYS,
+                 max_entries: int = PLAN_LIBRARY_CACHE_ENTRIES):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.json")
+        self.max_age = max_age_days * 86400
+        self.max_entries = max_entries
+        self._texts: "OrderedDict[Tuple[str, int], str]" = OrderedDict()
+        self._refresh_queue: "queue.Queue[Tuple[str, tuple]]" = queue.Queue()
+        self._queued: set = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "refreshed": 0, "stored": 0}
+
+    def _index(self) -> Dict[str, Any]:
+        try:
+            return default_cache.load(self.index_path, parse_json_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _read_plan(self, file_name: str, offset: int, length: int) -> str:
+        key = (file_name, offset)
+        with self._lock:
+            text = self._texts.get(key)
+            if text is not None:
+                self._texts.move_to_end(key)
+                return text
+        with open(os.path.join(self.directory, file_name), "rb") as f:
+            f.seek(offset)
+            text = json.loads(f.read(length))["text"]
+        with self._lock:
+            self._texts[key] = text
+            while len(self._texts) > self.max_entries:
+                self._texts.popitem(last=False)
+        return text
+
+    def get(self, bucket: str, regenerate: Optional[tuple] = None) -> Optional[str]:
+        """Library plan for a bucket, or None.
+
+        `regenerate` holds generate_workout() arguments; when given, a stale
+        plan is still returned but queued for background regeneration.
+        """
+        index = self._index()
+        entry = index.get("entries", {}).get(bucket)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        try:
+            text = self._read_plan(index["file"], entry[0], entry[1])
+        except (OSError, ValueError, KeyError):
+            # The file was replaced by a rebuild after we read the index
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        if regenerate is not None and time.time() - entry[2] > self.max_age:
+            self.stats["stale"] += 1
+            self.refresh_async(bucket, regenerate)
+        return text
+
+    def put(self, bucket: str, text: str) -> None:
+        """Add or replace one bucket's plan (appends to the current plans file)."""
+        os.makedirs(self.directory, exist_ok=True)
+        with locked_segment(self.index_path, "a+b") as f:
+            f.seek(0)
+            try:
+                index = json.loads(f.read() or b"{}")
+            except json.JSONDecodeError:
+                index = {}
+            file_name = index.setdefault("file", f"plans-{int(time.time())}.jsonl")
+            with open(os.path.join(self.directory, file_name), "ab") as data:
+                offset = data.tell()
+                line = json.dumps({"bucket": bucket, "text": text}, ensure_ascii=False).encode("utf-8") + b"\n"
+                data.write(line)
+            index.setdefault("entries", {})[bucket] = [offset, len(line), time.time()]
+            atomic_write(self.index_path, json.dumps(index).encode("utf-8"))
+        self.stats["stored"] += 1
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="plan-library", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            bucket, args = self._refresh_queue.get()
+            try:
+                text, from_model = generate_workout_with_source(*args)
+                # A fallback plan would replace a model plan; keep the stale one and retry on a later hit
+                if from_model:
+                    self.put(bucket, text)
+                    self.stats["refreshed"] += 1
+            except Exception as e:
+                log_message(f"Plan library refresh of {bucket} failed: {e}", "error")
+            finally:
+                with self._lock:
+                    self._queued.discard(bucket)
+
+    def refresh_async(self, bucket: str, args: tuple) -> None:
+        with self._lock:
+            if bucket in self._queued:
+                return
+            self._queued.add(bucket)
+        self._ensure_worker()
+        self._refresh_queue.put((bucket, args))
+
+    def build(self, plans: Dict[str, str]) -> None:
+        """Replace the whole library with `plans` (bucket -> text)."""
+        os.makedirs(self.directory, exist_ok=True)
+        file_name = f"plans-{int(time.time())}.jsonl"
+        entries = {}
+        now = time.time()
+        with open(os.path.join(self.directory, file_name), "wb") as data:
+            for bucket, text in plans.items():
+                line = json.dumps({"bucket": bucket, "text": text}, ensure_ascii=False).encode("utf-8") + b"\n"
+                entries[bucket] = [data.tell(), len(line), now]
+                data.write(line)
+            data.flush()
+            os.fsync(data.fileno())
+        with locked_segment(self.index_path, "a+b"):
+            atomic_write(self.index_path, json.dumps({"file": file_name, "entries": entries}).encode("utf-8"))
+        for name in os.listdir(self.directory):
+            if name.startswith("plans-") and name != file_name:
+                os.remove(os.path.join(self.directory, name))
+
+    def info(self) -> Dict[str, Any]:
+        return {**self.stats, "buckets": len(self._index().get("entries", {})), "pending": self._refresh_queue.qsize()}
+
+
+plan_library = PlanLibrary()
+
+
+def workout_for(level: str, goal: str, duration: int, equipment: str, gender: str = "", age: int = 0, physical_limitations: str = "") -> str:
+    """generate_workout(), answered from the plan library whenever the profile allows it."""
+    args = (level, goal, duration, equipment, gender, age, physical_limitations)
+    if not PLAN_LIBRARY_ENABLED or (physical_limitations or "").strip():
+        return generate_workout(*args)
+    bucket = bucket_key(level, goal, duration, equipment, age, gender)
+    text = plan_library.get(bucket, regenerate=args)
+    if text is None:
+        text, from_model = generate_workout_with_source(*args)
+        # The live plan fits everyone in the bucket, so keep it for them - unless it is
+        # the generic local fallback (model down, breaker open), which must not become canonical
+        if from_model:
+            try:
+                plan_library.put(bucket, text)
+            except OSError as e:
+                log_message(f"Could not store plan for {bucket}: {e}", "warning")
+    return text
+
+
+def _grid() -> Iterator[tuple]:
+    for level in LEVELS:
+        for goal in GOALS:
+            for duration in GRID_DURATIONS:
+                for equipment in GRID_EQUIPMENT:
+                    for age in GRID_AGES:
+                        for gender in GRID_GENDERS:
+                            yield (level, goal, duration, equipment, gender, age, "")
+
+
+def _observed() -> Iterator[tuple]:
+    for username in database._store.usernames(USERS):
+        profile = database._store.last(USERS, username) or {}
+        if profile.get("physical_limitations"):
+            continue
+        yield (profile.get("fitness_level", ""), profile.get("goal", ""), 30, profile.get("equipment", ""),
+               profile.get("gender", ""), profile.get("age", 0), "")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pre-generate the workout plan library")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--workers", type=int, default=8, help="concurrent plan generations")
+    parser.add_argument("--from-users", action="store_true", help="also cover every bucket seen in user profiles")
+    args = parser.parse_args()
+
+    buckets: Dict[str, tuple] = {}
+    for profile in _grid():
+        buckets.setdefault(bucket_key(*profile[:4], profile[5], profile[4]), profile)
+    if args.from_users:
+        for profile in _observed():
+            buckets.setdefault(bucket_key(*profile[:4], profile[5], profile[4]), profile)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        results = pool.map(lambda profile: generate_workout_with_source(*profile), buckets.values())
+        # Buckets whose generation fell back to the local engine are left out and filled live later
+        plans = {bucket: text for bucket, (text, from_model) in zip(buckets.keys(), results) if from_model}
+    plan_library.build(plans)
+    elapsed = time.perf_counter() - start
+    skipped = len(buckets) - len(plans)
+    print(f"Built {len(plans)} plans in {elapsed:.1f}s -> {plan_library.directory} ({datetime.now().isoformat(timespec='seconds')})"
+          + (f", {skipped} buckets skipped (model unavailable)" if skipped else ""))
+
+
+if __name__ == "__main__":
+    main()
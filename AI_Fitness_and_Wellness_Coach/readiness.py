@@ -0,0 +1,181 @@
+"""Nightly recomputation of readiness scores and the reduce-intensity flag.
+
+Scans every registered user with a process pool, reading only each user's
+recent wellness/workout entries, and writes one row per user to a SQLite
+table that the request path reads instead of recomputing.
+
+    python readiness.py [--workers 8] [--chunk 500]
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from multiprocessing import Pool
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import database
+from analytics import ACUTE_DAYS, CHRONIC_DAYS, DAY, _field, _workout_load
+from database import DATA_DIR, USERS, WELLNESS, WORKOUT_LOGS
+
+READINESS_DB = os.getenv("READINESS_DB", os.path.join(DATA_DIR, "readiness.db"))
+# Entries per store read per user; enough to cover the 28-day chronic window
+RECENT_ENTRIES = int(os.getenv("READINESS_RECENT_ENTRIES", "120"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS readiness (
+    username TEXT PRIMARY KEY,
+    score REAL,
+    reduce_intensity INTEGER NOT NULL,
+    last_wellness TEXT NOT NULL,
+    computed_at TEXT NOT NULL
+)
+"""
+
+
+def _numbers(records: List[Dict[str, Any]], get) -> np.ndarray:
+    return np.array([get(r) for r in records], dtype=float)
+
+
+def _epochs(records: List[Dict[str, Any]]) -> np.ndarray:
+    out = np.full(len(records), np.nan)
+    for i, r in enumerate(records):
+        try:
+            out[i] = datetime.fromisoformat(r.get("timestamp", "")).timestamp()
+        except (TypeError, ValueError):
+            pass
+    return out
+
+
+def compute_readiness(wellness: List[Dict[str, Any]], workouts: List[Dict[str, Any]], now: float) -> Tuple[Optional[float], bool]:
+    """Readiness score (0-100, None without data) and the reduce-intensity flag.
+
+    score = 50% mean 7-day sleep quality + 30% inverted mean 7-day stress
+            + 20% closeness of the acute:chronic workload ratio to ~1.05
+    """
+    wellness = sorted(wellness, key=lambda r: r.get("timestamp", ""))
+    sleep, stress = _numbers(wellness, _field("sleep_quality")), _numbers(wellness, _field("stress_level"))
+
+    # Same rule as the live check: each of the last 3 logs shows poor sleep or high stress
+    with np.errstate(invalid="ignore"):
+        poor = (sleep[-3:] < 50) | (stress[-3:] >= 4)
+    reduce_intensity = bool(poor.sum() >= 3)
+
+    week = _epochs(wellness) >= now - ACUTE_DAYS * DAY
+    sleep_week, stress_week = sleep[week], stress[week]
+    load = np.nan_to_num(_numbers(workouts, _workout_load))
+    load_ts = _epochs(workouts)
+    acute = load[load_ts >= now - ACUTE_DAYS * DAY].sum()
+    chronic_weekly = load[load_ts >= now - CHRONIC_DAYS * DAY].sum() * ACUTE_DAYS / CHRONIC_DAYS
+
+    components, weights = [], []
+    if np.any(~np.isnan(sleep_week)):
+        components.append(np.nanmean(sleep_week))
+        weights.append(0.5)
+    if np.any(~np.isnan(stress_week)):
+        components.append(float(np.clip((5 - np.nanmean(stress_week)) / 4 * 100, 0, 100)))
+        weights.append(0.3)
+    if chronic_weekly:
+        components.append(max(0.0, 100 - abs(acute / chronic_weekly - 1.05) * 100))
+        weights.append(0.2)
+    if not components:
+        return None, reduce_intensity
+    score = float(np.clip(np.average(components, weights=weights), 0, 100))
+    return round(score, 1), reduce_intensity
+
+
+class ReadinessTable:
+    """Precomputed readiness rows, one per user."""
+
+    def __init__(self, path: str = READINESS_DB):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def get(self, username: str) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return None
+        row = self._conn().execute(
+            "SELECT score, reduce_intensity, last_wellness, computed_at FROM readiness WHERE username = ?", (username,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"score": row[0], "reduce_intensity": bool(row[1]), "last_wellness": row[2], "computed_at": row[3]}
+
+    def put_many(self, rows: List[Tuple[str, Optional[float], bool, str, str]]) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT OR REPLACE INTO readiness VALUES (?, ?, ?, ?, ?)", rows)
+
+
+readiness_table = ReadinessTable()
+
+
+def lookup(username: str) -> Optional[Dict[str, Any]]:
+    """Precomputed row if it is still current, i.e. no wellness log arrived since it was computed."""
+    row = readiness_table.get(username)
+    if row is None:
+        return None
+    stats = database._store.read_stats(username) or {}
+    if stats.get("last", {}).get(WELLNESS, "") != row["last_wellness"]:
+        return None
+    return row
+
+
+def _init_worker() -> None:
+    # Each process needs its own storage handles (SQLite connections must not cross a fork)
+    database._store = database.create_store()
+
+
+def _score_user(username: str) -> Tuple[str, Optional[float], bool, str, str]:
+    store = database._store
+    wellness = store.read_recent(WELLNESS, username, RECENT_ENTRIES)
+    workouts = store.read_recent(WORKOUT_LOGS, username, RECENT_ENTRIES)
+    score, reduce_intensity = compute_readiness(wellness, workouts, time.time())
+    last_wellness = max((r.get("timestamp", "") for r in wellness), default="")
+    return username, score, reduce_intensity, last_wellness, datetime.now().isoformat()
+
+
+def run(workers: int, chunk: int, table: ReadinessTable = readiness_table) -> Tuple[int, float]:
+    usernames: Iterator[str] = database._store.usernames(USERS)
+    start = time.perf_counter()
+    done = 0
+    batch = []
+    with Pool(workers, initializer=_init_worker) as pool:
+        for row in pool.imap_unordered(_score_user, usernames, chunksize=chunk):
+            batch.append(row)
+            if len(batch) >= 1000:
+                table.put_many(batch)
+                done += len(batch)
+                batch = []
+        if batch:
+            table.put_many(batch)
+            done += len(batch)
+    return done, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recompute readiness scores for every user")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk", type=int, default=200, help="users per task sent to a worker")
+    args = parser.parse_args()
+
+    users, elapsed = run(args.workers, args.chunk)
+    print(f"Scored {users} users in {elapsed:.1f}s ({users / elapsed if elapsed else 0:,.0f} users/s) -> {READINESS_DB}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from database import DATA_DIR
+from metrics import registry as metrics
+from storage import atomic_write, locked_segment
+
+# Coalescing of duplicate in-flight model calls.
+# Double-submitted /workout forms and retried /api/log/* requests usually ask
+# for exactly what is already being generated. flights.do(key, fn, ...) runs
+# fn once per key at a time: callers arriving while it runs wait and share
+# its result (or its exception). With SINGLEFLIGHT_SHARED=1 the leader also
+# holds a per-key lock file under SINGLEFLIGHT_DIR, so gunicorn workers
+# coalesce too: a worker that had to wait picks up the result file the
+# holder wrote, provided it was finished after the worker started waiting.
+
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT", "1") != "0"
+SINGLEFLIGHT_SHARED = os.getenv("SINGLEFLIGHT_SHARED", "0") == "1"
+SINGLEFLIGHT_DIR = os.getenv("SINGLEFLIGHT_DIR", os.path.join(DATA_DIR, "singleflight"))
+# Followers stop waiting after this many seconds and make their own call
+SINGLEFLIGHT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_TIMEOUT", "120"))
+# Result files older than this are pruned
+RESULT_TTL_SECONDS = 60.0
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    def __init__(self, shared: bool = SINGLEFLIGHT_SHARED, directory: str = SINGLEFLIGHT_DIR, timeout: float = SINGLEFLIGHT_TIMEOUT):
+        self.shared = shared
+        self.directory = directory
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._last_prune = 0.0
+        self.stats = {"leaders": 0, "shared": 0, "shared_remote": 0, "timeouts": 0}
+
+    def _count(self, outcome: str) -> None:
+        with self._lock:
+            self.stats[outcome] += 1
+        metrics.inc("singleflight", outcome=outcome)
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """fn(*args, **kwargs), shared with every concurrent caller using the same key."""
+        if not SINGLEFLIGHT_ENABLED:
+            return fn(*args, **kwargs)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            if not call.done.wait(self.timeout):
+                self._count("timeouts")
+                return fn(*args, **kwargs)
+            self._count("shared")
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = self._lead(key, fn, args, kwargs)
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _lead(self, key: Hashable, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> Any:
+        if not self.shared:
+            self._count("leaders")
+            return fn(*args, **kwargs)
+        digest = hashlib.sha1(json.dumps(key, default=str).encode("utf-8")).hexdigest()
+        lock_path = os.path.join(self.directory, digest + ".lock")
+        result_path = os.path.join(self.directory, digest + ".json")
+        os.makedirs(self.directory, exist_ok=True)
+        started = time.time()
+        # locked_segment reopens the lock file if the previous holder removed it while we waited
+        with locked_segment(lock_path, "a+b"):
+            try:
+                try:
+                    with open(result_path, encoding="utf-8") as f:
+                        result = json.load(f)
+                    if result["finished"] >= started:
+                        self._count("shared_remote")
+                        return result["value"]
+                except (FileNotFoundError, ValueError, KeyError):
+                    pass
+                self._count("leaders")
+                value = fn(*args, **kwargs)
+                try:
+                    atomic_write(result_path, json.dumps({"finished": time.time(), "value": value}).encode("utf-8"), fsync=False)
+                except (TypeError, OSError):
+                    pass  # not JSON-serializable or disk trouble: other workers just make their own call
+                return value
+            finally:
+                try:
+                    os.remove(lock_path)
+                except OSError:
+                    pass
+                self._prune()
+
+    def _prune(self) -> None:
+        now = time.time()
+        if now - self._last_prune < RESULT_TTL_SECONDS:
+            return
+        self._last_prune = now
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                path = os.path.join(self.directory, name)
+                try:
+                    if now - os.path.getmtime(path) > RESULT_TTL_SECONDS:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "in_flight": len(self._calls), "shared_across_workers": self.shared}
+
+
+flights = SingleFlight()
@@ -0,0 +1,126 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import Optional, Dict, Any, List, Iterable, Iterator, Tuple, Callable
+
+from storage import StorageBackend
+
+# SQLite storage backend (STORAGE_BACKEND=sqlite).
+# One `records` table for every store, WAL mode so gunicorn workers can read
+# while another one writes, and indexes that make per-user lookups O(log n).
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    store TEXT NOT NULL,
+    username TEXT NOT NULL,
+    timestamp TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_records_store_user ON records (store, username, id);
+CREATE INDEX IF NOT EXISTS idx_records_user_ts ON records (username, timestamp);
+CREATE TABLE IF NOT EXISTS user_stats (
+    username TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+
+def _timestamp(record: Dict[str, Any]) -> str:
+    return record.get("timestamp") or record.get("last_updated") or ""
+
+
+class SQLiteStore(StorageBackend):
+    """Records stored as JSON rows in a single SQLite database."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append_many(self, store: str, username: str, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        rows = [(store, username, _timestamp(r), json.dumps(r, ensure_ascii=False)) for r in records]
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT INTO records (store, username, timestamp, data) VALUES (?, ?, ?, ?)", rows)
+
+    def read_all(self, store: str, username: str) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            "SELECT data FROM records WHERE store = ? AND username = ? ORDER BY id", (store, username)
+        ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def read_recent(self, store: str, username: str, limit: int) -> List[Dict[str, Any]]:
+        if limit <= 0:
+            return []
+        rows = self._conn().execute(
+            "SELECT data FROM records WHERE store = ? AND username = ? ORDER BY id DESC LIMIT ?",
+            (store, username, limit),
+        ).fetchall()
+        return [json.loads(data) for (data,) in reversed(rows)]
+
+    def read_since(self, store: str, username: str, start: int) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            "SELECT data FROM records WHERE store = ? AND username = ? ORDER BY id LIMIT -1 OFFSET ?",
+            (store, username, start),
+        ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def count(self, store: str, username: str) -> int:
+        (n,) = self._conn().execute(
+            "SELECT COUNT(*) FROM records WHERE store = ? AND username = ?", (store, username)
+        ).fetchone()
+        return n
+
+    def compact(self, store: str, username: str, keep: int) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "DELETE FROM records WHERE store = ? AND username = ? AND id NOT IN "
+                "(SELECT id FROM records WHERE store = ? AND username = ? ORDER BY id DESC LIMIT ?)",
+                (store, username, store, username, keep),
+            )
+
+    def usernames(self, store: str) -> Iterator[str]:
+        for (username,) in self._conn().execute("SELECT DISTINCT username FROM records WHERE store = ?", (store,)):
+            yield username
+
+    def activity(self, username: str, stores: Iterable[str]) -> Dict[str, Tuple[int, str]]:
+        """Counts and newest timestamps for every store in one aggregate query."""
+        rows = self._conn().execute(
+            "SELECT store, COUNT(*), MAX(timestamp) FROM records WHERE username = ? GROUP BY store", (username,)
+        ).fetchall()
+        found = {store: (n, ts or "") for store, n, ts in rows}
+        return {store: found.get(store, (0, "")) for store in stores}
+
+    def read_stats(self, username: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT data FROM user_stats WHERE username = ?", (username,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update_stats(self, username: str, update: Callable[[Optional[Dict[str, Any]]], Dict[str, Any]]) -> Dict[str, Any]:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT data FROM user_stats WHERE username = ?", (username,)).fetchone()
+            stats = update(json.loads(row[0]) if row else None)
+            conn.execute(
+                "INSERT OR REPLACE INTO user_stats (username, data) VALUES (?, ?)",
+                (username, json.dumps(stats, ensure_ascii=False)),
+            )
+        return stats
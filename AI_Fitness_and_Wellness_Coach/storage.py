@@ -0,0 +1,340 @@
+import os
+import json
+import time
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Iterable, Iterator, Tuple, Callable
+from urllib.parse import quote, unquote
+
+from file_cache import FileCache, default_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev server only
+    fcntl = None
+
+# Append-only per-user log storage.
+# Every (store, user) pair lives in its own JSONL segment:
+#   DATA_DIR/<store>/<quoted username>.jsonl
+# so a write appends a single line and a read only touches that user's file.
+#
+# Concurrency (gunicorn runs several worker processes):
+# - appends take an exclusive flock on the segment, readers a shared one
+# - rewrites (compaction, whole-file JSON) go to a temp file + fsync + os.replace
+# - concurrent appends inside a process are group-committed: a leader thread
+#   writes everything queued so far with a single fsync per segment, then hands
+#   off to the next waiting writer
+#
+# Reads go through a FileCache: an unchanged segment costs one stat, and a
+# segment that only grew is extended by parsing just the appended lines.
+
+SEGMENT_EXT = ".jsonl"
+# Per-user aggregate records (see user_stats.py) live in DATA_DIR/<STATS_DIR>/<user>.json
+STATS_DIR = "user_stats"
+
+FSYNC = os.getenv("STORAGE_FSYNC", "1") != "0"
+COMMIT_WINDOW = float(os.getenv("STORAGE_COMMIT_WINDOW_MS", "0")) / 1000.0
+
+
+def _segment_name(username: str) -> str:
+    """Filesystem-safe, reversible file name for a username."""
+    return quote(username, safe="").replace(".", "%2E") + SEGMENT_EXT
+
+
+def _parse_lines(lines: List[bytes]) -> List[Dict[str, Any]]:
+    records = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            # A torn or partial line is skipped rather than failing the read
+            continue
+    return records
+
+
+def parse_json_file(path: str) -> Tuple[Any, int]:
+    """Parse a JSON file; returns (data, size in bytes) as FileCache.load expects."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return json.loads(data), len(data)
+
+
+def _encode(records: List[Dict[str, Any]]) -> bytes:
+    return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+
+
+@contextmanager
+def _flock(f, exclusive: bool):
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    try:
+        yield
+    finally:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def locked_segment(path: str, mode: str = "ab"):
+    """Open `path` under an exclusive lock, retrying if it was replaced while we waited."""
+    while True:
+        f = open(path, mode)
+        try:
+            with _flock(f, exclusive=True):
+                # A concurrent compaction may have swapped the inode; writing to the
+                # old one would lose the record, so reopen and try again
+                try:
+                    same = os.path.samestat(os.fstat(f.fileno()), os.stat(path))
+                except FileNotFoundError:
+                    same = False
+                if same:
+                    yield f
+                    return
+        finally:
+            f.close()
+
+
+def atomic_write(path: str, data: bytes, fsync: bool = FSYNC) -> None:
+    """Replace `path` with `data` so readers see either the old or the new file, never a mix."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class _GroupCommit:
+    """Leader/follower batching of appends so concurrent writers share one fsync.
+
+    A leader writes one batch and then hands leadership to the oldest waiting
+    writer, so under sustained load no single caller keeps flushing for others.
+    """
+
+    def __init__(self, window: float = COMMIT_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending: List[list] = []
+        self._leader_active = False
+        self.stats = {"appends": 0, "batches": 0, "fsyncs": 0}
+
+    def submit(self, path: str, data: bytes) -> None:
+        # [path, data, wake-up event, error, promoted to leader]
+        item = [path, data, threading.Event(), None, False]
+        with self._lock:
+            self._pending.append(item)
+            leader = not self._leader_active
+            if leader:
+                self._leader_active = True
+        if leader:
+            if self.window:
+                time.sleep(self.window)
+            self._lead()
+        else:
+            item[2].wait()
+            if item[4]:
+                # Woken as the next leader: our own record is in the batch we flush
+                self._lead()
+        if item[3] is not None:
+            raise item[3]
+
+    def _lead(self) -> None:
+        with self._lock:
+            batch, self._pending = self._pending, []
+        self._flush(batch)
+        with self._lock:
+            if self._pending:
+                successor = self._pending[0]
+                successor[4] = True
+                successor[2].set()
+            else:
+                self._leader_active = False
+
+    def _flush(self, batch: List[list]) -> None:
+        by_path: Dict[str, List[list]] = {}
+        for item in batch:
+            by_path.setdefault(item[0], []).append(item)
+        for path, items in by_path.items():
+            try:
+                with locked_segment(path) as f:
+                    f.write(b"".join(item[1] for item in items))
+                    f.flush()
+                    if FSYNC:
+                        os.fsync(f.fileno())
+                        self.stats["fsyncs"] += 1
+            except Exception as e:
+                for item in items:
+                    item[3] = e
+            self.stats["appends"] += len(items)
+        self.stats["batches"] += 1
+        for item in batch:
+            item[2].set()
+
+
+class StorageBackend(ABC):
+    """Per-user record storage used by database.py.
+
+    A store ("meals", "chat", ...) holds an ordered list of records per user.
+    A backend that misses an abstract method fails when it is instantiated.
+    """
+
+    def append(self, store: str, username: str, record: Dict[str, Any]) -> None:
+        self.append_many(store, username, [record])
+
+    @abstractmethod
+    def append_many(self, store: str, username: str, records: List[Dict[str, Any]]) -> None:
+        ...
+
+    @abstractmethod
+    def read_all(self, store: str, username: str) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def read_recent(self, store: str, username: str, limit: int) -> List[Dict[str, Any]]:
+        """Return the last `limit` records, oldest first."""
+
+    def read_since(self, store: str, username: str, start: int) -> List[Dict[str, Any]]:
+        """Records from position `start` on (for consumers that track how far they have read)."""
+        return self.read_all(store, username)[start:]
+
+    def last(self, store: str, username: str) -> Optional[Dict[str, Any]]:
+        recent = self.read_recent(store, username, 1)
+        return recent[0] if recent else None
+
+    @abstractmethod
+    def count(self, store: str, username: str) -> int:
+        ...
+
+    @abstractmethod
+    def compact(self, store: str, username: str, keep: int) -> None:
+        """Drop all but the newest `keep` records."""
+
+    @abstractmethod
+    def usernames(self, store: str) -> Iterator[str]:
+        ...
+
+    def activity(self, username: str, stores: Iterable[str]) -> Dict[str, Tuple[int, str]]:
+        """(record count, newest timestamp) per store for one user."""
+        result = {}
+        for store in stores:
+            records = self.read_all(store, username)
+            newest = max((r.get("timestamp") or r.get("last_updated") or "" for r in records), default="")
+            result[store] = (len(records), newest)
+        return result
+
+    @abstractmethod
+    def read_stats(self, username: str) -> Optional[Dict[str, Any]]:
+        """The user's precomputed aggregate record, or None if it was never built."""
+
+    @abstractmethod
+    def update_stats(self, username: str, update: Callable[[Optional[Dict[str, Any]]], Dict[str, Any]]) -> Dict[str, Any]:
+        """Atomically replace the aggregate record with update(current) and return it."""
+
+
+class JsonLogStore(StorageBackend):
+    """Append-only JSONL segments, one file per user per store."""
+
+    def __init__(self, data_dir: str, cache: FileCache = default_cache):
+        self.data_dir = data_dir
+        self.cache = cache
+        self.committer = _GroupCommit()
+
+    def _store_dir(self, store: str) -> str:
+        return os.path.join(self.data_dir, store)
+
+    def segment_path(self, store: str, username: str) -> str:
+        return os.path.join(self._store_dir(store), _segment_name(username))
+
+    def append_many(self, store: str, username: str, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        os.makedirs(self._store_dir(store), exist_ok=True)
+        self.committer.submit(self.segment_path(store, username), _encode(records))
+
+    @staticmethod
+    def _read_from(path: str, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Parse complete lines from `offset` on; a trailing partial line is left for later."""
+        with open(path, "rb") as f, _flock(f, exclusive=False):
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        return _parse_lines(data[:end].split(b"\n")), offset + end
+
+    def _parse_segment(self, path: str) -> Tuple[List[Dict[str, Any]], int]:
+        return self._read_from(path, 0)
+
+    def _extend_segment(self, records: List[Dict[str, Any]], offset: int, path: str) -> Tuple[List[Dict[str, Any]], int]:
+        new_records, new_offset = self._read_from(path, offset)
+        return (records + new_records if new_records else records), new_offset
+
+    def _records(self, store: str, username: str) -> List[Dict[str, Any]]:
+        """Cached, read-only list of all records in a segment."""
+        try:
+            return self.cache.load(self.segment_path(store, username), self._parse_segment, self._extend_segment)
+        except FileNotFoundError:
+            return []
+
+    def read_all(self, store: str, username: str) -> List[Dict[str, Any]]:
+        return list(self._records(store, username))
+
+    def read_recent(self, store: str, username: str, limit: int) -> List[Dict[str, Any]]:
+        """Return the last `limit` records, oldest first."""
+        if limit <= 0:
+            return []
+        return self._records(store, username)[-limit:]
+
+    def read_since(self, store: str, username: str, start: int) -> List[Dict[str, Any]]:
+        return self._records(store, username)[start:]
+
+    def last(self, store: str, username: str) -> Optional[Dict[str, Any]]:
+        records = self._records(store, username)
+        return records[-1] if records else None
+
+    def count(self, store: str, username: str) -> int:
+        return len(self._records(store, username))
+
+    def compact(self, store: str, username: str, keep: int) -> None:
+        """Rewrite the segment keeping only the newest `keep` records."""
+        path = self.segment_path(store, username)
+        # Hold the writer lock so no append lands between reading and replacing
+        with locked_segment(path, "rb") as f:
+            records = _parse_lines(f.read().split(b"\n"))[-keep:]
+            atomic_write(path, _encode(records))
+
+    def _stats_path(self, username: str) -> str:
+        return os.path.join(self.data_dir, STATS_DIR, _segment_name(username)[: -len(SEGMENT_EXT)] + ".json")
+
+    def read_stats(self, username: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self.cache.load(self._stats_path(username), parse_json_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def update_stats(self, username: str, update: Callable[[Optional[Dict[str, Any]]], Dict[str, Any]]) -> Dict[str, Any]:
+        path = self._stats_path(username)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with locked_segment(path, "a+b") as f:
+            f.seek(0)
+            try:
+                current = json.loads(f.read() or b"null")
+            except json.JSONDecodeError:
+                current = None
+            stats = update(current)
+            # Aggregates can be rebuilt from the logs, so they skip the fsync
+            atomic_write(path, json.dumps(stats, ensure_ascii=False).encode("utf-8"), fsync=False)
+        return stats
+
+    def usernames(self, store: str) -> Iterator[str]:
+        try:
+            names = os.listdir(self._store_dir(store))
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name.endswith(SEGMENT_EXT):
+                yield unquote(name[: -len(SEGMENT_EXT)])
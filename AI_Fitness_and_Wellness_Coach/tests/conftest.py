@@ -0,0 +1,42 @@
+"""Shared setup for the test suite.
+
+App modules read their settings from the environment and open ./data at
+import time, so the environment, working directory and the fake_gemini
+stand-in (see benchmarks/fake_gemini.py) are set up before any of them is
+imported.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.join(APP_DIR, "benchmarks"))
+os.chdir(tempfile.mkdtemp())  # storage writes go to ./data
+os.environ.setdefault("GEMINI_API_KEY", "offline-test")
+os.environ["LOG_STDOUT"] = "0"
+os.environ["LLM_CACHE"] = "0"
+os.environ["FAQ"] = "0"
+os.environ["ROUTER_CLASSIFIER"] = "off"
+os.environ["SINGLEFLIGHT"] = "0"
+
+import fake_gemini  # noqa: E402
+
+fake_gemini.install()
+
+import governor  # noqa: E402
+import llm  # noqa: E402
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    """Install fake_gemini with the given settings and a fresh governor without retries."""
+    def install(**kwargs):
+        config = fake_gemini.install(**kwargs)
+        fake_gemini.calls.clear()
+        monkeypatch.setattr(llm, "governor", governor.Governor(retries=0))
+        return config
+    install()
+    return install
@@ -0,0 +1,141 @@
+import time
+import uuid
+
+import pytest
+
+import chat_agent
+import database
+import llm
+from chat_agent import AgentUnavailable, CommunicationAgent, NO_AGENT_REPLY
+from fake_gemini import CANNED, calls
+
+# Keyword routes (see intent_router.py)
+FITNESS = "Give me a leg workout"
+FITNESS_AND_NUTRITION = "What should I eat after my workout?"
+FITNESS_AND_WELLNESS = "I slept badly and my knee hurts after squats"
+
+
+class SlowAgent:
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def plan(self, context, message):
+        time.sleep(self.seconds)
+        return "too late"
+
+
+@pytest.fixture
+def agent():
+    # A fresh user per test, so chat history and stats do not leak between tests
+    return CommunicationAgent(f"user-{uuid.uuid4().hex[:8]}")
+
+
+def history(agent):
+    return [(m["role"], m["message"]) for m in database.get_user_chat_history(agent.username)]
+
+
+def test_single_intent_skips_synthesis(fake, agent):
+    reply = agent.handle(FITNESS)
+    assert reply == CANNED["fitness"]
+    assert calls["synthesis"] == 0
+    assert history(agent) == [("user", FITNESS), ("coach", reply)]
+
+
+def test_multi_intent_is_synthesized(fake, agent):
+    reply = agent.handle(FITNESS_AND_NUTRITION)
+    assert reply == CANNED["synthesis"]
+    assert calls["fitness"] == calls["nutrition"] == calls["synthesis"] == 1
+
+
+@pytest.mark.parametrize("mode, outputs, synthesized", [
+    ("auto", {"fitness": "a"}, False),
+    ("auto", {"fitness": "a", "nutrition": ""}, False),
+    ("auto", {"fitness": "a", "nutrition": "b"}, True),
+    ("never", {"fitness": "a", "nutrition": "b"}, False),
+    ("always", {"fitness": "a"}, True),
+])
+def test_compose_reply_modes(fake, agent, monkeypatch, mode, outputs, synthesized):
+    monkeypatch.setattr(chat_agent, "SYNTHESIS_MODE", mode)
+    reply = agent.compose_reply(outputs)
+    if synthesized:
+        assert reply == CANNED["synthesis"]
+        assert "synthesis" in agent.timings
+    else:
+        assert reply == "\n\n".join(v for v in outputs.values() if v)
+        assert calls["synthesis"] == 0
+
+
+def test_synthesis_error_falls_back_to_joined_answers(fake, agent):
+    fake(error_rate=1.0)
+    assert agent.synthesize({"fitness": "a", "nutrition": "", "wellness": "c"}) == "a c"
+
+
+def test_run_agents_deadline_keeps_partial_results(fake, agent, monkeypatch):
+    monkeypatch.setattr(chat_agent, "AGENT_TIMEOUT_SECONDS", 0.2)
+    tasks = {"fitness": (agent.fitness.plan, FITNESS), "wellness": (SlowAgent(1.0).plan, FITNESS)}
+    start = time.perf_counter()
+    outputs = agent.run_agents(tasks, {})
+    assert time.perf_counter() - start < 0.8
+    assert outputs == {"fitness": CANNED["fitness"]}
+    assert agent.timed_out == ["wellness"]
+    assert agent.failed == []
+
+
+def test_handle_replies_without_timed_out_agent(fake, agent, monkeypatch):
+    monkeypatch.setattr(chat_agent, "AGENT_TIMEOUT_SECONDS", 0.2)
+    agent.wellness = SlowAgent(1.0)
+    reply = agent.handle(FITNESS_AND_WELLNESS)
+    assert reply == CANNED["fitness"]
+    assert agent.timed_out == ["wellness"]
+
+
+def test_raise_on_fallback_after_timeout(fake, agent, monkeypatch):
+    monkeypatch.setattr(chat_agent, "AGENT_TIMEOUT_SECONDS", 0.2)
+    agent.wellness = SlowAgent(1.0)
+    with pytest.raises(AgentUnavailable, match="wellness"):
+        agent.handle(FITNESS_AND_WELLNESS, raise_on_fallback=True)
+    assert history(agent) == []
+
+
+def test_agent_error_is_reported_as_unavailable(fake, agent):
+    fake(error_rate=1.0)
+    reply = agent.handle(FITNESS)
+    assert reply.startswith("Training guidance unavailable:")
+    assert agent.failed == ["fitness"]
+
+
+def test_raise_on_fallback_after_agent_error(fake, agent):
+    fake(error_rate=1.0)
+    with pytest.raises(AgentUnavailable, match="fitness"):
+        agent.handle(FITNESS, raise_on_fallback=True)
+    assert history(agent) == []
+
+
+def test_open_breaker_gives_no_agent_reply(fake, agent):
+    llm.governor.breaker.state = "open"
+    llm.governor.breaker.opened_at = time.monotonic()
+    reply = agent.handle(FITNESS_AND_NUTRITION)
+    assert reply == NO_AGENT_REPLY
+    assert sorted(agent.failed) == ["fitness", "nutrition"]
+    assert sum(calls.values()) == 0
+
+
+def test_stream_yields_synthesis_chunks(fake, agent):
+    fake(chunks=4)
+    chunks = list(agent.handle_stream(FITNESS_AND_NUTRITION))
+    assert len(chunks) == 4
+    assert "".join(chunks).strip() == CANNED["synthesis"]
+    assert history(agent)[-1] == ("coach", "".join(chunks))
+
+
+def test_stream_single_intent_is_one_chunk(fake, agent):
+    assert list(agent.handle_stream(FITNESS)) == [CANNED["fitness"]]
+
+
+def test_stream_closed_early_persists_partial_reply(fake, agent):
+    fake(chunks=4)
+    stream = agent.handle_stream(FITNESS_AND_NUTRITION)
+    first = next(stream)
+    stream.close()
+    assert history(agent) == [("user", FITNESS_AND_NUTRITION), ("coach", first)]
+    assert first != CANNED["synthesis"]
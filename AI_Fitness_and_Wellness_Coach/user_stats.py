@@ -0,0 +1,125 @@
+"""Incrementally maintained per-user aggregates.
+
+Every write in database.py folds the new entries into a compact stats record
+(counts, last timestamps, latest profile and running sums of numeric fields),
+so get_user_stats is a single lookup instead of reading every store.
+
+Consistency check / repair against the raw logs:
+
+    python user_stats.py check [--fix] [username ...]
+"""
+import argparse
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+# Store names mirror database.py (kept here to avoid a circular import)
+USERS = "users"
+CHAT = "chat"
+MEALS = "meals"
+WORKOUT_LOGS = "workout_logs"
+WELLNESS = "wellness"
+TRACKED_STORES = (USERS, CHAT, MEALS, WORKOUT_LOGS, WELLNESS)
+
+# Numeric fields summarized per store (running count and sum -> mean)
+SUMMARY_FIELDS = {
+    MEALS: ("calories", "protein", "carbs", "fat"),
+    WORKOUT_LOGS: ("duration", "calories_burned", "sets", "reps"),
+    WELLNESS: ("sleep_quality", "sleep_hours", "stress_level", "water_liters"),
+}
+
+
+def empty_stats() -> Dict[str, Any]:
+    return {"counts": {}, "last": {}, "profile": {}, "sums": {}}
+
+
+def _timestamp(entry: Dict[str, Any]) -> str:
+    return entry.get("timestamp") or entry.get("last_updated") or ""
+
+
+def apply_entries(stats: Dict[str, Any], store: str, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fold newly written entries into a stats record (returns the same dict)."""
+    if store not in TRACKED_STORES or not entries:
+        return stats
+    stats["counts"][store] = stats["counts"].get(store, 0) + len(entries)
+    newest = max(_timestamp(e) for e in entries)
+    stats["last"][store] = max(stats["last"].get(store, ""), newest)
+    _fold_values(stats, store, entries)
+    stats["updated_at"] = datetime.now().isoformat()
+    return stats
+
+
+def _fold_values(stats: Dict[str, Any], store: str, entries: List[Dict[str, Any]]) -> None:
+    """The profile and running sums part of apply_entries."""
+    if store == USERS and entries:
+        stats["profile"] = entries[-1]
+    for field in SUMMARY_FIELDS.get(store, ()):
+        values = [e[field] for e in entries if isinstance(e.get(field), (int, float)) and not isinstance(e.get(field), bool)]
+        if values:
+            acc = stats["sums"].setdefault(store, {}).setdefault(field, [0, 0])
+            acc[0] += len(values)
+            acc[1] += sum(values)
+
+
+def rebuild(backend, username: str) -> Dict[str, Any]:
+    """Recompute a user's stats record from the raw logs."""
+    stats = empty_stats()
+    # Counts and newest timestamps in one aggregate lookup (a single query on SQLite);
+    # only the stores with a profile or summed fields are read record by record
+    for store, (count, newest) in backend.activity(username, TRACKED_STORES).items():
+        if count:
+            stats["counts"][store], stats["last"][store] = count, newest
+    for store in (USERS,) + tuple(SUMMARY_FIELDS):
+        _fold_values(stats, store, backend.read_all(store, username))
+    stats["updated_at"] = datetime.now().isoformat()
+    return stats
+
+
+def averages(stats: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    return {
+        store: {field: round(total / n, 2) for field, (n, total) in fields.items() if n}
+        for store, fields in stats.get("sums", {}).items()
+    }
+
+
+def _comparable(stats: Dict[str, Any], chat_limit: Optional[int]) -> Dict[str, Any]:
+    counts = dict(stats.get("counts", {}))
+    if chat_limit is not None and CHAT in counts:
+        # Chat segments are compacted, so raw logs only bound the recent count
+        counts[CHAT] = min(counts[CHAT], chat_limit)
+    return {"counts": counts, "last": stats.get("last", {}), "sums": stats.get("sums", {})}
+
+
+def check(backend, usernames: Iterable[str], fix: bool = False, chat_limit: Optional[int] = None) -> List[str]:
+    """Compare stored aggregates with a rebuild; optionally overwrite drifted ones."""
+    drifted = []
+    for username in usernames:
+        expected = rebuild(backend, username)
+        stored = backend.read_stats(username)
+        if stored is None or _comparable(stored, chat_limit) != _comparable(expected, chat_limit):
+            drifted.append(username)
+            if fix:
+                backend.update_stats(username, lambda _: expected)
+    return drifted
+
+
+def main() -> None:
+    import database
+
+    parser = argparse.ArgumentParser(description="Check per-user aggregates against the raw logs")
+    parser.add_argument("command", choices=["check"])
+    parser.add_argument("usernames", nargs="*", help="default: every registered user")
+    parser.add_argument("--fix", action="store_true", help="rebuild drifted records")
+    args = parser.parse_args()
+
+    backend = database._store
+    usernames = args.usernames or sorted(backend.usernames(USERS))
+    drifted = check(backend, usernames, fix=args.fix, chat_limit=database.CHAT_HISTORY_LIMIT)
+    for username in drifted:
+        print(f"{'fixed' if args.fix else 'drift'}: {username}")
+    print(f"{len(usernames)} users checked, {len(drifted)} inconsistent")
+    sys.exit(1 if drifted and not args.fix else 0)
+
+
+if __name__ == "__main__":
+    main()
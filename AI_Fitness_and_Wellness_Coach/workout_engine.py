@@ -0,0 +1,318 @@
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+# Local, deterministic workout generation.
+# An exercise catalog is indexed by equipment, level, goal, movement pattern
+# and contraindication as integer bitmasks, so selecting the safe candidates
+# for a profile is a handful of AND/OR operations. Goal templates then fill
+# movement slots from those candidates and scale sets/rounds to the duration.
+# Warm-up and cool-down moves live in the same catalog and go through the same
+# contraindication mask; limitations the keyword table does not recognize are
+# listed on the plan as not screened for.
+
+
+class Exercise(NamedTuple):
+    name: str
+    pattern: str
+    equipment: Tuple[str, ...]
+    levels: Tuple[str, ...]
+    goals: Tuple[str, ...]
+    # Body areas / conditions this exercise should be avoided with
+    avoid: Tuple[str, ...] = ()
+
+
+LEVELS = ("beginner", "intermediate", "advanced")
+GOALS = ("fat loss", "muscle gain", "endurance", "general health")
+ALL_LEVELS = LEVELS
+ALL_GOALS = GOALS
+BW = ("bodyweight",)
+
+CATALOG: Tuple[Exercise, ...] = (
+    # Squat / lunge
+    Exercise("Bodyweight squats", "squat", BW, ALL_LEVELS, ALL_GOALS, ("knee", "hip")),
+    Exercise("Box squats to a chair", "squat", BW, ("beginner", "intermediate"), ALL_GOALS, ("hip",)),
+    Exercise("Wall sit", "squat", BW, ALL_LEVELS, ("endurance", "general health", "fat loss"), ("knee", "hip")),
+    Exercise("Goblet squats", "squat", ("dumbbells", "kettlebell"), ALL_LEVELS, ALL_GOALS, ("knee", "hip")),
+    Exercise("Barbell back squats", "squat", ("barbell",), ("intermediate", "advanced"), ("muscle gain", "general health"), ("knee", "hip", "back", "shoulder", "neck")),
+    Exercise("Jump squats", "squat", BW, ("intermediate", "advanced"), ("fat loss", "endurance"), ("knee", "hip", "ankle", "high_impact", "pregnancy")),
+    Exercise("Reverse lunges", "lunge", BW, ALL_LEVELS, ALL_GOALS, ("knee", "hip", "ankle")),
+    Exercise("Dumbbell split squats", "lunge", ("dumbbells",), ("intermediate", "advanced"), ("muscle gain", "general health"), ("knee", "hip", "ankle")),
+    Exercise("Step-ups", "lunge", BW, ALL_LEVELS, ALL_GOALS, ("knee", "hip", "ankle")),
+    Exercise("Side-lying leg raises", "lunge", BW, ALL_LEVELS, ("general health", "endurance"), ("hip",)),
+    # Hinge
+    Exercise("Glute bridges", "hinge", BW, ALL_LEVELS, ALL_GOALS, ("hip",)),
+    Exercise("Single-leg glute bridges", "hinge", BW, ("intermediate", "advanced"), ALL_GOALS, ("hip",)),
+    Exercise("Dumbbell Romanian deadlifts", "hinge", ("dumbbells",), ALL_LEVELS, ALL_GOALS, ("back", "hip")),
+    Exercise("Kettlebell swings", "hinge", ("kettlebell",), ("intermediate", "advanced"), ("fat loss", "endurance"), ("back", "hip", "pregnancy")),
+    Exercise("Barbell deadlifts", "hinge", ("barbell",), ("intermediate", "advanced"), ("muscle gain",), ("back", "hip")),
+    Exercise("Band pull-throughs", "hinge", ("bands",), ALL_LEVELS, ALL_GOALS, ("hip",)),
+    # Push
+    Exercise("Push-ups (knees if needed)", "push", BW, ALL_LEVELS, ALL_GOALS, ("wrist", "shoulder")),
+    Exercise("Incline push-ups", "push", BW, ("beginner", "intermediate"), ALL_GOALS, ("wrist",)),
+    Exercise("Wall push-ups", "push", BW, ("beginner",), ("general health", "fat loss", "endurance"), ()),
+    Exercise("Dumbbell floor press", "push", ("dumbbells",), ALL_LEVELS, ALL_GOALS, ()),
+    Exercise("Dumbbell overhead press", "push", ("dumbbells",), ("intermediate", "advanced"), ("muscle gain", "general health"), ("shoulder", "neck")),
+    Exercise("Band chest press", "push", ("bands",), ALL_LEVELS, ALL_GOALS, ()),
+    Exercise("Barbell bench press", "push", ("barbell",), ("intermediate", "advanced"), ("muscle gain",), ("shoulder", "wrist")),
+    Exercise("Triceps dips", "push", BW, ("intermediate", "advanced"), ("muscle gain",), ("shoulder", "wrist")),
+    # Pull
+    Exercise("Prone Y-T raises", "pull", BW, ALL_LEVELS, ALL_GOALS, ("neck",)),
+    Exercise("Doorway rows with a towel", "pull", BW, ("beginner", "intermediate"), ALL_GOALS, ()),
+    Exercise("Dumbbell rows", "pull", ("dumbbells",), ALL_LEVELS, ALL_GOALS, ()),
+    Exercise("Band rows", "pull", ("bands",), ALL_LEVELS, ALL_GOALS, ()),
+    Exercise("Band pull-aparts", "pull", ("bands",), ALL_LEVELS, ("general health", "endurance"), ()),
+    Exercise("Pull-ups", "pull", ("pull-up bar",), ("intermediate", "advanced"), ("muscle gain", "general health"), ("shoulder", "wrist", "neck")),
+    Exercise("Barbell bent-over rows", "pull", ("barbell",), ("intermediate", "advanced"), ("muscle gain",), ("back",)),
+    # Core
+    Exercise("Plank", "core", BW, ALL_LEVELS, ALL_GOALS, ("wrist", "shoulder", "pregnancy")),
+    Exercise("Dead bugs", "core", BW, ALL_LEVELS, ALL_GOALS, ("pregnancy",)),
+    Exercise("Bird dogs", "core", BW, ALL_LEVELS, ALL_GOALS, ()),
+    Exercise("Side plank", "core", BW, ("intermediate", "advanced"), ALL_GOALS, ("shoulder",)),
+    Exercise("Pallof press", "core", ("bands",), ALL_LEVELS, ALL_GOALS, ()),
+    Exercise("Hanging knee raises", "core", ("pull-up bar",), ("advanced",), ("muscle gain", "general health"), ("shoulder", "back", "hip", "neck")),
+    # Conditioning
+    Exercise("Marching in place", "cardio", BW, ALL_LEVELS, ALL_GOALS, ()),
+    Exercise("Brisk walk", "cardio", BW, ALL_LEVELS, ALL_GOALS, ()),
+    Exercise("Jumping jacks", "cardio", BW, ALL_LEVELS, ("fat loss", "endurance", "general health"), ("knee", "hip", "ankle", "high_impact", "pregnancy")),
+    Exercise("Mountain climbers", "cardio", BW, ("intermediate", "advanced"), ("fat loss", "endurance"), ("wrist", "shoulder", "hip", "high_impact", "pregnancy")),
+    Exercise("Burpees", "cardio", BW, ("advanced",), ("fat loss", "endurance"), ("knee", "hip", "back", "wrist", "neck", "high_impact", "pregnancy")),
+    Exercise("High knees", "cardio", BW, ("intermediate", "advanced"), ("fat loss", "endurance"), ("knee", "hip", "ankle", "high_impact", "pregnancy")),
+    Exercise("Stationary bike intervals", "cardio", ("bike",), ALL_LEVELS, ("fat loss", "endurance", "general health"), ()),
+    Exercise("Treadmill incline walk", "cardio", ("treadmill",), ALL_LEVELS, ALL_GOALS, ()),
+    Exercise("Jump rope", "cardio", ("jump rope",), ("intermediate", "advanced"), ("fat loss", "endurance"), ("knee", "hip", "ankle", "high_impact", "pregnancy")),
+    # Warm-up and cool-down (never picked for the main block)
+    Exercise("Easy marching or brisk walk", "warmup", BW, ALL_LEVELS, ALL_GOALS, ()),
+    Exercise("Arm circles", "warmup", BW, ALL_LEVELS, ALL_GOALS, ("shoulder",)),
+    Exercise("Ankle circles", "warmup", BW, ALL_LEVELS, ALL_GOALS, ()),
+    Exercise("Hip circles", "warmup", BW, ALL_LEVELS, ALL_GOALS, ("hip", "back")),
+    Exercise("Bodyweight good-mornings", "warmup", BW, ALL_LEVELS, ALL_GOALS, ("back", "hip")),
+    Exercise("Easy walk", "cooldown", BW, ALL_LEVELS, ALL_GOALS, ()),
+    Exercise("Hamstring stretch", "cooldown", BW, ALL_LEVELS, ALL_GOALS, ("back", "hip")),
+    Exercise("Quad stretch", "cooldown", BW, ALL_LEVELS, ALL_GOALS, ("knee",)),
+    Exercise("Chest stretch", "cooldown", BW, ALL_LEVELS, ALL_GOALS, ("shoulder",)),
+    Exercise("Upper back stretch", "cooldown", BW, ALL_LEVELS, ALL_GOALS, ("shoulder", "neck")),
+    Exercise("Calf stretch", "cooldown", BW, ALL_LEVELS, ALL_GOALS, ("ankle",)),
+)
+
+# Free-text limitation keywords -> contraindication tags (matched as whole words, plural "s" allowed)
+LIMITATION_KEYWORDS = {
+    "knee": ("knee",), "acl": ("knee",), "meniscus": ("knee",), "patella": ("knee",), "patellar": ("knee",),
+    "back": ("back",), "spine": ("back",), "spinal": ("back",), "hernia": ("back",), "herniated": ("back",),
+    "sciatica": ("back",), "lumbar": ("back",),
+    "shoulder": ("shoulder",), "rotator": ("shoulder",),
+    "wrist": ("wrist",), "carpal": ("wrist",),
+    "ankle": ("ankle",), "achilles": ("ankle",),
+    "hip": ("hip",), "neck": ("neck",), "cervical": ("neck",),
+    "asthma": ("high_impact",), "heart": ("high_impact",), "cardiac": ("high_impact",),
+    "blood pressure": ("high_impact",), "hypertension": ("high_impact",), "obese": ("high_impact",), "obesity": ("high_impact",),
+    "pregnant": ("pregnancy", "high_impact"), "pregnancy": ("pregnancy", "high_impact"),
+}
+
+# Free-text equipment keywords -> catalog equipment tags (matched like LIMITATION_KEYWORDS)
+EQUIPMENT_KEYWORDS = {
+    "dumbbell": ("dumbbells",), "db": ("dumbbells",),
+    "band": ("bands",), "resistance": ("bands",),
+    "kettlebell": ("kettlebell",), "kb": ("kettlebell",),
+    "barbell": ("barbell",),
+    "pull-up": ("pull-up bar",), "pullup": ("pull-up bar",), "pull up": ("pull-up bar",),
+    "bike": ("bike",), "cycle": ("bike",), "treadmill": ("treadmill",),
+    "rope": ("jump rope",),
+    "gym": ("dumbbells", "barbell", "kettlebell", "bands", "pull-up bar", "bike", "treadmill"),
+}
+
+# Goal templates: movement slots per round and the set/rep scheme
+TEMPLATES: Dict[str, Dict[str, Any]] = {
+    "fat loss": {"format": "circuit", "slots": ("squat", "push", "hinge", "cardio", "pull", "core"), "reps": "40s work / 20s rest", "rest": "60s between rounds"},
+    "muscle gain": {"format": "sets", "slots": ("squat", "push", "pull", "hinge", "lunge", "core"), "reps": "8-12 reps", "rest": "90s between sets"},
+    "endurance": {"format": "circuit", "slots": ("cardio", "lunge", "push", "cardio", "pull", "core"), "reps": "15-20 reps or 45s", "rest": "30s between rounds"},
+    "general health": {"format": "circuit", "slots": ("squat", "push", "hinge", "pull", "core"), "reps": "10-12 reps", "rest": "60s between rounds"},
+}
+# Minutes one round/exercise block takes (work + rest), per level
+BLOCK_MINUTES = {"beginner": 6.0, "intermediate": 5.0, "advanced": 4.5}
+SETS = {"beginner": 2, "intermediate": 3, "advanced": 4}
+WARMUP_MINUTES = 5
+COOLDOWN_MINUTES = 5
+# Parts of a limitations field that mean there are none
+NO_LIMITATIONS = frozenset(("none", "no", "nothing", "n/a", "na", "nil", "-"))
+
+
+def _mask_index(key_fn) -> Dict[str, int]:
+    index: Dict[str, int] = {}
+    for i, exercise in enumerate(CATALOG):
+        for key in key_fn(exercise):
+            index[key] = index.get(key, 0) | (1 << i)
+    return index
+
+
+BY_EQUIPMENT = _mask_index(lambda e: e.equipment)
+BY_LEVEL = _mask_index(lambda e: e.levels)
+BY_GOAL = _mask_index(lambda e: e.goals)
+BY_PATTERN = _mask_index(lambda e: (e.pattern,))
+BY_CONTRAINDICATION = _mask_index(lambda e: e.avoid)
+
+
+def _patterns(keywords: Dict[str, Tuple[str, ...]]) -> Tuple[Tuple[re.Pattern, Tuple[str, ...]], ...]:
+    # Whole words only, so "db" does not fire inside "feedback" nor "back" inside "backpack"
+    return tuple((re.compile(r"\b" + re.escape(keyword) + r"s?\b"), tags) for keyword, tags in keywords.items())
+
+
+LIMITATION_PATTERNS = _patterns(LIMITATION_KEYWORDS)
+EQUIPMENT_PATTERNS = _patterns(EQUIPMENT_KEYWORDS)
+
+
+def _tags(text: str, patterns: Tuple[Tuple[re.Pattern, Tuple[str, ...]], ...]) -> Tuple[str, ...]:
+    text = (text or "").lower()
+    found: List[str] = []
+    for pattern, tags in patterns:
+        if pattern.search(text):
+            found.extend(t for t in tags if t not in found)
+    return tuple(found)
+
+
+@lru_cache(maxsize=1024)
+def limitation_tags(physical_limitations: str) -> Tuple[str, ...]:
+    """Contraindication tags mentioned in a free-text limitations field."""
+    return _tags(physical_limitations, LIMITATION_PATTERNS)
+
+
+@lru_cache(maxsize=1024)
+def unrecognized_limitations(physical_limitations: str) -> Tuple[str, ...]:
+    """Parts of a limitations field (split on commas, "and", ...) that name no known tag."""
+    parts = re.split(r"[,;/\n&+]|\band\b|\bplus\b", (physical_limitations or "").lower())
+    return tuple(
+        part for part in (" ".join(p.split()) for p in parts)
+        if part and part not in NO_LIMITATIONS and not _tags(part, LIMITATION_PATTERNS)
+    )
+
+
+@lru_cache(maxsize=1024)
+def equipment_tags(equipment: str) -> Tuple[str, ...]:
+    """Catalog equipment available, always including bodyweight."""
+    return ("bodyweight",) + _tags(equipment, EQUIPMENT_PATTERNS)
+
+
+def normalize_choice(value: str, options: Tuple[str, ...], default: str) -> str:
+    """Map free-form input such as "Intermediate lifter" onto one of `options`."""
+    value = (value or "").strip().lower()
+    if value in options:
+        return value
+    for option in options:
+        if option.split()[0] in value:
+            return option
+    return default
+
+
+@lru_cache(maxsize=1024)
+def _available_mask(equipment: str) -> int:
+    """Exercises doable with the equipment."""
+    available = 0
+    for tag in equipment_tags(equipment):
+        available |= BY_EQUIPMENT.get(tag, 0)
+    return available
+
+
+@lru_cache(maxsize=1024)
+def _safe_mask(equipment: str, physical_limitations: str) -> int:
+    """Exercises doable with the equipment and not contraindicated by the limitations."""
+    available = _available_mask(equipment)
+    unsafe = 0
+    for tag in limitation_tags(physical_limitations):
+        unsafe |= BY_CONTRAINDICATION.get(tag, 0)
+    return available & ~unsafe
+
+
+def candidates(level: str, goal: str, equipment: str = "", physical_limitations: str = "") -> int:
+    """Bitmask of catalog exercises safe and suitable for the profile."""
+    level = normalize_choice(level, LEVELS, "beginner")
+    goal = normalize_choice(goal, GOALS, "general health")
+    return _safe_mask(equipment, physical_limitations) & BY_LEVEL[level] & BY_GOAL[goal]
+
+
+def _members(mask: int) -> List[int]:
+    """Catalog positions set in `mask`, in catalog order."""
+    out = []
+    while mask:
+        low = mask & -mask
+        out.append(low.bit_length() - 1)
+        mask ^= low
+    return out
+
+
+def build_plan(level: str, goal: str, duration: int, equipment: str = "",
+               physical_limitations: str = "", variant: int = 0) -> Dict[str, Any]:
+    """Structured workout plan for a profile.
+
+    Deterministic: the same inputs (and `variant`) always give the same plan;
+    bump `variant` to rotate through alternative exercises.
+    """
+    level = normalize_choice(level, LEVELS, "beginner")
+    goal = normalize_choice(goal, GOALS, "general health")
+    duration = max(int(duration or 30), WARMUP_MINUTES + COOLDOWN_MINUTES + 5)
+    template = TEMPLATES[goal]
+    safe = _safe_mask(equipment, physical_limitations)
+    level_pool = safe & BY_LEVEL[level]
+    pool = level_pool & BY_GOAL[goal]
+
+    warmup = [CATALOG[i].name.lower() for i in _members(safe & BY_PATTERN["warmup"])]
+    cooldown = [CATALOG[i].name.lower() for i in _members(safe & BY_PATTERN["cooldown"])]
+
+    exercises: List[str] = []
+    used = 0
+    for slot, pattern in enumerate(template["slots"]):
+        pattern_mask = BY_PATTERN[pattern]
+        # Prefer goal-specific options, then any of the user's level, then anything safe
+        for mask in (pool & pattern_mask, level_pool & pattern_mask, safe & pattern_mask):
+            options = _members(mask & ~used) or _members(mask)
+            if options:
+                # Put the user's equipment to use before bodyweight-only moves
+                options.sort(key=lambda i: CATALOG[i].equipment == BW)
+                choice = options[(variant + slot) % len(options)]
+                used |= 1 << choice
+                exercises.append(CATALOG[choice].name)
+                break
+
+    main_minutes = duration - WARMUP_MINUTES - COOLDOWN_MINUTES
+    if template["format"] == "circuit":
+        rounds = max(1, int(main_minutes // BLOCK_MINUTES[level]))
+        blocks = [{"exercise": name, "prescription": template["reps"]} for name in exercises]
+        structure = f"Circuit ({rounds} rounds): {template['rest']}"
+    else:
+        # Straight sets: fit as many exercises as the time allows
+        per_exercise = SETS[level] * 2.0
+        fit = max(2, int(main_minutes // per_exercise))
+        exercises = exercises[:fit]
+        blocks = [{"exercise": name, "prescription": f"{SETS[level]} x {template['reps']}"} for name in exercises]
+        structure = f"Straight sets: {template['rest']}"
+
+    return {
+        "level": level,
+        "goal": goal,
+        "duration": duration,
+        "equipment": list(equipment_tags(equipment)),
+        # Only areas that actually ruled out an exercise the user could otherwise have been given
+        "avoiding": [tag for tag in limitation_tags(physical_limitations)
+                     if BY_CONTRAINDICATION.get(tag, 0) & _available_mask(equipment) & BY_LEVEL[level]],
+        "unscreened": list(unrecognized_limitations(physical_limitations)),
+        "warmup": f"Warm-up: {WARMUP_MINUTES} min {', '.join(warmup)}",
+        "structure": structure,
+        "blocks": blocks,
+        "cooldown": f"Cool-down: {COOLDOWN_MINUTES} min {', '.join(cooldown)}",
+    }
+
+
+def format_plan(plan: Dict[str, Any]) -> str:
+    """Plain-text rendering in the same shape as the LLM plans."""
+    lines = [
+        f"Workout ({plan['duration']} minutes) - Level: {plan['level'].title()}, Goal: {plan['goal'].title()}",
+        plan["warmup"],
+        plan["structure"],
+    ]
+    lines += [f"- {block['exercise']}: {block['prescription']}" for block in plan["blocks"]]
+    lines.append(plan["cooldown"])
+    lines.append(f"Equipment: {', '.join(plan['equipment'])}")
+    if plan["avoiding"]:
+        lines.append(f"Adapted for: {', '.join(t.replace('_', ' ') for t in plan['avoiding'])} (exercises that load these areas were left out)")
+    if plan["unscreened"]:
+        lines.append(f"Not screened for: {', '.join(plan['unscreened'])} - this plan does not account for it; check with a doctor or physiotherapist before training")
+    return "\n".join(lines)
@@ -1,31 +1,42 @@
 import os
-from typing import List
+from typing import List, Tuple
 
-import google.generativeai as genai
+from llm import generate_text
+from llm_cache import age_band
+from singleflight import flights
+from workout_engine import build_plan, format_plan, unrecognized_limitations
 
+SYSTEM_INSTRUCTION = "Design safe, effective workouts considering gender, age, and physical limitations. Be professional and safety-focused."
 
-def _ensure_gemini():
-    api_key = os.getenv("GEMINI_API_KEY")
-    if api_key:
-        genai.configure(api_key=api_key)
+# How plans are produced:
+#   "llm"   - Gemini writes the plan, the local engine is the fallback (default)
+#   "local" - the local engine only, no model call (unless the limitations name
+#             something the engine cannot screen for; those plans go to Gemini)
+#   "draft" - the local engine drafts the plan and Gemini only refines it
+WORKOUT_ENGINE_MODE = os.getenv("WORKOUT_ENGINE_MODE", "llm").lower()
 
 
-def _fallback_workout(level: str, goal: str, duration: int, equipment: str) -> str:
-    return (
-        f"Workout ({duration} minutes) - Level: {level}, Goal: {goal}\n"
-        f"Warm-up: 5 min brisk walk or light cycle\n"
-        f"Circuit (3 rounds): 10 squats, 10 push-ups (knees if needed), 20s plank\n"
-        f"Cool-down: 5 min easy walk + stretch\n"
-        f"Equipment: {equipment or 'bodyweight'}"
-    )
+def _fallback_workout(level: str, goal: str, duration: int, equipment: str, physical_limitations: str = "") -> str:
+    return format_plan(build_plan(level, goal, duration, equipment, physical_limitations))
 
 
 def generate_workout(level: str, goal: str, duration: int, equipment: str, gender: str = "", age: int = 0, physical_limitations: str = "") -> str:
+    return generate_workout_with_source(level, goal, duration, equipment, gender, age, physical_limitations)[0]
+
+
+def generate_workout_with_source(level: str, goal: str, duration: int, equipment: str, gender: str = "", age: int = 0,
+                                 physical_limitations: str = "") -> Tuple[str, bool]:
+    """generate_workout() plus whether the plan came from the model (False for the local engine/fallback)."""
+    if WORKOUT_ENGINE_MODE == "local" and not unrecognized_limitations(physical_limitations):
+        return _fallback_workout(level, goal, duration, equipment, physical_limitations), False
+    # The prompt depends only on these arguments, so identical requests in flight share one call
+    args = (level, goal, duration, equipment, gender, age, physical_limitations)
+    text, from_model = flights.do(("workout",) + args, _generate_workout, *args)
+    return text, from_model
+
+
+def _generate_workout(level: str, goal: str, duration: int, equipment: str, gender: str, age: int, physical_limitations: str) -> Tuple[str, bool]:
     try:
-        _ensure_gemini()
-        model = genai.GenerativeModel("gemini-2.5-flash-preview-05-20", 
-            system_instruction="Design safe, effective workouts considering gender, age, and physical limitations. Be professional and safety-focused.")
-        
         # Build comprehensive prompt with all user details
         prompt_parts = [
             "Create a safe, personalized workout plan in 6-10 lines.",
@@ -38,7 +49,7 @@ def generate_workout(level: str, goal: str, duration: int, equipment: str, gende
         if gender:
             prompt_parts.append(f"Gender: {gender}")
         if age:
-            prompt_parts.append(f"Age: {age}")
+            prompt_parts.append(f"Age: {age_band(age)}")
         if physical_limitations:
             prompt_parts.append(f"IMPORTANT - Physical Limitations: {physical_limitations}")
             prompt_parts.append("CRITICAL: Avoid exercises that could worsen these conditions. Suggest safe alternatives.")
@@ -49,10 +60,15 @@ def generate_workout(level: str, goal: str, duration: int, equipment: str, gende
         ])
         
         prompt = ". ".join(prompt_parts)
-        resp = model.generate_content(prompt)
-        text = (resp.text or "").strip()
-        return text or _fallback_workout(level, goal, duration, equipment)
+        if WORKOUT_ENGINE_MODE == "draft":
+            draft = _fallback_workout(level, goal, duration, equipment, physical_limitations)
+            prompt += f".\nRefine this draft plan rather than starting over; keep its structure and exercise choices unless one is unsafe for this user:\n{draft}"
+        text = generate_text(prompt, SYSTEM_INSTRUCTION)
+        if text:
+            return text, True
     except Exception:
-        return _fallback_workout(level, goal, duration, equipment)
+        # Includes GovernorError, raised at once while the circuit breaker is open
+        pass
+    return _fallback_workout(level, goal, duration, equipment, physical_limitations), False
 
 